@@ -1,39 +1,43 @@
-from typing import Generator
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+import hmac
+
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt
-from pydantic import ValidationError
-from sqlalchemy.orm import Session
 
 from backend.core.config import settings
+from backend.core.principal import InvalidTokenError, Principal, principal_cache
+from backend.core.profiling import span
 from backend.crud import crud_user
 from backend.db.database import SessionLocal, get_db
-from backend.schemas.token import TokenPayload
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-async def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-):
+async def load_principal(user_id: int) -> Optional[Principal]:
+    async with SessionLocal() as db:
+        user = await crud_user.get(db, id=user_id)
+        if not user:
+            return None
+        return Principal(id=user.id, username=user.username)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    # 缓存命中时不访问数据库，也不占用数据库会话
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无效的认证凭据",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(
-            token, 
-            settings.JWT_SECRET_KEY, 
-            algorithms=[settings.JWT_ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
-        if token_data.sub is None:
-            raise credentials_exception
-    except (jwt.JWTError, ValidationError):
+        with span("auth"):
+            user = await principal_cache.get(token, load_principal)
+    except InvalidTokenError:
         raise credentials_exception
-    
-    user = crud_user.get(db, id=int(token_data.sub))
     if not user:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return user
+
+async def require_admin(admin_token: Optional[str] = Header(None, alias="X-Admin-Token")) -> None:
+    # 剖析和健康详情等管理接口共用PROFILE_ADMIN_TOKEN，未配置时不可用
+    if not settings.PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not admin_token or not hmac.compare_digest(admin_token, settings.PROFILE_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="无权访问")
@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from backend.core.metrics import ACTIVE_STREAMS, ADMISSION_ACTIVE, ADMISSION_QUEUED, registry
+from backend.services.admission import admission_controller
+from backend.services.streams import stream_registry
+
+router = APIRouter()
+
+# Prometheus文本格式
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def collect_gauges() -> None:
+    ACTIVE_STREAMS.set(stream_registry.stats()["active"])
+    ADMISSION_ACTIVE.set(admission_controller.active)
+    ADMISSION_QUEUED.set(admission_controller.queued)
+
+registry.add_collector(collect_gauges)
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """以Prometheus文本格式导出指标"""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
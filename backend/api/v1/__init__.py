@@ -1,6 +1,8 @@
 from fastapi import APIRouter
-from backend.api.v1 import auth, chat
+from backend.api.v1 import auth, chat, health, profiles
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
-api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
\ No newline at end of file
+api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
+api_router.include_router(health.router, prefix="/health", tags=["health"])
+api_router.include_router(profiles.router, prefix="/admin/profiles", tags=["admin"])
\ No newline at end of file
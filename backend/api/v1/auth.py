@@ -1,31 +1,45 @@
 from datetime import timedelta
 from typing import Any
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend import crud, schemas
 from backend.api import deps
 from backend.core.config import settings
-from backend.core.security import create_access_token
+from backend.core.security import PasswordHashBusy, create_access_token
+from backend.services.login_throttle import LoginThrottled, login_throttle
 
 router = APIRouter()
 
+# 哈希线程池排满时建议的重试间隔（秒）
+HASH_BUSY_RETRY_AFTER = 1
+
+def hash_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="服务繁忙，请稍后再试",
+        headers={"Retry-After": str(HASH_BUSY_RETRY_AFTER)}
+    )
+
 @router.post("/register", response_model=schemas.Token)
 async def register(
     user_in: schemas.UserCreate,
-    db: Session = Depends(deps.get_db)
+    db: AsyncSession = Depends(deps.get_db)
 ) -> Any:
     """
     Create new user.
     """
-    user = crud.user.get_by_username(db, username=user_in.username)
+    user = await crud.user.get_by_username(db, username=user_in.username)
     if user:
         raise HTTPException(
             status_code=400,
             detail="用户名已存在",
         )
-    user = crud.user.create(db, obj_in=user_in)
+    try:
+        user = await crud.user.create(db, obj_in=user_in)
+    except PasswordHashBusy:
+        raise hash_busy_exception()
     access_token_expires = timedelta(minutes=settings.JWT_EXPIRE_MINUTES)
     return {
         "access_token": create_access_token(
@@ -36,20 +50,29 @@ async def register(
 
 @router.post("/login", response_model=schemas.Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(deps.get_db)
+    db: AsyncSession = Depends(deps.get_db)
 ) -> Any:
     """
     OAuth2 compatible token login
     """
+    ip = request.client.host if request.client else None
     try:
-        user = crud.user.authenticate(
-            db, username=form_data.username, password=form_data.password
-        )
+        # 失败次数过多时在校验密码之前拒绝
+        login_throttle.check(form_data.username, ip)
+        try:
+            user = await crud.user.authenticate(
+                db, username=form_data.username, password=form_data.password
+            )
+        except PasswordHashBusy:
+            raise hash_busy_exception()
         if not user:
+            login_throttle.record_failure(form_data.username, ip)
             raise HTTPException(
                 status_code=400, detail="用户名或密码错误"
             )
+        login_throttle.record_success(form_data.username)
         access_token_expires = timedelta(minutes=settings.JWT_EXPIRE_MINUTES)
         return {
             "access_token": create_access_token(
@@ -57,9 +80,12 @@ async def login(
             ),
             "token_type": "bearer",
         }
-    except Exception as e:
-        print(f"Login error: {str(e)}")
-        raise
+    except LoginThrottled as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
 
 @router.get("/me", response_model=schemas.User)
 async def read_users_me(
@@ -1,174 +1,413 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, Body
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+import asyncio
+import json
+import time
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Query, Request
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
 from backend import crud, schemas
 from backend.api import deps
+from backend.core.config import settings
+from backend.core.metrics import GENERATION_SECONDS, TOKENS_PER_SECOND, TTFT_SECONDS
+from backend.core.pagination import decode_cursor, encode_cursor
+from backend.core.profiling import span
+from backend.core.sse import HEARTBEAT, TokenBatcher
+from backend.services.admission import AdmissionRejected, admission_controller
 from backend.services.chat import get_chat_response
-from backend.core.logger import logger
-from backend.models.chat import Chat
+from backend.services.persistence import message_writer
+from backend.services.search import search_index
+from backend.services.streams import GenerationStream, format_event_id, parse_event_id, stream_registry
+from backend.services.summary import refresh_chat_summary
+from backend.core.logger import RATE_LIMITED, SAMPLED, logger
 
 router = APIRouter()
 
+# 等待模型输出时检查客户端断开的间隔（秒）
+DISCONNECT_POLL_SECONDS = 0.5
+
 class MessageRequest(BaseModel):
     content: str
 
 @router.post("/create", response_model=schemas.Chat)
 async def create_chat(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     current_user = Depends(deps.get_current_user)
 ) -> Any:
     """
     创建新对话
     """
-    chat = crud.chat.create_with_owner(
+    chat = await crud.chat.create_with_owner(
         db=db, obj_in=schemas.ChatCreate(), user_id=current_user.id
     )
     return chat
 
-@router.get("/history", response_model=List[schemas.Chat])
+def parse_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+@router.get("/history", response_model=schemas.ChatPage)
 async def read_chats(
-    db: Session = Depends(deps.get_db),
-    skip: int = 0,
-    limit: int = 100,
+    db: AsyncSession = Depends(deps.get_db),
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user = Depends(deps.get_current_user),
 ) -> Any:
     """
-    获取对话历史
+    获取对话历史，按更新时间倒序，使用next_cursor获取下一页
     """
-    chats = crud.chat.get_user_chats(
-        db=db, user_id=current_user.id, skip=skip, limit=limit
+    before = parse_cursor(cursor)
+    # 等待该用户排队中的标题和消息写入，保证列表排序与标题最新
+    await message_writer.flush(user_id=current_user.id)
+    chats = await crud.chat.get_chat_summaries(
+        db=db, user_id=current_user.id, limit=limit + 1, before=before
     )
-    return chats
+    next_cursor = None
+    if len(chats) > limit:
+        chats = chats[:limit]
+        next_cursor = encode_cursor(chats[-1]["updated_at"], chats[-1]["id"])
+    return {"items": chats, "next_cursor": next_cursor}
 
-@router.get("/{chat_id}/messages", response_model=List[schemas.Message])
+@router.get("/search", response_model=schemas.SearchPage)
+async def search_chats(
+    q: str = Query(..., min_length=1, max_length=100),
+    db: AsyncSession = Depends(deps.get_db),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = None,
+    current_user = Depends(deps.get_current_user),
+) -> Any:
+    """
+    检索当前用户的对话标题和消息，按相关度排序，使用next_cursor获取下一页
+    """
+    if search_index is None:
+        raise HTTPException(status_code=503, detail="对话检索未开启")
+    # 等待该用户排队中的写入提交并进入索引
+    await message_writer.flush(user_id=current_user.id)
+    try:
+        hits, next_cursor = await search_index.search(current_user.id, q, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    # 一次查询取回标题，同时过滤掉已删除的对话
+    titles = await crud.chat.get_titles(
+        db=db, user_id=current_user.id, chat_ids=list({hit.chat_id for hit in hits})
+    )
+    items = [
+        {**vars(hit), "chat_title": titles[hit.chat_id]}
+        for hit in hits if hit.chat_id in titles
+    ]
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/{chat_id}/messages", response_model=schemas.MessagePage)
 async def read_messages(
     chat_id: int,
-    db: Session = Depends(deps.get_db),
-    skip: int = 0,
-    limit: int = 100,
+    db: AsyncSession = Depends(deps.get_db),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     current_user = Depends(deps.get_current_user),
 ) -> Any:
     """
-    获取对话消息
+    获取对话消息，返回最近的一页（按时间正序），使用next_cursor获取更早的消息
     """
-    chat = crud.chat.get(db=db, id=chat_id)
+    before = parse_cursor(cursor)
+    chat = await crud.chat.get(db=db, id=chat_id)
     if not chat or chat.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="对话不存在")
-    messages = crud.chat.get_messages(db=db, chat_id=chat_id, skip=skip, limit=limit)
-    return messages
+    # 读己之写：等待该对话排队中的消息落库
+    await message_writer.flush(chat_id)
+    messages = await crud.chat.get_messages(
+        db=db, chat_id=chat_id, limit=limit + 1, before=before
+    )
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[1:]
+        next_cursor = encode_cursor(messages[0].created_at, messages[0].id)
+    return {"items": messages, "next_cursor": next_cursor}
+
+def stream_response(
+    stream: GenerationStream, request: Request, after_seq: int = 0, resumed: bool = False
+) -> StreamingResponse:
+    """将生成流的事件从after_seq之后编码为SSE发送给客户端"""
+    stream_registry.attach(stream, resumed=resumed)
+    
+    async def response_stream():
+        batcher = TokenBatcher(settings.SSE_BATCH_WINDOW_SECONDS, settings.SSE_BATCH_MAX_CHARS)
+        seq = after_seq
+        last_sent = time.monotonic()
+        try:
+            while True:
+                # 断点之后的事件已被淘汰时，其中包含以已生成全文补齐的snapshot
+                events = stream.events_after(seq)
+                if events:
+                    frames = []
+                    for event_seq, event, data in events:
+                        frames += batcher.add(event, data, format_event_id(stream.id, event_seq))
+                    seq = events[-1][0]
+                    if frames:
+                        yield "".join(frames)
+                        last_sent = time.monotonic()
+                    continue
+                if stream.finished:
+                    frames = batcher.flush()
+                    if frames:
+                        yield "".join(frames)
+                    break
+                
+                timeout = DISCONNECT_POLL_SECONDS
+                if batcher.deadline is not None:
+                    timeout = min(timeout, max(0.0, batcher.deadline - time.monotonic()))
+                if await stream.wait(timeout):
+                    continue
+                frames = batcher.flush_due()
+                if frames:
+                    yield "".join(frames)
+                    last_sent = time.monotonic()
+                # 等待模型输出期间定期检查客户端是否已断开
+                elif await request.is_disconnected():
+                    break
+                elif time.monotonic() - last_sent >= settings.SSE_HEARTBEAT_SECONDS:
+                    yield HEARTBEAT
+                    last_sent = time.monotonic()
+        finally:
+            # 断开后生成继续，宽限期内可以重连
+            stream_registry.detach(stream)
+    
+    return StreamingResponse(
+        response_stream(),
+        media_type="text/event-stream",
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            # 关闭nginx等反向代理的响应缓冲
+            'X-Accel-Buffering': 'no',
+            'X-Stream-Id': stream.id,
+        }
+    )
+
+def resume_stream(chat_id: int, last_event_id: str, request: Request, current_user) -> StreamingResponse:
+    try:
+        stream_id, seq = parse_event_id(last_event_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的Last-Event-ID")
+    stream = stream_registry.get(stream_id)
+    if stream is None or stream.user_id != current_user.id or stream.chat_id != chat_id:
+        # 流已过期，回答已保存，客户端应重新读取消息
+        raise HTTPException(status_code=404, detail="生成流不存在或已过期")
+    logger.info(f"客户端重连生成流 - chat_id: {chat_id}, 断点: {seq}")
+    return stream_response(stream, request, after_seq=seq, resumed=True)
+
+def replay_idempotent(chat_id: int, stream_id: str, request: Request, current_user) -> StreamingResponse:
+    """重复提交的消息：重放已有的生成流，不再次生成"""
+    stream = stream_registry.get(stream_id)
+    if stream is None or stream.chat_id != chat_id:
+        raise HTTPException(status_code=409, detail="该消息已提交，请刷新对话")
+    logger.info(f"重复提交的消息，重放已有生成流 - chat_id: {chat_id}")
+    return stream_response(stream, request, resumed=True)
 
 @router.post("/{chat_id}/messages/stream")
 async def create_message_stream(
     *,
     chat_id: int,
     message: MessageRequest,
-    db: Session = Depends(deps.get_db),
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=128),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(deps.get_db),
     current_user = Depends(deps.get_current_user),
 ) -> Any:
-    """发送消息并获取流式响应"""
-    logger.info(f"收到消息请求 - chat_id: {chat_id}, user_id: {current_user.id}")
+    """发送消息并获取流式响应
+
+    带Last-Event-ID时接回断开的生成流；带Idempotency-Key时重复提交会重放
+    同一次生成。事件id格式为"流id:序号"。
+    """
+    received_at = time.monotonic()
+    logger.info("收到消息请求 - chat_id: %s, user_id: %s", chat_id, current_user.id, extra=SAMPLED)
+    if last_event_id:
+        return resume_stream(chat_id, last_event_id, request, current_user)
+    existing = stream_registry.lookup(current_user.id, idempotency_key)
+    if existing:
+        return replay_idempotent(chat_id, existing, request, current_user)
+    
+    # 上一轮的回答可能仍在写入队列中
+    with span("persist.flush"):
+        await message_writer.flush(chat_id)
     
     # 获取对话及其标题
-    chat = crud.chat.get(db=db, id=chat_id)
+    chat = await crud.chat.get(db=db, id=chat_id)
     if not chat or chat.user_id != current_user.id:
         logger.error(f"对话不存在或无权限 - chat_id: {chat_id}")
         raise HTTPException(status_code=404, detail="对话不存在")
-    
     current_title = chat.title
+    summary = chat.summary
     
-    # 获取历史消息
+    # 获取摘要水位之后的历史消息
     history = [
         {"role": msg.role, "content": msg.content}
-        for msg in crud.chat.get_messages(db=db, chat_id=chat_id)
+        for msg in await crud.chat.get_recent_messages(
+            db=db,
+            chat_id=chat_id,
+            limit=settings.CONTEXT_HISTORY_LIMIT,
+            after_id=chat.summary_upto_id or 0
+        )
     ]
-    logger.info(f"获取到历史消息 - 数量: {len(history)}")
+    logger.debug("获取到历史消息 - 数量: %d", len(history))
     
-    # 保存用户消息
-    user_message = crud.chat.add_message(
-        db=db, 
-        chat_id=chat_id, 
-        message=schemas.MessageCreate(content=message.content, role="user")
-    )
-    logger.info("用户消息已保存")
+    # 请求会话在流式响应结束后才由依赖关闭，提前结束读事务并归还连接，
+    # 避免长时间的流占满连接池或持有SQLite共享锁
+    await db.close()
     
-    async def response_stream():
-        logger.info("开始生成流式响应")
+    # 获取模型调用名额，队列已满时快速拒绝
+    try:
+        with span("admission"):
+            lease = await admission_controller.acquire(current_user.id)
+    except AdmissionRejected as e:
+        logger.warning(
+            "请求被准入控制拒绝 - user_id: %s, 原因: %s", current_user.id, e.reason, extra=RATE_LIMITED
+        )
+        raise HTTPException(
+            status_code=429,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    # 排队期间同一幂等键的请求可能已经开始生成；从这里到创建流之间没有await
+    existing = stream_registry.lookup(current_user.id, idempotency_key)
+    if existing:
+        lease.release()
+        return replay_idempotent(chat_id, existing, request, current_user)
+    
+    async def generate(stream: GenerationStream):
+        """在后台任务中生成回答，与响应连接解耦，无人重连时被取消"""
+        logger.debug("开始生成流式响应")
+        started = time.monotonic()
+        first_token_at = None
         response_text = ""
+        chunks = 0
+        saved = None
         try:
+            # 用户消息进入批量写入队列
+            with span("persist.enqueue_user"):
+                await message_writer.add_message(
+                    chat_id, "user", message.content, user_id=current_user.id
+                )
             async for token, new_title in get_chat_response(
                 message=message.content,
                 current_title=current_title,
-                history=history
+                history=history,
+                summary=summary
             ):
-                response_text += token
-                yield f"data: {token}\n\n"
+                if token:
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                        TTFT_SECONDS.observe(first_token_at - received_at)
+                    response_text += token
+                    chunks += 1
+                    stream.publish("token", token)
                 
                 # 如果有新标题，更新对话标题并发送事件
                 if new_title and new_title != current_title:  # 只在标题变化时更新
-                    try:
-                        # 重新获取chat对象并更新标题
-                        chat_obj = db.query(Chat).filter(Chat.id == chat_id).first()
-                        if chat_obj:
-                            chat_obj.title = new_title
-                            db.add(chat_obj)
-                            db.commit()
-                            logger.info(f"对话标题已更新: {new_title}")
-                            yield f"event: title\ndata: {new_title}\n\n"
-                    except Exception as e:
-                        logger.error(f"更新标题失败: {str(e)}", exc_info=True)
-            
-            logger.info("AI响应生成完成")
+                    await message_writer.set_title(chat_id, new_title, user_id=current_user.id)
+                    logger.info("对话标题已更新: %s", new_title, extra=SAMPLED)
+                    stream.publish("title", new_title)
             
-            # 保存AI响应
-            ai_message = crud.chat.add_message(
-                db=db, 
-                chat_id=chat_id, 
-                message=schemas.MessageCreate(content=response_text, role="assistant")
+            # 保存AI响应，落库后再结束流，客户端随后读取消息时数据已持久化
+            with span("persist.assistant"):
+                saved = await message_writer.add_message(
+                    chat_id, "assistant", response_text, user_id=current_user.id
+                )
+                await asyncio.shield(saved)
+            elapsed_ms = round((time.monotonic() - started) * 1000)
+            logger.info(
+                "AI响应已保存 - chat_id: %s, 字数: %s, 耗时: %sms", chat_id, len(response_text), elapsed_ms,
+                extra=SAMPLED
             )
-            logger.info("AI响应已保存")
-                
+            stream.publish("usage", json.dumps({
+                "chars": len(response_text),
+                "chunks": chunks,
+                "elapsed_ms": elapsed_ms,
+            }))
+            stream.publish("done", "{}")
+            finished_at = time.monotonic()
+            GENERATION_SECONDS.labels("completed").observe(finished_at - started)
+            if first_token_at is not None and chunks > 1 and finished_at > first_token_at:
+                TOKENS_PER_SECOND.observe((chunks - 1) / (finished_at - first_token_at))
+        
+        except asyncio.CancelledError:
+            GENERATION_SECONDS.labels("cancelled").observe(time.monotonic() - started)
+            logger.info(f"生成已取消 - chat_id: {chat_id}, 已生成: {len(response_text)}字")
+            if response_text and saved is None:
+                # 保存已生成的部分并标记为截断
+                await message_writer.add_message(
+                    chat_id, "assistant", response_text, truncated=True, user_id=current_user.id
+                )
+            raise
         except Exception as e:
+            GENERATION_SECONDS.labels("error").observe(time.monotonic() - started)
             logger.error(f"流式响应生成失败: {str(e)}", exc_info=True)
-            yield f"data: 抱歉，处理消息时出现错误。\n\n"
+            stream.publish("error", json.dumps({"message": "抱歉，处理消息时出现错误。"}, ensure_ascii=False))
+            return
+        finally:
+            lease.release()
+            stream.finish()
+        
+        # 流已结束，在后台折叠较早的对话轮次
+        await refresh_chat_summary(chat_id)
     
-    return StreamingResponse(
-        response_stream(),
-        media_type="text/event-stream",
-        headers={
-            'Cache-Control': 'no-cache',
-            'Connection': 'keep-alive',
-        }
-    )
+    stream = stream_registry.start(current_user.id, chat_id, idempotency_key, generate)
+    return stream_response(stream, request)
+
+@router.get("/{chat_id}/messages/stream")
+async def resume_message_stream(
+    chat_id: int,
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    last_event_id_param: Optional[str] = Query(None, alias="last_event_id"),
+    current_user = Depends(deps.get_current_user),
+) -> Any:
+    """断线重连：从Last-Event-ID（请求头或last_event_id参数）之后继续接收生成流"""
+    event_id = last_event_id or last_event_id_param
+    if not event_id:
+        raise HTTPException(status_code=400, detail="缺少Last-Event-ID")
+    return resume_stream(chat_id, event_id, request, current_user)
 
 @router.delete("/{chat_id}", response_model=schemas.Chat)
 async def delete_chat(
     chat_id: int,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     current_user = Depends(deps.get_current_user),
 ) -> Any:
     """
     删除对话
     """
-    chat = crud.chat.get(db=db, id=chat_id)
+    await message_writer.flush(chat_id)
+    chat = await crud.chat.get_with_messages(db=db, id=chat_id)
     if not chat or chat.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="对话不存在")
-    chat = crud.chat.remove(db=db, id=chat_id)
+    chat = await crud.chat.remove(db=db, id=chat_id)
+    if search_index is not None:
+        try:
+            await search_index.remove_chat(chat_id)
+        except Exception as e:
+            logger.error(f"删除检索索引失败 - chat_id: {chat_id}: {str(e)}", exc_info=True)
     return chat
 
 @router.get("/{chat_id}", response_model=schemas.Chat)
 async def read_chat(
     chat_id: int,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     current_user = Depends(deps.get_current_user),
 ) -> Any:
     """
     获取单个对话
     """
-    chat = crud.chat.get(db=db, id=chat_id)
+    await message_writer.flush(chat_id)
+    chat = await crud.chat.get_with_messages(db=db, id=chat_id)
     if not chat or chat.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="对话不存在")
     return chat
\ No newline at end of file
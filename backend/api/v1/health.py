@@ -0,0 +1,37 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+
+from backend.api import deps
+from backend.core.logger import logging_stats
+from backend.core.principal import principal_cache
+from backend.services.admission import admission_controller
+from backend.services.chat import get_chat_service
+from backend.services.login_throttle import login_throttle
+from backend.services.streams import stream_registry
+from backend.services.llm import breaker_stats
+
+router = APIRouter()
+
+def _status(breakers: Dict[str, Dict[str, Any]]) -> str:
+    degraded = any(b["state"] != "closed" for b in breakers.values())
+    return "degraded" if degraded else "ok"
+
+@router.get("")
+async def health() -> Dict[str, str]:
+    """存活探针，只返回状态；任一模型熔断时标记为degraded"""
+    return {"status": _status(breaker_stats())}
+
+@router.get("/details", dependencies=[Depends(deps.require_admin)])
+async def health_details() -> Dict[str, Any]:
+    """服务内部运行状态，需要管理令牌"""
+    breakers = breaker_stats()
+    return {
+        "status": _status(breakers),
+        "models": breakers,
+        "admission": admission_controller.stats(),
+        "streams": stream_registry.stats(),
+        "chat": get_chat_service().stats(),
+        "auth": {**principal_cache.stats(), "login_throttle": login_throttle.stats()},
+        "logging": logging_stats(),
+    }
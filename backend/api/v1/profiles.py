@@ -0,0 +1,21 @@
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from backend.api import deps
+from backend.core.profiling import profile_store
+
+router = APIRouter(dependencies=[Depends(deps.require_admin)])
+
+@router.get("")
+async def list_profiles() -> List[Dict[str, Any]]:
+    """最近的剖析记录，按时间倒序"""
+    return profile_store.list()
+
+@router.get("/{profile_id}")
+async def get_profile(profile_id: str) -> Dict[str, Any]:
+    """一次请求的span时间线及CPU采样（如有）"""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="剖析记录不存在")
+    return profile.to_dict()
@@ -1 +0,0 @@
-# 标记config为Python包 
\ No newline at end of file
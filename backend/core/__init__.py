@@ -1,9 +1,21 @@
 from backend.core.config import settings
-from backend.core.security import create_access_token, verify_password, get_password_hash
+from backend.core.security import (
+    create_access_token,
+    verify_password,
+    get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
+    password_needs_rehash,
+    PasswordHashBusy
+)
 
 __all__ = [
     "settings",
     "create_access_token",
     "verify_password",
-    "get_password_hash"
+    "get_password_hash",
+    "verify_password_async",
+    "get_password_hash_async",
+    "password_needs_rehash",
+    "PasswordHashBusy"
 ] 
\ No newline at end of file
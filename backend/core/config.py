@@ -10,19 +10,133 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRE_MINUTES: int = 60
+    # 已认证用户的缓存，用户变更时主动失效；多进程部署时其他进程最多延迟TTL生效
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 300
+    # 密码哈希设置，调整BCRYPT_ROUNDS后旧哈希在用户登录时自动升级
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    # 登录失败限流，窗口内失败次数达到上限后暂时拒绝登录
+    LOGIN_MAX_FAILURES_PER_USER: int = 5
+    LOGIN_MAX_FAILURES_PER_IP: int = 20
+    LOGIN_FAILURE_WINDOW_SECONDS: int = 300
     
     # API设置
     DASHSCOPE_API_KEY: str
+    DASHSCOPE_BASE_URL: str = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+    DASHSCOPE_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    DASHSCOPE_READ_TIMEOUT_SECONDS: float = 60.0
+    DASHSCOPE_MAX_CONNECTIONS: int = 100
+    DASHSCOPE_MAX_KEEPALIVE: int = 20
     
-    # 数据库设置
+    # 模型设置，格式为 提供方:模型名（dashscope / local）
+    CHAT_MODEL: str = "dashscope:qwen-max"
+    TITLE_MODEL: str = "dashscope:qwen-turbo"
+    SUMMARY_MODEL: str = "dashscope:qwen-turbo"
+    # 主题未变化时跳过标题生成
+    TITLE_FAST_PATH_ENABLED: bool = True
+    # 对话模型熔断或失败时的降级模型，留空表示不降级
+    CHAT_FALLBACK_MODEL: str = ""
+    
+    # 模型调用超时、对冲重试与熔断
+    LLM_FIRST_TOKEN_TIMEOUT_SECONDS: float = 20.0
+    LLM_INTER_TOKEN_TIMEOUT_SECONDS: float = 15.0
+    LLM_COMPLETE_TIMEOUT_SECONDS: float = 30.0
+    LLM_HEDGE_DELAY_SECONDS: float = 5.0
+    LLM_MAX_ATTEMPTS: int = 2
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5
+    LLM_BREAKER_RESET_SECONDS: float = 30.0
+    
+    # 本地确定性模型设置，用于测试和压测
+    LOCAL_LLM_FIRST_TOKEN_DELAY: float = 0.0
+    LOCAL_LLM_TOKEN_RATE: float = 0.0
+    LOCAL_LLM_ANSWER_TOKENS: int = 50
+    LOCAL_LLM_FAILURE_RATE: float = 0.0
+    
+    # 数据库设置，支持sqlite和postgresql
     DATABASE_URL: str = "sqlite:///./ai_lawyer.db"
     SQL_ECHO: bool = False
+    # 启动时执行数据库迁移（alembic upgrade head）
+    DB_AUTO_MIGRATE: bool = True
+    # 启动时预先建立数据库连接和模型连接池、加载法条索引
+    STARTUP_WARMUP_ENABLED: bool = True
+    # 连接池设置
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # PostgreSQL预编译语句缓存，经pgbouncer事务模式连接时设为0
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # SQLite设置
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    SQLITE_MMAP_SIZE_BYTES: int = 268435456
+    
+    # 模型调用准入控制
+    LLM_MAX_CONCURRENCY: int = 20
+    LLM_MAX_QUEUE: int = 100
+    LLM_MAX_QUEUE_PER_USER: int = 3
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 30.0
+    
+    # SSE设置：token合并窗口、单帧最大字数、空闲心跳间隔
+    SSE_BATCH_WINDOW_SECONDS: float = 0.03
+    SSE_BATCH_MAX_CHARS: int = 512
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+    # 可续传生成流：重放缓冲事件数、断线后等待重连的时间、结束后保留时间、幂等键有效期
+    STREAM_REPLAY_MAX_EVENTS: int = 2000
+    STREAM_RESUME_GRACE_SECONDS: float = 30.0
+    STREAM_RETAIN_SECONDS: float = 300.0
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 86400
+    
+    # 消息批量写入设置
+    PERSIST_BATCH_MAX: int = 200
+    PERSIST_BATCH_WINDOW_SECONDS: float = 0.01
+    PERSIST_QUEUE_MAX: int = 10000
+    
+    # 对话上下文设置
+    CONTEXT_TOKEN_BUDGET: int = 6000
+    CONTEXT_HISTORY_LIMIT: int = 50
+    
+    # 滚动摘要设置
+    SUMMARY_TRIGGER_MESSAGES: int = 12
+    SUMMARY_KEEP_RECENT: int = 6
+    
+    # 回答缓存设置（memory / sqlite / none）
+    ANSWER_CACHE_BACKEND: str = "memory"
+    ANSWER_CACHE_TTL_SECONDS: int = 86400
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    ANSWER_CACHE_PATH: str = "./answer_cache.db"
+    
+    # 对话历史全文检索设置
+    SEARCH_ENABLED: bool = True
+    SEARCH_INDEX_PATH: str = "./search_index.db"
     
     # 向量数据库设置
     VECTOR_DB_PATH: str = "./vector_store"
+    RAG_ENABLED: bool = True
+    RAG_TOP_K: int = 3
+    RAG_DENSE_ENABLED: bool = False
+    RAG_DENSE_WEIGHT: float = 0.5
+    RAG_EMBEDDING_MODEL: str = "text-embedding-v2"
     
     # 日志设置
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # text或json
+    LOG_DIR: str = "logs"
+    LOG_FILE_MAX_BYTES: int = 20 * 1024 * 1024
+    LOG_FILE_BACKUP_COUNT: int = 5
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_REQUEST_SAMPLE_RATE: float = 1.0
+    LOG_RATE_LIMIT_SECONDS: float = 10.0
+    
+    # 请求剖析设置
+    PROFILE_ENABLED: bool = False
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_CPU_SAMPLE_INTERVAL_SECONDS: float = 0.005
+    PROFILE_MAX_STORED: int = 100
+    PROFILE_DUMP_DIR: str = ""
+    PROFILE_ADMIN_TOKEN: str = ""
     
     # CORS设置
     BACKEND_CORS_ORIGINS: List[str] = ["*"]
@@ -1,38 +1,234 @@
+"""日志配置
+
+日志记录只在调用方线程中做过滤和入队，格式化与磁盘/控制台写入由后台
+QueueListener线程完成，不阻塞事件循环。
+
+- 级别由LOG_LEVEL控制，LOG_FORMAT为text或json
+- 文件按LOG_FILE_MAX_BYTES轮转，保留LOG_FILE_BACKUP_COUNT个备份
+- 每个HTTP请求分配关联id（沿用客户端的X-Request-ID），该请求及其派生的
+  后台任务中的日志都带有request_id
+- 热路径日志两种限流方式：
+  extra=SAMPLED 的日志按请求采样，只有LOG_REQUEST_SAMPLE_RATE比例的请求记录；
+  extra=RATE_LIMITED 的日志同一调用点每LOG_RATE_LIMIT_SECONDS最多记录一条，
+  被省略的条数附在下一条中
+"""
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import atexit
+import copy
+import json
 import logging
+import queue
+import random
+import re
 import sys
-from pathlib import Path
+import threading
+import time
+import uuid
+
 from backend.core.config import settings
 
 # 创建logs目录
-LOG_PATH = Path("logs")
+LOG_PATH = Path(settings.LOG_DIR)
 LOG_PATH.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOG_PATH / "ai_lawyer.log"
 
 # 配置日志格式
-LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+# 热路径日志的extra参数
+SAMPLED = {"sampled": True}
+RATE_LIMITED = {"rate_limited": True}
+
+REQUEST_ID_HEADER = "x-request-id"
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+request_sampled_var: ContextVar[bool] = ContextVar("request_sampled", default=True)
+
+class ContextFilter(logging.Filter):
+    """附加request_id，并对热路径日志做采样和限流，在调用方线程中执行"""
+
+    def __init__(self, rate_limit_seconds: float):
+        super().__init__()
+        self.rate_limit_seconds = rate_limit_seconds
+        self.sampled_out = 0
+        self.suppressed = 0
+        # 调用点 -> (上次记录时间, 之后被省略的条数)
+        self._sites: Dict[Tuple[str, int], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        if getattr(record, "sampled", False) and not request_sampled_var.get():
+            self.sampled_out += 1
+            return False
+        if getattr(record, "rate_limited", False) and self.rate_limit_seconds > 0:
+            site = (record.pathname, record.lineno)
+            now = time.monotonic()
+            with self._lock:
+                last, skipped = self._sites.get(site, (0.0, 0))
+                if last and now - last < self.rate_limit_seconds:
+                    self._sites[site] = (last, skipped + 1)
+                    self.suppressed += 1
+                    return False
+                self._sites[site] = (now, 0)
+            if skipped:
+                record.msg = f"{record.getMessage()}（同类日志已省略{skipped}条）"
+                record.args = None
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+class DroppingQueueHandler(QueueHandler):
+    """队列满时丢弃日志而不是阻塞调用方"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并消息参数并渲染异常文本，完整格式化留给监听线程中的处理器
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def _level() -> int:
+    level = logging.getLevelName(settings.LOG_LEVEL.upper())
+    return level if isinstance(level, int) else logging.INFO
+
+def _formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT.lower() == "json":
+        return JsonFormatter()
+    return logging.Formatter(LOG_FORMAT)
 
 # 创建logger实例
 logger = logging.getLogger("ai_lawyer")
-logger.setLevel(logging.INFO)  # 设置为INFO级别
+logger.setLevel(_level())
+logger.propagate = False
 
 # 清除现有的处理器
 logger.handlers.clear()
 
-# 创建控制台处理器
+# 控制台和轮转文件处理器在监听线程中执行
 console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
-console_handler.setLevel(logging.INFO)  # 控制台显示INFO及以上级别
-logger.addHandler(console_handler)
+console_handler.setFormatter(_formatter())
+
+file_handler = RotatingFileHandler(
+    LOG_FILE,
+    maxBytes=settings.LOG_FILE_MAX_BYTES,
+    backupCount=settings.LOG_FILE_BACKUP_COUNT,
+    encoding="utf-8"
+)
+file_handler.setFormatter(_formatter())
 
-# 创建文件处理器
-file_handler = logging.FileHandler(LOG_FILE)
-file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
-file_handler.setLevel(logging.DEBUG)  # 文件记录DEBUG及以上级别
-logger.addHandler(file_handler)
+context_filter = ContextFilter(settings.LOG_RATE_LIMIT_SECONDS)
+queue_handler = DroppingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+queue_handler.addFilter(context_filter)
+logger.addHandler(queue_handler)
+
+listener = QueueListener(queue_handler.queue, console_handler, file_handler, respect_handler_level=True)
+listener.start()
+
+def shutdown_logging() -> None:
+    """写完队列中剩余的日志并停止监听线程，可重复调用"""
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+atexit.register(shutdown_logging)
 
 # 禁用uvicorn的访问日志
 uvicorn_logger = logging.getLogger("uvicorn.access")
 uvicorn_logger.disabled = True
 
+def logging_stats() -> Dict[str, Any]:
+    return {
+        "level": logging.getLevelName(logger.level),
+        "queued": queue_handler.queue.qsize(),
+        "dropped": queue_handler.dropped,
+        "sampled_out": context_filter.sampled_out,
+        "rate_limited": context_filter.suppressed,
+    }
+
+class RequestContextMiddleware:
+    """为每个HTTP请求设置关联id和采样标记，并在响应头中返回X-Request-ID
+
+    纯ASGI实现，不缓冲流式响应。
+    """
+
+    def __init__(self, app: Any, sample_rate: float = 1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = self._incoming_id(scope) or uuid.uuid4().hex[:16]
+        id_token = request_id_var.set(request_id)
+        sampled_token = request_sampled_var.set(
+            self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        )
+        header = (REQUEST_ID_HEADER.encode(), request_id.encode())
+
+        async def send_with_id(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [header]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(id_token)
+            request_sampled_var.reset(sampled_token)
+
+    @staticmethod
+    def _incoming_id(scope: Dict[str, Any]) -> Optional[str]:
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER.encode():
+                value = value.decode("latin-1")
+                return value if REQUEST_ID_PATTERN.match(value) else None
+        return None
+
 # 导出logger实例
-__all__ = ["logger"]
\ No newline at end of file
+__all__ = [
+    "logger",
+    "SAMPLED",
+    "RATE_LIMITED",
+    "RequestContextMiddleware",
+    "logging_stats",
+    "shutdown_logging",
+]
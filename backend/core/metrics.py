@@ -0,0 +1,249 @@
+"""进程内指标，以Prometheus文本格式导出
+
+只实现服务用到的Counter、Gauge、Histogram，记录一次观测只是加锁后的几次
+整数运算。应用指标统一定义在本模块底部，通过GET /metrics导出。
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple, TypeVar
+import functools
+import math
+import threading
+import time
+
+from backend.core.profiling import span
+
+# 延迟类指标的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> Any:
+        """返回指定标签值的子指标，首次使用时创建"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += self._samples()
+        return "\n".join(lines)
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, list(child.counts)):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {child.count}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """导出前调用，用于从组件状态更新Gauge"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+registry = MetricsRegistry()
+
+ResultType = TypeVar("ResultType")
+
+_in_query: ContextVar[bool] = ContextVar("metrics_in_query", default=False)
+
+def timed_query(func: Callable[..., Awaitable[ResultType]]) -> Callable[..., Awaitable[ResultType]]:
+    """记录CRUD方法的数据库耗时，标签为“表名.方法名”；嵌套调用只记录最外层
+
+    开启剖析的请求中同时记录为db.表名.方法名的span
+    """
+    @functools.wraps(func)
+    async def wrapper(self, *args: Any, **kwargs: Any) -> ResultType:
+        if _in_query.get():
+            return await func(self, *args, **kwargs)
+        label = f"{self.model.__tablename__}.{func.__name__}"
+        token = _in_query.set(True)
+        started = time.perf_counter()
+        try:
+            with span(f"db.{label}"):
+                return await func(self, *args, **kwargs)
+        finally:
+            _in_query.reset(token)
+            DB_SECONDS.labels(label).observe(time.perf_counter() - started)
+    return wrapper
+
+# 应用指标
+TTFT_SECONDS = registry.register(Histogram(
+    "ai_lawyer_ttft_seconds", "收到请求到发出首个token的时间"
+))
+GENERATION_SECONDS = registry.register(Histogram(
+    "ai_lawyer_generation_seconds", "一次回答生成的总时间", ["outcome"],
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+))
+TOKENS_PER_SECOND = registry.register(Histogram(
+    "ai_lawyer_generation_tokens_per_second", "首个token之后的输出速率（上游分块数/秒）",
+    buckets=(1, 5, 10, 20, 40, 80, 160, 320)
+))
+TITLE_SECONDS = registry.register(Histogram(
+    "ai_lawyer_title_generation_seconds", "标题生成的模型调用时间"
+))
+TITLE_REQUESTS = registry.register(Counter(
+    "ai_lawyer_title_requests_total", "标题生成请求数，result为generated或skipped", ["result"]
+))
+ANSWER_CACHE_REQUESTS = registry.register(Counter(
+    "ai_lawyer_answer_cache_requests_total", "首轮问题回答缓存的查询数，result为hit或miss", ["result"]
+))
+SINGLE_FLIGHT_EVENTS = registry.register(Counter(
+    "ai_lawyer_single_flight_total",
+    "相同模型请求合并，event为leader（发起上游调用）、coalesced（复用进行中的调用）或cancelled（无订阅者后取消）",
+    ["event"]
+))
+CHAT_STREAMS = registry.register(Counter(
+    "ai_lawyer_chat_streams_total", "回答生成流数量，outcome为completed或cancelled", ["outcome"]
+))
+DB_SECONDS = registry.register(Histogram(
+    "ai_lawyer_db_seconds", "CRUD方法的数据库耗时（含提交）", ["method"]
+))
+ADMISSION_WAIT_SECONDS = registry.register(Histogram(
+    "ai_lawyer_admission_wait_seconds", "模型调用准入的排队等待时间"
+))
+PERSIST_WAIT_SECONDS = registry.register(Histogram(
+    "ai_lawyer_persist_wait_seconds", "消息从进入写入队列到提交完成的时间"
+))
+ACTIVE_STREAMS = registry.register(Gauge(
+    "ai_lawyer_active_streams", "进行中的生成流数量"
+))
+ADMISSION_ACTIVE = registry.register(Gauge(
+    "ai_lawyer_admission_active", "正在进行的模型调用数量"
+))
+ADMISSION_QUEUED = registry.register(Gauge(
+    "ai_lawyer_admission_queued", "等待准入的请求数量"
+))
+STARTUP_SECONDS = registry.register(Gauge(
+    "ai_lawyer_startup_seconds", "应用启动阶段（数据库迁移与预热）的耗时"
+))
@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import Tuple
+import base64
+
+def encode_key_cursor(key: str, id: int) -> str:
+    """将排序键（字符串形式的键, id）编码为不透明的分页游标"""
+    raw = f"{key}|{id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_key_cursor(cursor: str) -> Tuple[str, int]:
+    """解析encode_key_cursor生成的游标，格式无效时抛出ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        key, id = raw.rsplit("|", 1)
+        return key, int(id)
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+def encode_cursor(position: datetime, id: int) -> str:
+    """将排序键（时间, id）编码为不透明的分页游标"""
+    return encode_key_cursor(position.isoformat(), id)
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析分页游标，格式无效时抛出ValueError"""
+    key, id = decode_key_cursor(cursor)
+    try:
+        return datetime.fromisoformat(key), id
+    except ValueError as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
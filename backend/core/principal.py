@@ -0,0 +1,90 @@
+"""已认证用户缓存
+
+请求鉴权分两级缓存：
+- 令牌缓存：已验证的JWT -> 用户id，条目在令牌过期时同时过期，命中时跳过签名校验
+- 用户缓存：用户id -> Principal，命中时不访问数据库
+
+用户被修改或删除时调用invalidate(user_id)使缓存失效。
+"""
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+import time
+
+from jose import JWTError, jwt
+from pydantic import ValidationError
+
+from backend.core.cache import TTLCache
+from backend.core.config import settings
+from backend.schemas.token import TokenPayload
+
+@dataclass(frozen=True)
+class Principal:
+    """请求中的当前用户，只包含鉴权和接口需要的字段"""
+    id: int
+    username: str
+
+PrincipalLoader = Callable[[int], Awaitable[Optional[Principal]]]
+
+class InvalidTokenError(Exception):
+    pass
+
+class PrincipalCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.ttl = ttl
+        self._tokens: TTLCache[str, int] = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._principals: TTLCache[int, Principal] = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.loads = 0
+
+    def verify_token(self, token: str) -> int:
+        """校验令牌并返回用户id，令牌无效时抛出InvalidTokenError"""
+        user_id = self._tokens.get(token)
+        if user_id is not None:
+            return user_id
+        try:
+            payload = jwt.decode(
+                token,
+                settings.JWT_SECRET_KEY,
+                algorithms=[settings.JWT_ALGORITHM]
+            )
+            token_data = TokenPayload(**payload)
+        except (JWTError, ValidationError) as e:
+            raise InvalidTokenError(str(e))
+        if token_data.sub is None:
+            raise InvalidTokenError("令牌缺少sub")
+        # 缓存时间不超过令牌剩余有效期
+        ttl = self.ttl
+        if "exp" in payload:
+            ttl = min(ttl, payload["exp"] - time.time())
+        if ttl > 0:
+            self._tokens.set(token, token_data.sub, ttl=ttl)
+        return token_data.sub
+
+    async def get(self, token: str, loader: PrincipalLoader) -> Optional[Principal]:
+        """返回令牌对应的用户，未命中时由loader从数据库加载，用户不存在时返回None"""
+        user_id = self.verify_token(token)
+        principal = self._principals.get(user_id)
+        if principal is not None:
+            return principal
+        self.loads += 1
+        principal = await loader(user_id)
+        if principal is None:
+            self._tokens.pop(token)
+            return None
+        self._principals.set(user_id, principal)
+        return principal
+
+    def invalidate(self, user_id: int) -> None:
+        """用户被修改或删除后调用；令牌缓存只保存用户id，无需清理"""
+        self._principals.pop(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tokens": self._tokens.stats(),
+            "principals": self._principals.stats(),
+            "loads": self.loads,
+        }
+
+principal_cache = PrincipalCache(
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
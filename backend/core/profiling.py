@@ -0,0 +1,266 @@
+"""按请求的性能剖析
+
+开启PROFILE_ENABLED后，请求头带X-Profile（值为1或cpu）或按PROFILE_SAMPLE_RATE
+随机命中的API请求会记录一条span时间线：认证、数据库方法、准入排队、标题生成、
+上下文构建、上游模型、消息落库等阶段各自的起止时间。X-Profile: cpu 时同时
+在后台线程中对事件循环线程做栈采样，结果为折叠栈格式（可直接用于火焰图）。
+采样的是整个事件循环，并发请求的耗时也会计入。
+
+结果保存在内存中最近PROFILE_MAX_STORED条，可通过管理接口读取；配置了
+PROFILE_DUMP_DIR时同时写入该目录下的JSON文件。响应头X-Profile-Id为剖析id。
+
+未开启剖析的请求上，span()只是一次ContextVar读取。
+"""
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+import asyncio
+import functools
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+
+from backend.core.config import settings
+from backend.core.logger import request_id_var
+
+logger = logging.getLogger("ai_lawyer")
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "x-profile-id"
+
+# 折叠栈的最大深度
+CPU_STACK_DEPTH = 64
+
+class Profile:
+    """一次请求的span时间线"""
+
+    def __init__(self, profile_id: str, method: str, path: str):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.created_at = time.time()
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.status: Optional[int] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.cpu: Optional[Dict[str, Any]] = None
+        self.finished = False
+
+    def add(self, name: str, start: float, end: float, **meta: Any) -> None:
+        # 结束后到达的span（如断开后仍在进行的生成）不再记录
+        if self.finished:
+            return
+        span = {
+            "name": name,
+            "start_ms": round((start - self.started) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+        }
+        if meta:
+            span["meta"] = meta
+        self.spans.append(span)
+
+    def finish(self, status: Optional[int]) -> None:
+        self.duration = time.perf_counter() - self.started
+        self.status = status
+        self.finished = True
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "created_at": self.created_at,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "spans": len(self.spans),
+            "cpu": self.cpu is not None,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.summary(),
+            "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+            "cpu": self.cpu,
+        }
+
+current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+
+@contextmanager
+def span(name: str, **meta: Any) -> Iterator[None]:
+    """记录一个阶段的耗时，当前请求未开启剖析时不做任何事"""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, start, time.perf_counter(), **meta)
+
+def record_span(name: str, start: float, end: Optional[float] = None, **meta: Any) -> None:
+    """记录已知起止时间（perf_counter）的阶段，用于跨越yield的区间"""
+    profile = current_profile.get()
+    if profile is not None:
+        profile.add(name, start, end if end is not None else time.perf_counter(), **meta)
+
+ResultType = TypeVar("ResultType")
+
+def profiled(name: str) -> Callable[[Callable[..., Awaitable[ResultType]]], Callable[..., Awaitable[ResultType]]]:
+    """将异步函数的一次调用记录为span"""
+    def decorator(func: Callable[..., Awaitable[ResultType]]) -> Callable[..., Awaitable[ResultType]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> ResultType:
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class CpuSampler:
+    """在后台线程中周期性采集指定线程的调用栈，汇总为折叠栈计数"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cpu-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop.set()
+        self._thread.join()
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "folded": [f"{stack} {count}" for stack, count in self.stacks.most_common()],
+        }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None and len(names) < CPU_STACK_DEPTH:
+                code = frame.f_code
+                names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+class ProfileStore:
+    """保存最近的剖析结果，可选写入磁盘"""
+
+    def __init__(self, max_profiles: int, dump_dir: str = ""):
+        self.max_profiles = max_profiles
+        self.dump_dir = Path(dump_dir) if dump_dir else None
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+
+    def add(self, profile: Profile) -> None:
+        self._profiles[profile.id] = profile
+        self._profiles.move_to_end(profile.id)
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [profile.summary() for profile in reversed(self._profiles.values())]
+
+    async def dump(self, profile: Profile) -> None:
+        if self.dump_dir is None:
+            return
+        path = self.dump_dir / f"{int(profile.created_at)}-{profile.id}.json"
+        payload = json.dumps(profile.to_dict(), ensure_ascii=False, indent=2)
+
+        def write() -> None:
+            self.dump_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text(payload, encoding="utf-8")
+
+        try:
+            await asyncio.to_thread(write)
+        except OSError as e:
+            logger.error(f"写入剖析结果失败 - 路径: {path}: {str(e)}")
+
+profile_store = ProfileStore(settings.PROFILE_MAX_STORED, settings.PROFILE_DUMP_DIR)
+
+class ProfilingMiddleware:
+    """按请求头或采样率为API请求开启剖析，纯ASGI实现"""
+
+    def __init__(
+        self,
+        app: Any,
+        prefix: str,
+        sample_rate: float = 0.0,
+        cpu_interval: float = 0.005,
+        exclude: tuple = ()
+    ):
+        self.app = app
+        self.prefix = prefix
+        self.sample_rate = sample_rate
+        self.cpu_interval = cpu_interval
+        self.exclude = exclude
+        # 同一时间只运行一个栈采样线程
+        self._cpu_busy = False
+
+    def _mode(self, scope: Dict[str, Any]) -> Optional[str]:
+        path = scope["path"]
+        if not path.startswith(self.prefix) or path.startswith(self.exclude):
+            return None
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER.encode():
+                value = value.decode("latin-1").strip().lower()
+                if value == "cpu":
+                    return "cpu"
+                if value in ("1", "true", "spans"):
+                    return "spans"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "spans"
+        return None
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        mode = self._mode(scope) if scope["type"] == "http" else None
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = request_id_var.get() if request_id_var.get() != "-" else uuid.uuid4().hex[:16]
+        profile = Profile(profile_id, scope["method"], scope["path"])
+        token = current_profile.set(profile)
+        sampler = None
+        if mode == "cpu" and not self._cpu_busy:
+            self._cpu_busy = True
+            sampler = CpuSampler(threading.get_ident(), self.cpu_interval)
+            sampler.start()
+        status = None
+
+        async def send_with_id(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER.encode(), profile.id.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            current_profile.reset(token)
+            if sampler is not None:
+                profile.cpu = await asyncio.to_thread(sampler.stop)
+                self._cpu_busy = False
+            profile.finish(status)
+            profile_store.add(profile)
+            await profile_store.dump(profile)
@@ -1,9 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Callable, TypeVar, Union
 from jose import jwt
+import asyncio
 import bcrypt
 from backend.core.config import settings
 
+ResultType = TypeVar("ResultType")
+
+# bcrypt是CPU密集的同步调用，放在独立的有界线程池中执行，不阻塞事件循环
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_hash_pending = 0
+
+class PasswordHashBusy(Exception):
+    """等待哈希的请求过多"""
+
 def create_access_token(
     subject: Union[str, Any], expires_delta: timedelta = None
 ) -> str:
@@ -34,6 +47,29 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     if isinstance(password, str):
         password = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password, salt)
-    return hashed.decode('utf-8') 
\ No newline at end of file
+    return hashed.decode('utf-8')
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """哈希的cost与当前BCRYPT_ROUNDS不一致时需要重新哈希"""
+    try:
+        return int(hashed_password.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return True
+
+async def _run_hash(func: Callable[..., ResultType], *args: Any) -> ResultType:
+    global _hash_pending
+    if _hash_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise PasswordHashBusy()
+    _hash_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hash(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hash(get_password_hash, password) 
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""SSE事件编码与token合并
+
+事件类型：
+- token：回答文本增量，data为原始文本（多行文本拆分为多个data行）
+- title：新的对话标题
+- usage：本次生成的统计，data为JSON
+- error：生成失败，data为JSON {"message": ...}
+- done：流正常结束，data为JSON
+- snapshot：断线重连时重放缓冲已淘汰，data为JSON {"text": 已生成全文, "title": ...}，
+  接收方用它替换已显示的内容
+
+连续的token事件在时间窗口内合并为一帧，减少小帧带来的系统调用和代理
+缓冲开销；首个token立即发送，不增加首token延迟。空闲时发送注释行作为
+心跳，避免代理在长时间生成中断开连接。
+"""
+from typing import Any, List, Optional
+import json
+import time
+
+HEARTBEAT = ": ping\n\n"
+
+def encode_event(event: str, data: str = "", event_id: Optional[str] = None) -> str:
+    """编码一个SSE事件，data中的换行拆分为多个data行，接收方按\\n拼接还原"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    for line in data.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        lines.append(f"data: {line}")
+    return "\n".join(lines) + "\n\n"
+
+def encode_json_event(event: str, payload: Any, event_id: Optional[str] = None) -> str:
+    return encode_event(event, json.dumps(payload, ensure_ascii=False), event_id)
+
+class TokenBatcher:
+    """合并连续的token事件
+
+    add()返回当前可以发送的帧；缓冲中的token在窗口到期（deadline）、
+    累计字数达到max_chars或遇到其他类型事件时发出。合并后的帧使用其中
+    最后一个token的事件id，断线重连时从该位置之后继续。
+    """
+
+    def __init__(self, window: float, max_chars: int):
+        self.window = window
+        self.max_chars = max_chars
+        self.deadline: Optional[float] = None
+        self.frames = 0
+        self.tokens = 0
+        self._buffer: List[str] = []
+        self._size = 0
+        self._last_id: Optional[str] = None
+        self._first_sent = False
+
+    def add(self, event: str, data: str, event_id: Optional[str] = None) -> List[str]:
+        if event != "token":
+            frames = self.flush()
+            frames.append(encode_event(event, data, event_id))
+            self.frames += 1
+            return frames
+
+        self.tokens += 1
+        if not self._first_sent or self.window <= 0:
+            self._first_sent = True
+            self.frames += 1
+            return [encode_event("token", data, event_id)]
+        if not self._buffer:
+            self.deadline = time.monotonic() + self.window
+        self._buffer.append(data)
+        self._last_id = event_id
+        self._size += len(data)
+        if self._size >= self.max_chars:
+            return self.flush()
+        return []
+
+    def flush_due(self) -> List[str]:
+        """窗口已到期时发出缓冲的token"""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return self.flush()
+        return []
+
+    def flush(self) -> List[str]:
+        if not self._buffer:
+            return []
+        frame = encode_event("token", "".join(self._buffer), self._last_id)
+        self._buffer.clear()
+        self._size = 0
+        self.deadline = None
+        self.frames += 1
+        return [frame]
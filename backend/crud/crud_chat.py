@@ -1,62 +1,207 @@
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from backend.core.metrics import timed_query
 from backend.crud.base import CRUDBase
 from backend.models.chat import Chat, Message
 from backend.schemas.chat import ChatCreate, ChatUpdate, MessageCreate
 
+# 对话列表中最后一条消息的预览长度
+LAST_MESSAGE_PREVIEW_CHARS = 60
+
 class CRUDChat(CRUDBase[Chat, ChatCreate, ChatUpdate]):
-    def get_user_chats(
-        self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100
-    ) -> List[Chat]:
-        return (
-            db.query(Chat)
-            .filter(Chat.user_id == user_id)
-            .order_by(Chat.updated_at.desc())
-            .offset(skip)
+    @timed_query
+    async def get_with_messages(self, db: AsyncSession, *, id: int) -> Optional[Chat]:
+        # 异步会话不支持懒加载，需要返回消息列表时显式预加载
+        result = await db.execute(
+            select(Chat).options(selectinload(Chat.messages)).filter(Chat.id == id)
+        )
+        return result.scalars().first()
+
+    @timed_query
+    async def get_titles(
+        self, db: AsyncSession, *, user_id: int, chat_ids: List[int]
+    ) -> Dict[int, str]:
+        """批量获取用户对话的标题，不存在或不属于该用户的对话不返回"""
+        if not chat_ids:
+            return {}
+        result = await db.execute(
+            select(Chat.id, Chat.title).where(Chat.user_id == user_id, Chat.id.in_(chat_ids))
+        )
+        return {chat_id: title for chat_id, title in result.all()}
+
+    @timed_query
+    async def get_chat_summaries(
+        self,
+        db: AsyncSession,
+        *,
+        user_id: int,
+        limit: int = 50,
+        before: Optional[Tuple[datetime, int]] = None
+    ) -> List[Dict[str, Any]]:
+        """按更新时间倒序获取对话摘要列表，before为上一页最后一项的 (updated_at, id)
+
+        消息数和最后一条消息通过关联子查询在同一条SQL中取得，
+        均走 (chat_id, created_at) 索引。
+        """
+        message_count = (
+            select(func.count(Message.id))
+            .where(Message.chat_id == Chat.id)
+            .correlate(Chat)
+            .scalar_subquery()
+        )
+        last_message = (
+            select(func.substr(Message.content, 1, LAST_MESSAGE_PREVIEW_CHARS))
+            .where(Message.chat_id == Chat.id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(1)
+            .correlate(Chat)
+            .scalar_subquery()
+        )
+        query = (
+            select(
+                Chat.id,
+                Chat.title,
+                Chat.created_at,
+                Chat.updated_at,
+                message_count.label("message_count"),
+                last_message.label("last_message"),
+            )
+            .where(Chat.user_id == user_id)
+            .order_by(Chat.updated_at.desc(), Chat.id.desc())
             .limit(limit)
-            .all()
         )
+        if before is not None:
+            updated_at, chat_id = before
+            query = query.where(or_(
+                Chat.updated_at < updated_at,
+                and_(Chat.updated_at == updated_at, Chat.id < chat_id)
+            ))
+        result = await db.execute(query)
+        return [dict(row) for row in result.mappings().all()]
     
-    def create_with_owner(
-        self, db: Session, *, obj_in: ChatCreate, user_id: int
+    @timed_query
+    async def create_with_owner(
+        self, db: AsyncSession, *, obj_in: ChatCreate, user_id: int
     ) -> Chat:
         obj_in_data = obj_in.model_dump()
         db_obj = Chat(**obj_in_data, user_id=user_id)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj, attribute_names=["messages"])
         return db_obj
     
-    def add_message(
-        self, db: Session, *, chat_id: int, message: MessageCreate
+    @timed_query
+    async def add_message(
+        self, db: AsyncSession, *, chat_id: int, message: MessageCreate
     ) -> Message:
         db_obj = Message(**message.model_dump(), chat_id=chat_id)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
         return db_obj
     
-    def get_messages(
-        self, db: Session, *, chat_id: int, skip: int = 0, limit: int = 100
+    @timed_query
+    async def save_batch(
+        self,
+        db: AsyncSession,
+        *,
+        messages: List[Dict[str, Any]],
+        chat_updates: Dict[int, Dict[str, Any]]
+    ) -> List[int]:
+        """在一个事务中批量插入消息并更新对话字段，只提交一次，返回按输入顺序的消息id"""
+        message_ids: List[int] = []
+        if messages:
+            result = await db.execute(
+                insert(Message).returning(Message.id, sort_by_parameter_order=True), messages
+            )
+            message_ids = list(result.scalars().all())
+        for chat_id, values in chat_updates.items():
+            await db.execute(update(Chat).where(Chat.id == chat_id).values(**values))
+        await db.commit()
+        return message_ids
+    
+    @timed_query
+    async def get_messages(
+        self,
+        db: AsyncSession,
+        *,
+        chat_id: int,
+        limit: int = 100,
+        before: Optional[Tuple[datetime, int]] = None
     ) -> List[Message]:
-        return (
-            db.query(Message)
+        """获取before (created_at, id) 之前最近的limit条消息，按时间正序返回"""
+        query = (
+            select(Message)
             .filter(Message.chat_id == chat_id)
-            .order_by(Message.created_at.asc())
-            .offset(skip)
+            .order_by(Message.created_at.desc(), Message.id.desc())
             .limit(limit)
-            .all()
         )
+        if before is not None:
+            created_at, message_id = before
+            query = query.where(or_(
+                Message.created_at < created_at,
+                and_(Message.created_at == created_at, Message.id < message_id)
+            ))
+        result = await db.execute(query)
+        messages = list(result.scalars().all())
+        messages.reverse()
+        return messages
+
+    @timed_query
+    async def get_recent_messages(
+        self, db: AsyncSession, *, chat_id: int, limit: int = 50, after_id: int = 0
+    ) -> List[Message]:
+        """获取id大于after_id的最近limit条消息，按时间正序返回"""
+        result = await db.execute(
+            select(Message)
+            .filter(Message.chat_id == chat_id, Message.id > after_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(limit)
+        )
+        messages = list(result.scalars().all())
+        messages.reverse()
+        return messages
+
+    @timed_query
+    async def get_unsummarized_messages(
+        self, db: AsyncSession, *, chat_id: int, after_id: int
+    ) -> List[Message]:
+        result = await db.execute(
+            select(Message)
+            .filter(Message.chat_id == chat_id, Message.id > after_id)
+            .order_by(Message.id.asc())
+        )
+        return list(result.scalars().all())
+
+    @timed_query
+    async def update_summary(
+        self, db: AsyncSession, *, id: int, summary: str, summary_upto_id: int
+    ) -> None:
+        # 摘要更新不应改变对话在列表中的排序，保持updated_at不变
+        await db.execute(
+            update(Chat)
+            .where(Chat.id == id)
+            .values(
+                summary=summary,
+                summary_upto_id=summary_upto_id,
+                updated_at=Chat.updated_at
+            )
+        )
+        await db.commit()
 
-    def update(
-        self, db: Session, *, id: int, obj_in: Dict[str, Any]
+    @timed_query
+    async def update(
+        self, db: AsyncSession, *, id: int, obj_in: Dict[str, Any]
     ) -> Chat:
-        db_obj = db.query(Chat).filter(Chat.id == id).first()
+        db_obj = await db.get(Chat, id)
         for field, value in obj_in.items():
             setattr(db_obj, field, value)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
         return db_obj
 
-crud_chat = CRUDChat(Chat) 
\ No newline at end of file
+crud_chat = CRUDChat(Chat) 
@@ -1,31 +1,60 @@
-from typing import Optional
-from sqlalchemy.orm import Session
+from typing import Any, Dict, Optional, Union
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from backend.crud.base import CRUDBase
 from backend.models.user import User
 from backend.schemas.user import UserCreate, UserUpdate
-from backend.core import get_password_hash, verify_password
+from backend.core import get_password_hash_async, password_needs_rehash, verify_password_async
+from backend.core.metrics import timed_query
+from backend.core.principal import principal_cache
 
 class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
-    def get_by_username(self, db: Session, *, username: str) -> Optional[User]:
-        return db.query(User).filter(User.username == username).first()
+    @timed_query
+    async def get_by_username(self, db: AsyncSession, *, username: str) -> Optional[User]:
+        result = await db.execute(select(User).filter(User.username == username))
+        return result.scalars().first()
 
-    def create(self, db: Session, *, obj_in: UserCreate) -> User:
+    async def create(self, db: AsyncSession, *, obj_in: UserCreate) -> User:
         db_obj = User(
             username=obj_in.username,
-            hashed_password=get_password_hash(obj_in.password)
+            hashed_password=await get_password_hash_async(obj_in.password)
         )
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
         return db_obj
 
-    def authenticate(self, db: Session, *, username: str, password: str) -> Optional[User]:
-        user = self.get_by_username(db, username=username)
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: User,
+        obj_in: Union[UserUpdate, Dict[str, Any]]
+    ) -> User:
+        update_data = obj_in if isinstance(obj_in, dict) else obj_in.dict(exclude_unset=True)
+        if update_data.get("password"):
+            update_data = {**update_data, "hashed_password": await get_password_hash_async(update_data["password"])}
+        user = await super().update(db, db_obj=db_obj, obj_in=update_data)
+        principal_cache.invalidate(user.id)
+        return user
+
+    @timed_query
+    async def remove(self, db: AsyncSession, *, id: int) -> User:
+        user = await super().remove(db, id=id)
+        principal_cache.invalidate(id)
+        return user
+
+    async def authenticate(self, db: AsyncSession, *, username: str, password: str) -> Optional[User]:
+        user = await self.get_by_username(db, username=username)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        if not await verify_password_async(password, user.hashed_password):
             return None
+        if password_needs_rehash(user.hashed_password):
+            # 用户登录时持有明文密码，借机按当前cost升级哈希
+            user.hashed_password = await get_password_hash_async(password)
+            await db.commit()
         return user
 
 # 创建一个全局实例
-crud_user = CRUDUser(User) 
\ No newline at end of file
+crud_user = CRUDUser(User) 
@@ -1,7 +1,16 @@
 from typing import Any
+from sqlalchemy import MetaData
 from sqlalchemy.ext.declarative import as_declarative, declared_attr
 
-@as_declarative()
+# 约束命名规则，迁移中可按名称修改约束（SQLite的匿名约束无法单独删除）
+NAMING_CONVENTION = {
+    "ix": "ix_%(column_0_label)s",
+    "uq": "uq_%(table_name)s_%(column_0_name)s",
+    "ck": "ck_%(table_name)s_%(constraint_name)s",
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+}
+
+@as_declarative(metadata=MetaData(naming_convention=NAMING_CONVENTION))
 class Base:
     id: Any
     __name__: str
@@ -0,0 +1,145 @@
+"""数据库迁移检查
+
+在临时数据库上验证迁移脚本，发布前或修改迁移后运行：
+    python -m backend.db.check_migrations
+
+- SQLite新库：升级到最新版本，降级到空库，再升级
+- SQLite旧库：最初版本create_all建出的结构，按启动流程标记0001后升级
+- PostgreSQL：离线生成升级和降级SQL（无需数据库服务），检查删除的约束和
+  索引都由之前的语句以同名创建
+
+每次升级后与模型定义比对，结构存在差异时失败。
+"""
+from pathlib import Path
+from typing import List, Optional, Set
+import io
+import logging
+import re
+import sys
+import tempfile
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection
+
+from backend.core.logger import logger
+from backend.db.base import Base
+from backend.db.migrate import ALEMBIC_INI, _upgrade, alembic_config
+
+# 最初版本中Base.metadata.create_all在SQLite上建出的结构
+LEGACY_SQLITE_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER NOT NULL,
+    username VARCHAR,
+    hashed_password VARCHAR,
+    created_at DATETIME,
+    updated_at DATETIME,
+    PRIMARY KEY (id)
+);
+CREATE INDEX ix_user_id ON user (id);
+CREATE UNIQUE INDEX ix_user_username ON user (username);
+CREATE TABLE chat (
+    id INTEGER NOT NULL,
+    user_id INTEGER,
+    title VARCHAR,
+    created_at DATETIME,
+    updated_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE INDEX ix_chat_id ON chat (id);
+CREATE TABLE message (
+    id INTEGER NOT NULL,
+    chat_id INTEGER,
+    role VARCHAR,
+    content TEXT,
+    created_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(chat_id) REFERENCES chat (id)
+);
+CREATE INDEX ix_message_id ON message (id);
+INSERT INTO user (id, username, hashed_password) VALUES (1, 'legacy', 'x');
+INSERT INTO chat (id, user_id, title) VALUES (1, 1, '旧对话');
+INSERT INTO message (chat_id, role, content) VALUES (1, 'user', '旧消息');
+"""
+
+POSTGRESQL_URL = "postgresql+asyncpg://check@localhost/check"
+
+CREATED = re.compile(r"(?:CONSTRAINT|INDEX)\s+(?:IF NOT EXISTS\s+)?\"?(\w+)\"?", re.IGNORECASE)
+DROPPED = re.compile(r"DROP\s+(?:CONSTRAINT|INDEX)\s+(?:IF EXISTS\s+)?\"?(\w+)\"?", re.IGNORECASE)
+
+def _schema_diff(connection: Connection) -> List[str]:
+    context = MigrationContext.configure(connection, opts={"compare_type": True})
+    return [str(diff) for diff in compare_metadata(context, Base.metadata)]
+
+def _check_sqlite(path: Path, legacy: bool) -> List[str]:
+    engine = create_engine(f"sqlite:///{path}")
+    errors = []
+    try:
+        with engine.connect() as connection:
+            if legacy:
+                connection.connection.executescript(LEGACY_SQLITE_SCHEMA)
+            _upgrade(connection)
+            errors += [f"升级后结构与模型不一致: {diff}" for diff in _schema_diff(connection)]
+            if not legacy:
+                config = alembic_config(connection)
+                command.downgrade(config, "base")
+                command.upgrade(config, "head")
+                errors += [f"降级后重新升级的结构与模型不一致: {diff}" for diff in _schema_diff(connection)]
+            elif connection.exec_driver_sql("SELECT COUNT(*) FROM message").scalar() != 1:
+                errors.append("旧库升级后数据丢失")
+    finally:
+        engine.dispose()
+    return errors
+
+def _offline_sql(url: str, upgrade: bool) -> str:
+    buffer = io.StringIO()
+    config = Config(str(ALEMBIC_INI), output_buffer=buffer)
+    config.attributes["url"] = url
+    if upgrade:
+        command.upgrade(config, "head", sql=True)
+    else:
+        command.downgrade(config, "head:base", sql=True)
+    return buffer.getvalue()
+
+def _check_offline(url: str) -> List[str]:
+    """按顺序检查离线SQL中删除的约束和索引是否都已以同名创建"""
+    errors = []
+    existing: Set[str] = set()
+    for sql in (_offline_sql(url, upgrade=True), _offline_sql(url, upgrade=False)):
+        for statement in sql.split(";"):
+            dropped = DROPPED.search(statement)
+            if dropped is not None:
+                name = dropped.group(1)
+                if name not in existing:
+                    errors.append(f"删除不存在的约束或索引: {name}")
+                existing.discard(name)
+                continue
+            existing.update(CREATED.findall(statement))
+    return errors
+
+def main(argv: Optional[List[str]] = None) -> int:
+    # 进度输出不受服务的LOG_LEVEL影响
+    logger.setLevel(logging.INFO)
+    workdir = Path(tempfile.mkdtemp(prefix="ai_lawyer_migrations_"))
+    checks = {
+        "SQLite新库": lambda: _check_sqlite(workdir / "fresh.db", legacy=False),
+        "SQLite旧库": lambda: _check_sqlite(workdir / "legacy.db", legacy=True),
+        "PostgreSQL离线SQL": lambda: _check_offline(POSTGRESQL_URL),
+    }
+    failed = False
+    for name, check in checks.items():
+        errors = check()
+        for error in errors:
+            logger.error(f"迁移检查失败 - {name}: {error}")
+        if errors:
+            failed = True
+        else:
+            logger.info(f"迁移检查通过 - {name}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
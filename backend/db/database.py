@@ -1,18 +1,74 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from typing import Any, AsyncGenerator, Dict
+from sqlalchemy import event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from backend.core.config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    echo=settings.SQL_ECHO
-)
+# 同步驱动URL映射到对应的异步驱动，兼容已有的.env配置
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def get_async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+def engine_options(url: URL) -> Dict[str, Any]:
+    """按数据库类型生成create_async_engine参数"""
+    options: Dict[str, Any] = {"echo": settings.SQL_ECHO}
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            return options
+        # 本地文件无需检测断连；写锁冲突时由sqlite3按busy_timeout等待
+        options["connect_args"] = {"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}
+    else:
+        options.update(pool_pre_ping=True, pool_recycle=settings.DB_POOL_RECYCLE_SECONDS)
+        if url.drivername == "postgresql+asyncpg":
+            options["connect_args"] = {"statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    )
+    return options
+
+def set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    """WAL模式下读写互不阻塞；每个新连接都需要设置的PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # WAL下NORMAL只在断电时可能丢失最近的事务，不会损坏数据库
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE_BYTES}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def build_engine(url: str = settings.DATABASE_URL) -> AsyncEngine:
+    async_url = make_url(get_async_database_url(url))
+    if async_url.drivername == "postgresql+asyncpg":
+        # SQLAlchemy适配层自身的预编译语句缓存，与asyncpg的缓存保持一致
+        async_url = async_url.update_query_dict(
+            {"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)}
+        )
+    async_engine = create_async_engine(async_url, **engine_options(async_url))
+    if async_url.get_backend_name() == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+    return async_engine
+
+engine = build_engine()
+
+SessionLocal = async_sessionmaker(
+    bind=engine,
+    autoflush=False,
+    expire_on_commit=False
+)
 
-def get_db():
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        await db.close()
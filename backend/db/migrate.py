@@ -0,0 +1,39 @@
+"""启动时执行数据库迁移
+
+此前版本由Base.metadata.create_all建表，没有alembic_version表；这类数据库
+先标记为初始版本0001，再升级到最新版本；这些数据库中由create_all创建的列和
+索引各不相同，0002按实际结构只补齐缺少的部分。
+"""
+from pathlib import Path
+import logging
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+
+from backend.db.database import engine
+
+logger = logging.getLogger("ai_lawyer")
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+BASELINE_REVISION = "0001"
+
+def alembic_config(connection: Connection) -> Config:
+    config = Config(str(ALEMBIC_INI))
+    config.attributes["connection"] = connection
+    return config
+
+def _upgrade(connection: Connection) -> None:
+    tables = set(inspect(connection).get_table_names())
+    config = alembic_config(connection)
+    if "user" in tables and "alembic_version" not in tables:
+        logger.info(f"检测到未纳入迁移管理的数据库，标记为版本 {BASELINE_REVISION}")
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+
+async def upgrade_database() -> None:
+    """升级数据库到最新版本（alembic upgrade head）"""
+    async with engine.connect() as connection:
+        await connection.run_sync(_upgrade)
+    logger.info("数据库迁移完成")
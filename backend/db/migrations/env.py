@@ -0,0 +1,69 @@
+"""Alembic迁移环境
+
+连接地址取自settings.DATABASE_URL。应用启动时（backend/db/migrate.py）通过
+config.attributes["connection"]传入已建立的连接，命令行调用时自行创建引擎。
+"""
+from logging.config import fileConfig
+import asyncio
+
+from alembic import context
+from sqlalchemy.engine import Connection
+
+from backend.core.config import settings
+from backend.db.base import Base
+from backend.db.database import build_engine, get_async_database_url
+from backend.models.chat import Chat, Message  # noqa: F401 注册模型
+from backend.models.user import User  # noqa: F401
+
+config = context.config
+target_metadata = Base.metadata
+
+def do_run_migrations(connection: Connection) -> None:
+    sqlite = connection.dialect.name == "sqlite"
+    if sqlite:
+        # SQLite的ALTER通过重建表实现，删除旧表会触发外键级联，迁移期间关闭外键检查；
+        # 该PRAGMA在事务中无效，需在开始迁移事务之前执行
+        connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        connection.commit()
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=sqlite,
+        compare_type=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+    connection.commit()
+    if sqlite:
+        connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+        connection.commit()
+
+def run_migrations_offline() -> None:
+    """只输出SQL（alembic upgrade head --sql），可通过config.attributes["url"]指定数据库类型"""
+    url = config.attributes.get("url") or get_async_database_url(settings.DATABASE_URL)
+    context.configure(
+        url=url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=url.startswith("sqlite"),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+async def run_async_migrations() -> None:
+    engine = build_engine()
+    try:
+        async with engine.connect() as connection:
+            await connection.run_sync(do_run_migrations)
+    finally:
+        await engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif config.attributes.get("connection") is not None:
+    do_run_migrations(config.attributes["connection"])
+else:
+    if config.config_file_name is not None:
+        fileConfig(config.config_file_name, disable_existing_loggers=False)
+    asyncio.run(run_async_migrations())
@@ -0,0 +1,69 @@
+"""对话滚动摘要、截断标记和分页索引
+
+- chat.summary、chat.summary_upto_id：滚动摘要
+- message.truncated：客户端中途断开时保存的部分回答
+- 对话列表和消息列表的分页索引
+
+引入迁移之前的版本通过create_all建表，已有数据库可能已包含其中部分列或
+索引（新建库时创建，旧库不会补齐），升级时只添加实际缺少的部分。
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Set, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _existing_columns(table: str) -> Set[str]:
+    # 只输出SQL时无法查看数据库，按0001的结构处理
+    if context.is_offline_mode():
+        return set()
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _existing_indexes(table: str) -> Set[str]:
+    if context.is_offline_mode():
+        return set()
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade() -> None:
+    chat_columns = _existing_columns("chat")
+    if "summary" not in chat_columns:
+        op.add_column("chat", sa.Column("summary", sa.Text(), nullable=True))
+    if "summary_upto_id" not in chat_columns:
+        op.add_column(
+            "chat",
+            sa.Column("summary_upto_id", sa.Integer(), nullable=False, server_default="0")
+        )
+    if "truncated" not in _existing_columns("message"):
+        op.add_column(
+            "message",
+            sa.Column("truncated", sa.Boolean(), nullable=False, server_default=sa.false())
+        )
+
+    if "ix_chat_user_id_updated_at" not in _existing_indexes("chat"):
+        op.create_index("ix_chat_user_id_updated_at", "chat", ["user_id", "updated_at"])
+    if "ix_message_chat_id_created_at" not in _existing_indexes("message"):
+        op.create_index("ix_message_chat_id_created_at", "message", ["chat_id", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_message_chat_id_created_at", table_name="message")
+    op.drop_index("ix_chat_user_id_updated_at", table_name="chat")
+
+    with op.batch_alter_table("message") as batch_op:
+        batch_op.drop_column("truncated")
+
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.drop_column("summary_upto_id")
+        batch_op.drop_column("summary")
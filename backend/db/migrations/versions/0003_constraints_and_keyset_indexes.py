@@ -0,0 +1,111 @@
+"""外键级联删除、非空与取值约束，键集分页索引
+
+- chat.user_id、message.chat_id非空，外键ON DELETE CASCADE，删除对话时
+  由数据库删除消息，ORM不必先加载全部消息
+- user.username、user.hashed_password、message.role非空，role只能为user或assistant
+- 分页索引加入id列，与ORDER BY (时间, id)完全一致
+- 删除主键上多余的普通索引
+
+升级前删除没有所属对话或用户的孤立记录，这些记录无法通过接口访问。
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# SQLite重建表时为匿名外键命名，以便删除；与约束命名规则一致
+BATCH_NAMING = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+
+def _existing_fk(table: str, column: str, referred: str) -> str:
+    """升级前外键的实际名称
+
+    经0001创建的外键按命名规则命名；由create_all建表后标记为0001的数据库中，
+    PostgreSQL为自动命名（如chat_user_id_fkey），SQLite为匿名（重建表时按
+    BATCH_NAMING命名）。只输出SQL时无法查看数据库，按0001创建的名称处理。
+    """
+    default = f"fk_{table}_{column}_{referred}"
+    if context.is_offline_mode():
+        return default
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        if fk["constrained_columns"] == [column] and fk["referred_table"] == referred:
+            return fk["name"] or default
+    return default
+
+
+def upgrade() -> None:
+    op.execute('DELETE FROM chat WHERE user_id IS NULL OR user_id NOT IN (SELECT id FROM "user")')
+    op.execute("DELETE FROM message WHERE chat_id IS NULL OR chat_id NOT IN (SELECT id FROM chat)")
+
+    op.drop_index("ix_user_id", table_name="user")
+    op.drop_index("ix_chat_id", table_name="chat")
+    op.drop_index("ix_chat_user_id_updated_at", table_name="chat")
+    op.drop_index("ix_message_id", table_name="message")
+    op.drop_index("ix_message_chat_id_created_at", table_name="message")
+
+    with op.batch_alter_table("user") as batch_op:
+        batch_op.alter_column("username", existing_type=sa.String(), nullable=False)
+        batch_op.alter_column("hashed_password", existing_type=sa.String(), nullable=False)
+
+    with op.batch_alter_table("chat", naming_convention=BATCH_NAMING) as batch_op:
+        batch_op.alter_column("user_id", existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_constraint(_existing_fk("chat", "user_id", "user"), type_="foreignkey")
+        batch_op.create_foreign_key(
+            op.f("fk_chat_user_id_user"), "user", ["user_id"], ["id"], ondelete="CASCADE"
+        )
+
+    with op.batch_alter_table("message", naming_convention=BATCH_NAMING) as batch_op:
+        batch_op.alter_column("chat_id", existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column("role", existing_type=sa.String(), nullable=False)
+        batch_op.drop_constraint(_existing_fk("message", "chat_id", "chat"), type_="foreignkey")
+        batch_op.create_foreign_key(
+            op.f("fk_message_chat_id_chat"), "chat", ["chat_id"], ["id"], ondelete="CASCADE"
+        )
+        batch_op.create_check_constraint(op.f("ck_message_role"), "role IN ('user', 'assistant')")
+
+    op.create_index("ix_chat_user_id_updated_at_id", "chat", ["user_id", "updated_at", "id"])
+    op.create_index("ix_message_chat_id_created_at_id", "message", ["chat_id", "created_at", "id"])
+
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        # 迁移期间外键检查已关闭，PostgreSQL在添加外键时已校验
+        violations = bind.exec_driver_sql("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            raise RuntimeError(f"存在违反外键约束的记录: {violations[:10]}")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_message_chat_id_created_at_id", table_name="message")
+    op.drop_index("ix_chat_user_id_updated_at_id", table_name="chat")
+
+    with op.batch_alter_table("message") as batch_op:
+        batch_op.drop_constraint(op.f("ck_message_role"), type_="check")
+        batch_op.drop_constraint(op.f("fk_message_chat_id_chat"), type_="foreignkey")
+        batch_op.create_foreign_key(op.f("fk_message_chat_id_chat"), "chat", ["chat_id"], ["id"])
+        batch_op.alter_column("role", existing_type=sa.String(), nullable=True)
+        batch_op.alter_column("chat_id", existing_type=sa.Integer(), nullable=True)
+
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.drop_constraint(op.f("fk_chat_user_id_user"), type_="foreignkey")
+        batch_op.create_foreign_key(op.f("fk_chat_user_id_user"), "user", ["user_id"], ["id"])
+        batch_op.alter_column("user_id", existing_type=sa.Integer(), nullable=True)
+
+    with op.batch_alter_table("user") as batch_op:
+        batch_op.alter_column("hashed_password", existing_type=sa.String(), nullable=True)
+        batch_op.alter_column("username", existing_type=sa.String(), nullable=True)
+
+    op.create_index("ix_message_chat_id_created_at", "message", ["chat_id", "created_at"])
+    op.create_index("ix_message_id", "message", ["id"])
+    op.create_index("ix_chat_user_id_updated_at", "chat", ["user_id", "updated_at"])
+    op.create_index("ix_chat_id", "chat", ["id"])
+    op.create_index("ix_user_id", "user", ["id"])
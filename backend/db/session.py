@@ -1,10 +1,2 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from backend.core.config import settings
-
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    echo=settings.SQL_ECHO
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) 
\ No newline at end of file
+# 兼容旧的导入路径，引擎与会话工厂统一在database.py中按配置创建
+from backend.db.database import SessionLocal, engine, get_db  # noqa: F401
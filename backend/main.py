@@ -1,23 +1,64 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-import logging
+from sqlalchemy import text
+import time
 
+from backend.api.metrics import router as metrics_router
 from backend.api.v1 import api_router
 from backend.core.config import settings
-from backend.db.base_class import Base
+from backend.core.metrics import STARTUP_SECONDS
 from backend.db.database import engine
-from backend.core.logger import logger
+from backend.services import chat
+from backend.services.llm import model_registry
+from backend.services.persistence import message_writer
+from backend.services.streams import stream_registry
+from backend.core.logger import RequestContextMiddleware, logger, shutdown_logging
+from backend.core.profiling import ProfilingMiddleware
 
 # 初始化日志
 logger.info("=== 启动AI Lawyer服务 ===")
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
+async def startup() -> None:
+    started = time.perf_counter()
+    # 升级数据库结构，多实例部署时可关闭DB_AUTO_MIGRATE，改为发布前执行alembic upgrade head
+    if settings.DB_AUTO_MIGRATE:
+        # alembic只在迁移时导入，不计入worker的导入耗时
+        from backend.db.migrate import upgrade_database
+        await upgrade_database()
+    # 预先建立数据库连接、模型连接池并加载法条索引，避免由首个请求承担
+    if settings.STARTUP_WARMUP_ENABLED:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        await chat.warm_up()
+    elapsed = time.perf_counter() - started
+    STARTUP_SECONDS.set(elapsed)
+    logger.info(f"服务启动完成 - 迁移与预热耗时: {elapsed:.3f}s")
+
+async def shutdown() -> None:
+    # 先停止进行中的生成并保存已生成部分，再写完队列中尚未落库的消息
+    await stream_registry.aclose()
+    await message_writer.close()
+    # 关闭模型提供方的连接池和数据库连接
+    await model_registry.aclose()
+    await engine.dispose()
+    # 最后写完日志队列
+    shutdown_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # 配置CORS
@@ -29,8 +70,22 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有头部
 )
 
+# 请求剖析，位于关联id中间件内层以复用请求id
+if settings.PROFILE_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        prefix=settings.API_V1_STR,
+        sample_rate=settings.PROFILE_SAMPLE_RATE,
+        cpu_interval=settings.PROFILE_CPU_SAMPLE_INTERVAL_SECONDS,
+        exclude=(f"{settings.API_V1_STR}/admin",)
+    )
+
+# 请求关联id与日志采样
+app.add_middleware(RequestContextMiddleware, sample_rate=settings.LOG_REQUEST_SAMPLE_RATE)
+
 # API路由
 app.include_router(api_router, prefix=settings.API_V1_STR)
+app.include_router(metrics_router)
 
 # 挂载静态文件
 app.mount("/", StaticFiles(directory="frontend", html=True), name="static")
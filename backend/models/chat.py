@@ -1,25 +1,44 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Boolean, CheckConstraint, Column, Integer, String, DateTime, ForeignKey, Index, Text
 from sqlalchemy.orm import relationship
 from backend.db.base_class import Base
 import datetime
 
 class Chat(Base):
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('user.id'))
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('user.id', ondelete="CASCADE"), nullable=False)
     title = Column(String, default="新对话")
+    # 滚动摘要：summary_upto_id及之前的消息已折叠进summary
+    summary = Column(Text, nullable=True)
+    summary_upto_id = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     
     # 关联关系
     user = relationship("User", back_populates="chats")
-    messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
+    # 删除对话时由数据库级联删除消息，不必先加载全部消息
+    messages = relationship(
+        "Message", back_populates="chat", cascade="all, delete-orphan", passive_deletes=True
+    )
+    
+    # 对话列表按 (user_id, updated_at, id) 键集分页
+    __table_args__ = (
+        Index("ix_chat_user_id_updated_at_id", "user_id", "updated_at", "id"),
+    )
 
 class Message(Base):
-    id = Column(Integer, primary_key=True, index=True)
-    chat_id = Column(Integer, ForeignKey('chat.id'))
-    role = Column(String)  # 'user' 或 'assistant'
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(Integer, ForeignKey('chat.id', ondelete="CASCADE"), nullable=False)
+    role = Column(String, nullable=False)  # 'user' 或 'assistant'
     content = Column(Text)
+    # 客户端中途断开时保存的部分回答
+    truncated = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # 关联关系
-    chat = relationship("Chat", back_populates="messages")
\ No newline at end of file
+    chat = relationship("Chat", back_populates="messages")
+    
+    # 消息列表按 (chat_id, created_at, id) 键集分页
+    __table_args__ = (
+        Index("ix_message_chat_id_created_at_id", "chat_id", "created_at", "id"),
+        CheckConstraint("role IN ('user', 'assistant')", name="role"),
+    )
\ No newline at end of file
@@ -4,11 +4,11 @@ from backend.db.base_class import Base
 import datetime
 
 class User(Base):
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True)
-    hashed_password = Column(String)
+    id = Column(Integer, primary_key=True)
+    username = Column(String, unique=True, index=True, nullable=False)
+    hashed_password = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     
     # 关联关系
-    chats = relationship("Chat", back_populates="user", cascade="all, delete-orphan")
\ No newline at end of file
+    chats = relationship("Chat", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
\ No newline at end of file
@@ -0,0 +1,3 @@
+from backend.rag.index import RetrievedChunk, StatuteIndex, build_index, tokenize
+
+__all__ = ["RetrievedChunk", "StatuteIndex", "build_index", "tokenize"]
@@ -0,0 +1,16 @@
+from http import HTTPStatus
+from typing import List
+from dashscope import TextEmbedding
+from backend.core.config import settings
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """调用DashScope文本向量模型，按输入顺序返回向量"""
+    response = TextEmbedding.call(
+        model=settings.RAG_EMBEDDING_MODEL,
+        input=texts,
+        api_key=settings.DASHSCOPE_API_KEY
+    )
+    if response.status_code != HTTPStatus.OK:
+        raise RuntimeError(f"文本向量生成失败: {response.code} {response.message}")
+    embeddings = sorted(response.output["embeddings"], key=lambda item: item["text_index"])
+    return [item["embedding"] for item in embeddings]
@@ -0,0 +1,265 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+import json
+import logging
+import mmap
+import re
+import threading
+import numpy as np
+
+logger = logging.getLogger("ai_lawyer")
+
+INDEX_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 稠密向量仅用于对BM25候选集重排，候选集大小
+DENSE_CANDIDATES = 50
+
+CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]+")
+WORD = re.compile(r"[A-Za-z0-9]+")
+
+# 索引目录中的文件
+META_FILE = "meta.json"
+VOCAB_FILE = "vocab.json"
+CHUNKS_FILE = "chunks.jsonl"
+CHUNK_OFFSETS_FILE = "chunk_offsets.npy"
+POSTING_OFFSETS_FILE = "posting_offsets.npy"
+POSTING_DOCS_FILE = "posting_docs.npy"
+POSTING_TFS_FILE = "posting_tfs.npy"
+DOC_LENGTHS_FILE = "doc_lengths.npy"
+IDF_FILE = "idf.npy"
+VECTORS_FILE = "vectors.npy"
+
+def tokenize(text: str) -> List[str]:
+    """中文按字二元组切分，英文和数字按词切分并转小写"""
+    tokens: List[str] = []
+    for run in CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(word.lower() for word in WORD.findall(text))
+    return tokens
+
+@dataclass
+class RetrievedChunk:
+    """检索到的法条片段"""
+    law: str
+    article: str
+    text: str
+    score: float
+
+    def format(self) -> str:
+        header = f"《{self.law}》{self.article}" if self.article else f"《{self.law}》"
+        return f"{header}\n{self.text}"
+
+def build_index(
+    chunks: Sequence[Dict[str, str]],
+    output_dir: str,
+    vectors: Optional[np.ndarray] = None
+) -> None:
+    """构建BM25倒排索引并写入output_dir
+
+    chunks中每项包含law、article、chapter、text字段，vectors为可选的
+    与chunks一一对应的稠密向量。先写入临时目录再整体替换，避免服务读到
+    不完整的索引。
+    """
+    output = Path(output_dir)
+    staging = output.with_name(output.name + ".tmp")
+    staging.mkdir(parents=True, exist_ok=True)
+
+    vocab: Dict[str, int] = {}
+    postings: List[Dict[int, int]] = []
+    doc_lengths = np.zeros(len(chunks), dtype=np.float32)
+
+    for doc_id, chunk in enumerate(chunks):
+        tokens = tokenize(f"{chunk['law']} {chunk['article']} {chunk['text']}")
+        doc_lengths[doc_id] = len(tokens)
+        for token in tokens:
+            term_id = vocab.setdefault(token, len(vocab))
+            if term_id == len(postings):
+                postings.append({})
+            postings[term_id][doc_id] = postings[term_id].get(doc_id, 0) + 1
+
+    posting_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    for term_id, docs in enumerate(postings):
+        posting_offsets[term_id + 1] = posting_offsets[term_id] + len(docs)
+    posting_docs = np.empty(posting_offsets[-1], dtype=np.int32)
+    posting_tfs = np.empty(posting_offsets[-1], dtype=np.float32)
+    for term_id, docs in enumerate(postings):
+        start = posting_offsets[term_id]
+        for i, (doc_id, tf) in enumerate(sorted(docs.items())):
+            posting_docs[start + i] = doc_id
+            posting_tfs[start + i] = tf
+
+    num_docs = len(chunks)
+    df = np.diff(posting_offsets).astype(np.float32)
+    idf = np.log(1 + (num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    chunk_offsets = np.zeros(num_docs + 1, dtype=np.int64)
+    with open(staging / CHUNKS_FILE, "wb") as f:
+        for doc_id, chunk in enumerate(chunks):
+            line = (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            chunk_offsets[doc_id + 1] = chunk_offsets[doc_id] + len(line)
+
+    np.save(staging / CHUNK_OFFSETS_FILE, chunk_offsets)
+    np.save(staging / POSTING_OFFSETS_FILE, posting_offsets)
+    np.save(staging / POSTING_DOCS_FILE, posting_docs)
+    np.save(staging / POSTING_TFS_FILE, posting_tfs)
+    np.save(staging / DOC_LENGTHS_FILE, doc_lengths)
+    np.save(staging / IDF_FILE, idf)
+    with open(staging / VOCAB_FILE, "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+
+    dense_dim = 0
+    if vectors is not None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.save(staging / VECTORS_FILE, vectors / np.maximum(norms, 1e-12))
+        dense_dim = int(vectors.shape[1])
+
+    meta = {
+        "version": INDEX_VERSION,
+        "num_docs": num_docs,
+        "avgdl": float(doc_lengths.mean()) if num_docs else 0.0,
+        "dense_dim": dense_dim,
+    }
+    with open(staging / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    if output.exists():
+        backup = output.with_name(output.name + ".old")
+        output.rename(backup)
+        staging.rename(output)
+        for path in backup.iterdir():
+            path.unlink()
+        backup.rmdir()
+    else:
+        staging.rename(output)
+
+class StatuteIndex:
+    """法条检索索引
+
+    首次查询时才加载索引，数组以内存映射方式打开，不会整体读入内存。
+    索引目录不存在时检索返回空结果。
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._available = False
+
+    @property
+    def available(self) -> bool:
+        self._ensure_loaded()
+        return self._available
+
+    @property
+    def has_vectors(self) -> bool:
+        self._ensure_loaded()
+        return self._available and self._vectors is not None
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                self._load()
+                self._available = True
+                logger.info(f"法条索引已加载 - 路径: {self.path}, 条目数: {self._num_docs}")
+            except FileNotFoundError:
+                logger.info(f"未找到法条索引，跳过检索 - 路径: {self.path}")
+            except Exception as e:
+                logger.error(f"加载法条索引失败: {str(e)}", exc_info=True)
+            self._loaded = True
+
+    def _load(self) -> None:
+        with open(self.path / META_FILE, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"不支持的索引版本: {meta.get('version')}")
+        with open(self.path / VOCAB_FILE, encoding="utf-8") as f:
+            self._vocab: Dict[str, int] = json.load(f)
+
+        self._num_docs = meta["num_docs"]
+        self._avgdl = meta["avgdl"] or 1.0
+        self._posting_offsets = np.load(self.path / POSTING_OFFSETS_FILE, mmap_mode="r")
+        self._posting_docs = np.load(self.path / POSTING_DOCS_FILE, mmap_mode="r")
+        self._posting_tfs = np.load(self.path / POSTING_TFS_FILE, mmap_mode="r")
+        self._doc_lengths = np.load(self.path / DOC_LENGTHS_FILE, mmap_mode="r")
+        self._idf = np.load(self.path / IDF_FILE, mmap_mode="r")
+        self._chunk_offsets = np.load(self.path / CHUNK_OFFSETS_FILE, mmap_mode="r")
+        self._vectors = None
+        if meta.get("dense_dim"):
+            self._vectors = np.load(self.path / VECTORS_FILE, mmap_mode="r")
+
+        with open(self.path / CHUNKS_FILE, "rb") as f:
+            self._chunks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self._num_docs else b""
+
+    def _chunk(self, doc_id: int) -> Dict[str, str]:
+        start = int(self._chunk_offsets[doc_id])
+        end = int(self._chunk_offsets[doc_id + 1])
+        return json.loads(self._chunks[start:end].decode("utf-8"))
+
+    def _bm25(self, terms: Iterable[str]) -> np.ndarray:
+        scores = np.zeros(self._num_docs, dtype=np.float32)
+        for term in set(terms):
+            term_id = self._vocab.get(term)
+            if term_id is None:
+                continue
+            start = self._posting_offsets[term_id]
+            end = self._posting_offsets[term_id + 1]
+            docs = self._posting_docs[start:end]
+            tfs = self._posting_tfs[start:end]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[docs] / self._avgdl)
+            scores[docs] += self._idf[term_id] * tfs * (BM25_K1 + 1) / (tfs + norm)
+        return scores
+
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        query_vector: Optional[np.ndarray] = None,
+        dense_weight: float = 0.5
+    ) -> List[RetrievedChunk]:
+        """检索与query最相关的k个法条片段
+
+        提供query_vector且索引包含稠密向量时，对BM25候选集按
+        归一化BM25分数与余弦相似度的加权和重排。
+        """
+        self._ensure_loaded()
+        if not self._available or not self._num_docs:
+            return []
+
+        scores = self._bm25(tokenize(query))
+        candidates = DENSE_CANDIDATES if query_vector is not None and self._vectors is not None else k
+        candidates = min(candidates, self._num_docs)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        top = top[scores[top] > 0]
+        if not len(top):
+            return []
+
+        ranked = scores[top]
+        if query_vector is not None and self._vectors is not None:
+            query_vector = np.asarray(query_vector, dtype=np.float32)
+            query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+            order = np.sort(top)
+            similarity = np.asarray(self._vectors[order]) @ query_vector
+            ranked = (1 - dense_weight) * scores[order] / scores[order].max() + dense_weight * similarity
+            top = order
+
+        results = []
+        for position in np.argsort(-ranked)[:k]:
+            chunk = self._chunk(int(top[position]))
+            results.append(RetrievedChunk(
+                law=chunk["law"],
+                article=chunk.get("article", ""),
+                text=chunk["text"],
+                score=float(ranked[position])
+            ))
+        return results
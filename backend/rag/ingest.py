@@ -0,0 +1,138 @@
+"""法条语料离线入库
+
+用法：
+    python -m backend.rag.ingest <语料目录> [--output 索引目录] [--dense]
+
+语料目录下每个.txt或.md文件为一部法律法规，首个非空行作为法规名称。
+正文按“第X条”切分为条目，过长的条目再按长度切分。
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import logging
+import re
+import sys
+import numpy as np
+
+from backend.core.config import settings
+# 显式依赖日志配置（控制台与文件处理器），命令行运行时输出进度
+from backend.core.logger import logger
+from backend.rag.index import build_index
+
+CORPUS_SUFFIXES = {".txt", ".md"}
+ARTICLE_PATTERN = re.compile(r"^\s*(第[一二三四五六七八九十百千零〇\d]+条)\s*(.*)$")
+CHAPTER_PATTERN = re.compile(r"^\s*(第[一二三四五六七八九十百千零〇\d]+[编章节])\s*(.*)$")
+TITLE_PATTERN = re.compile(r"^《?(.+?)》?$")
+CHUNK_MAX_CHARS = 800
+EMBEDDING_BATCH_SIZE = 20
+
+def split_long(text: str, limit: int = CHUNK_MAX_CHARS) -> List[str]:
+    """按句读将过长文本切分为不超过limit个字符的片段"""
+    if len(text) <= limit:
+        return [text]
+    pieces: List[str] = []
+    current = ""
+    for sentence in re.split(r"(?<=[。；！？\n])", text):
+        if current and len(current) + len(sentence) > limit:
+            pieces.append(current)
+            current = ""
+        while len(sentence) > limit:
+            pieces.append(sentence[:limit])
+            sentence = sentence[limit:]
+        current += sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+def chunk_statute(law: str, text: str) -> List[Dict[str, str]]:
+    """将一部法规切分为条目"""
+    chunks: List[Dict[str, str]] = []
+    chapter = ""
+    article = ""
+    lines: List[str] = []
+
+    def flush() -> None:
+        body = "\n".join(line for line in lines if line).strip()
+        if body:
+            for piece in split_long(body):
+                chunks.append({"law": law, "chapter": chapter, "article": article, "text": piece})
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        chapter_match = CHAPTER_PATTERN.match(line)
+        article_match = ARTICLE_PATTERN.match(line)
+        if chapter_match and not article_match:
+            flush()
+            lines = []
+            article = ""
+            chapter = " ".join(part for part in chapter_match.groups() if part)
+        elif article_match:
+            flush()
+            article = article_match.group(1)
+            lines = [article_match.group(2)]
+        elif article:
+            lines.append(line)
+
+    flush()
+    if not chunks:
+        # 没有条文结构的文件按段落切分
+        for piece in split_long(text.strip()):
+            chunks.append({"law": law, "chapter": "", "article": "", "text": piece})
+    return chunks
+
+def load_corpus(corpus_dir: Path) -> List[Dict[str, str]]:
+    chunks: List[Dict[str, str]] = []
+    for path in sorted(corpus_dir.rglob("*")):
+        if path.suffix.lower() not in CORPUS_SUFFIXES or not path.is_file():
+            continue
+        text = path.read_text(encoding="utf-8")
+        first_line = next((line.strip() for line in text.splitlines() if line.strip()), "")
+        if first_line and not ARTICLE_PATTERN.match(first_line):
+            # 标题行只有“#”等符号时以文件名作为法规名称
+            match = TITLE_PATTERN.match(first_line.lstrip("# "))
+            law = match.group(1) if match else path.stem
+            text = text.split(first_line, 1)[1]
+        else:
+            law = path.stem
+        file_chunks = chunk_statute(law, text)
+        logger.info(f"已切分 {path.name} - 法规: {law}, 条目数: {len(file_chunks)}")
+        chunks.extend(file_chunks)
+    return chunks
+
+def embed_chunks(chunks: List[Dict[str, str]]) -> np.ndarray:
+    """调用DashScope文本向量模型生成稠密向量"""
+    from backend.rag.embedding import embed_texts
+
+    vectors: List[List[float]] = []
+    texts = [f"{chunk['law']} {chunk['article']} {chunk['text']}" for chunk in chunks]
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        vectors.extend(embed_texts(texts[start:start + EMBEDDING_BATCH_SIZE]))
+        logger.info(f"已生成向量 {min(start + EMBEDDING_BATCH_SIZE, len(texts))}/{len(texts)}")
+    return np.asarray(vectors, dtype=np.float32)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="构建法条检索索引")
+    parser.add_argument("corpus", help="法律法规语料目录")
+    parser.add_argument("--output", default=settings.VECTOR_DB_PATH, help="索引输出目录")
+    parser.add_argument("--dense", action="store_true", help="同时生成稠密向量")
+    args = parser.parse_args(argv)
+    # 进度输出不受服务的LOG_LEVEL影响
+    logger.setLevel(logging.INFO)
+
+    corpus_dir = Path(args.corpus)
+    if not corpus_dir.is_dir():
+        logger.error(f"语料目录不存在: {corpus_dir}")
+        return 1
+
+    chunks = load_corpus(corpus_dir)
+    if not chunks:
+        logger.error(f"语料目录中没有可用的法规文件: {corpus_dir}")
+        return 1
+
+    vectors = embed_chunks(chunks) if args.dense else None
+    build_index(chunks, args.output, vectors=vectors)
+    logger.info(f"索引构建完成 - 路径: {args.output}, 条目数: {len(chunks)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,9 @@
 from backend.schemas.token import Token, TokenPayload
 from backend.schemas.user import User, UserCreate, UserUpdate, UserInDB
-from backend.schemas.chat import Chat, ChatCreate, ChatUpdate, Message, MessageCreate
+from backend.schemas.chat import (
+    Chat, ChatCreate, ChatUpdate, ChatSummary, ChatPage, Message, MessageCreate, MessagePage,
+    SearchResult, SearchPage
+)
 
 __all__ = [
     "Token",
@@ -12,6 +15,11 @@ __all__ = [
     "Chat",
     "ChatCreate",
     "ChatUpdate",
+    "ChatSummary",
+    "ChatPage",
     "Message",
-    "MessageCreate"
+    "MessageCreate",
+    "MessagePage",
+    "SearchResult",
+    "SearchPage"
 ] 
\ No newline at end of file
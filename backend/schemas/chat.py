@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 from pydantic import BaseModel
 
@@ -7,11 +7,12 @@ class MessageBase(BaseModel):
     role: str
 
 class MessageCreate(MessageBase):
-    pass
+    truncated: bool = False
 
 class Message(MessageBase):
     id: int
     chat_id: int
+    truncated: bool = False
     created_at: datetime
     
     class Config:
@@ -34,4 +35,39 @@ class Chat(ChatBase):
     messages: List[Message] = []
     
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class ChatSummary(ChatBase):
+    """对话列表项，不包含消息内容"""
+    id: int
+    created_at: datetime
+    updated_at: datetime
+    message_count: int = 0
+    last_message: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+class ChatPage(BaseModel):
+    items: List[ChatSummary]
+    next_cursor: Optional[str] = None
+
+class MessagePage(BaseModel):
+    items: List[Message]
+    next_cursor: Optional[str] = None
+
+class SearchResult(BaseModel):
+    """检索命中的消息或对话标题，highlights为snippet中命中词的[起, 止)位置"""
+    kind: str
+    chat_id: int
+    chat_title: Optional[str] = None
+    message_id: Optional[int] = None
+    role: Optional[str] = None
+    snippet: str
+    highlights: List[Tuple[int, int]] = []
+    created_at: Optional[datetime] = None
+    score: float = 0.0
+
+class SearchPage(BaseModel):
+    items: List[SearchResult]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,166 @@
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, Optional
+import asyncio
+import logging
+import math
+import time
+
+from backend.core.config import settings
+from backend.core.logger import RATE_LIMITED
+from backend.core.metrics import ADMISSION_WAIT_SECONDS
+
+logger = logging.getLogger("ai_lawyer")
+
+class AdmissionRejected(Exception):
+    """等待队列已满或排队超时，请求被拒绝"""
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+class Lease:
+    """已获得的并发名额，release可重复调用"""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._acquired_at = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.monotonic() - self._acquired_at)
+
+class AdmissionController:
+    """上游模型调用的准入控制
+
+    全局限制同时进行的生成数量，超出时进入有界等待队列。队列按用户分组，
+    名额释放时在有等待请求的用户之间轮转分配，避免单个用户的突发请求
+    占满队列；队列已满时立即拒绝。
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queue: int,
+        max_queue_per_user: int,
+        queue_timeout: float
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        # 名额平均占用时长，用于估算Retry-After
+        self._avg_hold = 10.0
+        self._waiters: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+
+    def _retry_after(self) -> int:
+        pending = self.queued + 1
+        return max(1, math.ceil(self._avg_hold * pending / self.max_concurrent))
+
+    async def acquire(self, user_id: Hashable) -> Lease:
+        if self.active < self.max_concurrent and not self.queued:
+            return self._admit(0.0)
+
+        user_waiters = self._waiters.get(user_id)
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(self._retry_after(), "服务繁忙，请稍后再试")
+        if user_waiters is not None and len(user_waiters) >= self.max_queue_per_user:
+            self.rejected += 1
+            raise AdmissionRejected(self._retry_after(), "您的请求过多，请稍后再试")
+
+        future = asyncio.get_running_loop().create_future()
+        if user_waiters is None:
+            user_waiters = self._waiters[user_id] = deque()
+        user_waiters.append(future)
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # 名额已分配但等待方已放弃，归还名额
+                self._release(0.0)
+            else:
+                future.cancel()
+                self._remove_waiter(user_id, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                self.rejected += 1
+                raise AdmissionRejected(self._retry_after(), "排队超时，请稍后再试")
+            raise
+
+        # 名额已在_release中计入active
+        wait = time.monotonic() - started
+        if wait > 1:
+            logger.info("请求排队后获得名额 - 等待: %.2fs, 队列长度: %s", wait, self.queued, extra=RATE_LIMITED)
+        self._record_wait(wait)
+        return Lease(self)
+
+    def _admit(self, wait: float) -> Lease:
+        self.active += 1
+        self._record_wait(wait)
+        return Lease(self)
+
+    def _record_wait(self, wait: float) -> None:
+        ADMISSION_WAIT_SECONDS.observe(wait)
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def _remove_waiter(self, user_id: Hashable, future: asyncio.Future) -> None:
+        user_waiters = self._waiters.get(user_id)
+        if user_waiters is None or future not in user_waiters:
+            return
+        user_waiters.remove(future)
+        self.queued -= 1
+        if not user_waiters:
+            del self._waiters[user_id]
+
+    def _release(self, held: float) -> None:
+        if held:
+            self._avg_hold = 0.9 * self._avg_hold + 0.1 * held
+        self.active -= 1
+        while self._waiters and self.active < self.max_concurrent:
+            # 轮转：取队首用户的最早请求，再把该用户移到队尾
+            user_id, user_waiters = next(iter(self._waiters.items()))
+            future = user_waiters.popleft()
+            self.queued -= 1
+            if user_waiters:
+                self._waiters.move_to_end(user_id)
+            else:
+                del self._waiters[user_id]
+            if future.done():
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self.queued,
+            "queued_users": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_seconds": self.total_wait / self.admitted if self.admitted else 0.0,
+            "max_wait_seconds": self.max_wait,
+        }
+
+admission_controller = AdmissionController(
+    max_concurrent=settings.LLM_MAX_CONCURRENCY,
+    max_queue=settings.LLM_MAX_QUEUE,
+    max_queue_per_user=settings.LLM_MAX_QUEUE_PER_USER,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS
+)
@@ -1,19 +1,55 @@
 from abc import ABC, abstractmethod
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, Dict, List, Optional
 
 class AIService(ABC):
-    """AI服务基类"""
-    
+    """AI服务基类
+
+    每个模型提供方实现一个子类，消息格式为 {"role": ..., "content": ...}，
+    role取值为system / user / assistant。
+    """
+
+    name: str = "base"
+
     @abstractmethod
-    async def generate_response(self, prompt: str, context: Optional[str] = None) -> AsyncGenerator[str, None]:
-        """生成回复"""
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> AsyncGenerator[str, None]:
+        """流式生成回复，逐段返回文本"""
         pass
-    
-    @abstractmethod
-    async def generate_title(self, content: str) -> str:
-        """生成标题"""
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """生成完整回复"""
+        parts = []
+        async for content in self.stream(
+            messages, model=model, temperature=temperature, max_tokens=max_tokens
+        ):
+            parts.append(content)
+        return "".join(parts)
+
+    def warm_up(self) -> None:
+        """提前创建连接池等资源，在服务启动时调用"""
+        pass
+
+    async def aclose(self) -> None:
+        """释放连接等资源"""
         pass
 
 class AIServiceException(Exception):
     """AI服务异常"""
-    pass 
\ No newline at end of file
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
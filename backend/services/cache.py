@@ -0,0 +1,191 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from backend.core.cache import TTLCache
+from backend.core.config import settings
+from backend.core.metrics import ANSWER_CACHE_REQUESTS
+
+logger = logging.getLogger("ai_lawyer")
+
+def normalize_question(question: str) -> str:
+    """归一化问题文本：全半角统一、转小写、去除空白和标点"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    return "".join(
+        ch for ch in text
+        if not ch.isspace() and not unicodedata.category(ch).startswith(("P", "S"))
+    )
+
+class AnswerCacheBackend(ABC):
+    """回答缓存存储后端"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, answer: str) -> None:
+        pass
+
+    @abstractmethod
+    def size(self) -> int:
+        pass
+
+class MemoryAnswerCacheBackend(AnswerCacheBackend):
+    """进程内缓存，各worker独立"""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self._cache: TTLCache[str, str] = TTLCache(max_entries=max_entries, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, answer: str) -> None:
+        self._cache.set(key, answer)
+
+    def size(self) -> int:
+        return len(self._cache)
+
+class SQLiteAnswerCacheBackend(AnswerCacheBackend):
+    """本地SQLite文件缓存，同一主机上的多个worker共享"""
+
+    def __init__(self, path: str, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answer_cache ("
+            "key TEXT PRIMARY KEY, answer TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_answer_cache_accessed_at ON answer_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, expires_at FROM answer_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM answer_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE answer_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def _set(self, key: str, answer: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answer_cache (key, answer, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, answer, now + self.ttl, now)
+            )
+            self._conn.execute("DELETE FROM answer_cache WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM answer_cache WHERE key IN ("
+                "SELECT key FROM answer_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, answer: str) -> None:
+        await asyncio.to_thread(self._set, key, answer)
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answer_cache").fetchone()[0]
+
+class AnswerCache:
+    """常见问题的回答缓存
+
+    仅用于不依赖上下文的首轮问题，以归一化后的问题和模型名作为键。
+    """
+
+    def __init__(self, backend: Optional[AnswerCacheBackend], namespace: str, backend_name: str = "none"):
+        self.backend = backend
+        self.backend_name = backend_name
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def key_for(self, question: str) -> Optional[str]:
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        return hashlib.sha256(f"{self.namespace}\0{normalized}".encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            answer = await self.backend.get(key)
+        except Exception as e:
+            logger.error(f"读取回答缓存失败: {str(e)}", exc_info=True)
+            answer = None
+        if answer is None:
+            self.misses += 1
+            ANSWER_CACHE_REQUESTS.labels("miss").inc()
+        else:
+            self.hits += 1
+            ANSWER_CACHE_REQUESTS.labels("hit").inc()
+        return answer
+
+    async def set(self, key: str, answer: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            await self.backend.set(key, answer)
+        except Exception as e:
+            logger.error(f"写入回答缓存失败: {str(e)}", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend_name,
+            "entries": self.backend.size() if self.enabled else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+def create_answer_cache(namespace: str) -> AnswerCache:
+    """根据配置创建回答缓存"""
+    backend_name = settings.ANSWER_CACHE_BACKEND.lower()
+    backend: Optional[AnswerCacheBackend] = None
+    if backend_name == "memory":
+        backend = MemoryAnswerCacheBackend(
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            ttl=settings.ANSWER_CACHE_TTL_SECONDS
+        )
+    elif backend_name == "sqlite":
+        backend = SQLiteAnswerCacheBackend(
+            path=settings.ANSWER_CACHE_PATH,
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            ttl=settings.ANSWER_CACHE_TTL_SECONDS
+        )
+    elif backend_name != "none":
+        raise ValueError(f"未知的回答缓存后端: {settings.ANSWER_CACHE_BACKEND}")
+    return AnswerCache(backend, namespace, backend_name)
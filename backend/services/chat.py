@@ -1,54 +1,71 @@
-from typing import AsyncGenerator, Optional, Dict, List, Tuple
+from typing import Any, AsyncGenerator, Optional, Dict, List, Tuple
+import asyncio
+import hashlib
+import json
 import logging
-from langchain_community.chat_models import ChatTongyi
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
-from langchain.memory import ConversationBufferMemory
+import time
 from backend.core.config import settings
+from backend.core.logger import RATE_LIMITED, SAMPLED
+from backend.core.metrics import CHAT_STREAMS, TITLE_REQUESTS, TITLE_SECONDS
+from backend.core.profiling import profiled, record_span, span
+from backend.rag import StatuteIndex
+from backend.services.cache import create_answer_cache
+from backend.services.context import ContextBuilder
+from backend.services.llm import breaker_stats, resilient_model
+from backend.services.singleflight import SingleFlight
+from backend.services.topic import TopicDetector
 
 logger = logging.getLogger("ai_lawyer")
 
+# 缓存回答回放时每段的字符数
+REPLAY_CHUNK_SIZE = 32
+
 class ChatService:
     """聊天服务"""
     
     def __init__(self):
         logger.info("=== 初始化聊天服务 ===")
         self._init_models()
-        self._init_memory()
         self._init_prompts()
+        self.context_builder = ContextBuilder(settings.CONTEXT_TOKEN_BUDGET)
+        # 法条索引在首次检索时才加载
+        self.statute_index = StatuteIndex(settings.VECTOR_DB_PATH)
+        # 提示词变化后旧的缓存回答自动失效
+        prompt_digest = hashlib.sha256(self.system_prompt.encode("utf-8")).hexdigest()[:12]
+        self.answer_cache = create_answer_cache(f"{self.chat_model.spec}:{prompt_digest}")
+        # 合并相同的进行中模型请求
+        self.single_flight = SingleFlight()
+        self.streams_completed = 0
+        self.streams_cancelled = 0
+        # 主题未变化时跳过标题生成
+        self.topic_detector = TopicDetector()
+        self.title_calls = 0
+        self.title_skips = 0
     
     def _init_models(self):
         """初始化模型"""
         try:
-            logger.info("初始化AI模型: qwen-max")
-            logger.debug(f"使用API密钥: {settings.DASHSCOPE_API_KEY[:8]}...")
-            
             # 对话模型
-            self.chat_model = ChatTongyi(
-                model_name="qwen-max",
-                dashscope_api_key=settings.DASHSCOPE_API_KEY,
+            self.chat_model = resilient_model(
+                settings.CHAT_MODEL,
                 temperature=0.7,
-                streaming=True
+                fallback_spec=settings.CHAT_FALLBACK_MODEL or None
             )
             
-            # 标题生成模型
-            self.title_model = ChatTongyi(
-                model_name="qwen-max",
-                dashscope_api_key=settings.DASHSCOPE_API_KEY,
-                temperature=0.3,
-                streaming=False
+            # 标题和摘要使用更快、更便宜的模型
+            self.title_model = resilient_model(settings.TITLE_MODEL, temperature=0.3)
+            self.summary_model = resilient_model(settings.SUMMARY_MODEL, temperature=0.2)
+            logger.info(
+                f"AI模型初始化完成 - 对话: {self.chat_model.spec}, "
+                f"标题: {self.title_model.spec}, 摘要: {self.summary_model.spec}"
             )
-            logger.info("AI模型初始化完成")
         except Exception as e:
             logger.error(f"AI模型初始化失败: {str(e)}", exc_info=True)
             raise
     
-    def _init_memory(self):
-        """初始化对话记忆"""
-        self.memory = ConversationBufferMemory(return_messages=True)
-    
     def _init_prompts(self):
         """初始化提示词"""
-        self.system_prompt = SystemMessage(content="""你是一个专业的法律顾问。请根据用户的问题提供专业、准确的法律建议。
+        self.system_prompt = """你是一个专业的法律顾问。请根据用户的问题提供专业、准确的法律建议。
 
 请先给出简短的开场语，表达理解和共情。
 
@@ -62,11 +79,13 @@ class ChatService:
 
 最后给出简短的结束语，表达鼓励和支持。
 
-请记住：你的建议可能影响用户的重要决策，务必谨慎和专业。""")
+请记住：你的建议可能影响用户的重要决策，务必谨慎和专业。"""
 
+    @profiled("title")
     async def generate_title(self, current_title: str, latest_message: str) -> str:
         """生成对话标题"""
-        logger.info(f"开始生成标题，当前标题: {current_title}, 最新消息: {latest_message}")
+        logger.debug("开始生成标题，当前标题: %s", current_title)
+        started = time.perf_counter()
         try:
             prompt = f"""请根据以下信息生成一个新的对话标题：
 
@@ -82,10 +101,10 @@ class ChatService:
 
 请直接返回新标题，不要包含其他内容。"""
 
-            messages = [HumanMessage(content=prompt)]
-            response = await self.title_model.agenerate([messages])
-            title = response.generations[0][0].text.strip()
-            logger.info(f"生成新标题: {title}")
+            response = await self.title_model.complete([{"role": "user", "content": prompt}])
+            TITLE_SECONDS.observe(time.perf_counter() - started)
+            title = response.strip()
+            logger.debug("标题模型返回: %s", title)
             
             # 清理和截断标题
             title = title.replace('"', '').replace("'", '').split('\n')[0].strip()
@@ -103,60 +122,233 @@ class ChatService:
             logger.error(f"生成标题失败: {str(e)}", exc_info=True)
             return latest_message[:15] + ("..." if len(latest_message) > 15 else "")
 
-    async def get_chat_response(self, message: str, current_title: str, history: Optional[List[Dict]] = None) -> AsyncGenerator[Tuple[str, Optional[str]], None]:
+    async def summarize(self, previous_summary: Optional[str], messages: List[Dict]) -> str:
+        """将新的对话轮次折叠进已有摘要"""
+        transcript = "\n".join(
+            f"{'用户' if msg['role'] == 'user' else '律师'}：{msg['content']}"
+            for msg in messages
+        )
+        prompt = f"""请将以下法律咨询对话整理为一份简洁的摘要，供后续对话参考。
+
+已有摘要：
+{previous_summary or "（无）"}
+
+新增对话：
+{transcript}
+
+要求：
+1. 合并已有摘要与新增对话，输出一份完整的新摘要
+2. 保留用户的关键事实、诉求、涉及的法律领域和已给出的主要建议
+3. 不超过500字
+4. 直接返回摘要内容，不要包含其他内容"""
+
+        response = await self.summary_model.complete([{"role": "user", "content": prompt}])
+        return response.strip()
+
+    @profiled("rag")
+    async def retrieve_references(self, message: str) -> Optional[str]:
+        """检索与问题相关的法条，返回拼接后的参考文本"""
+        if not settings.RAG_ENABLED:
+            return None
+        try:
+            query_vector = None
+            if settings.RAG_DENSE_ENABLED and self.statute_index.has_vectors:
+                try:
+                    # 向量模型依赖（dashscope SDK）缺失或调用失败时不影响关键词检索
+                    from backend.rag.embedding import embed_texts
+                    query_vector = (await asyncio.to_thread(embed_texts, [message]))[0]
+                except Exception as e:
+                    logger.warning("问题向量生成失败，仅使用关键词检索: %s", e, extra=RATE_LIMITED)
+            
+            results = self.statute_index.search(
+                message,
+                k=settings.RAG_TOP_K,
+                query_vector=query_vector,
+                dense_weight=settings.RAG_DENSE_WEIGHT
+            )
+            if not results:
+                return None
+            logger.debug("检索到相关法条 - 数量: %d", len(results))
+            return "\n\n".join(result.format() for result in results)
+        except Exception as e:
+            logger.error(f"法条检索失败: {str(e)}", exc_info=True)
+            return None
+
+    async def get_chat_response(self, message: str, current_title: str, history: Optional[List[Dict]] = None, summary: Optional[str] = None) -> AsyncGenerator[Tuple[str, Optional[str]], None]:
         """生成回复，同时返回更新的标题"""
-        logger.info("="*50)
-        logger.info(f"收到用户消息: {message}")
-        logger.info(f"当前标题: {current_title}")
-        logger.info(f"历史消息数量: {len(history) if history else 0}")
+        logger.debug("收到用户消息 - 长度: %d, 历史消息数量: %d", len(message), len(history) if history else 0)
         
+        # 标题生成与回答流并发进行，避免首个token等待两次模型调用
+        title_task = None
+        if not settings.TITLE_FAST_PATH_ENABLED or self.topic_detector.needs_new_title(
+            current_title, message, history, summary
+        ):
+            self.title_calls += 1
+            TITLE_REQUESTS.labels("generated").inc()
+            title_task = asyncio.create_task(self.generate_title(current_title, message))
+        else:
+            self.title_skips += 1
+            TITLE_REQUESTS.labels("skipped").inc()
+            logger.debug("对话主题未变化，跳过标题生成")
+        title_sent = title_task is None
         try:
-            # 先生成新标题
-            new_title = await self.generate_title(current_title, message)
-            logger.info(f"生成新标题: {new_title}")
-            
-            messages = [self.system_prompt]
+            # 不依赖上下文的首轮问题优先使用缓存回答
+            cache_key = None
+            cached_answer = None
+            if not history and not summary and self.answer_cache.enabled:
+                cache_key = self.answer_cache.key_for(message)
+                if cache_key:
+                    cached_answer = await self.answer_cache.get(cache_key)
             
-            if history:
-                for msg in history:
-                    msg_type = HumanMessage if msg["role"] == "user" else AIMessage
-                    messages.append(msg_type(content=msg["content"]))
-                    logger.debug(f"历史消息 - {msg['role']}: {msg['content'][:50]}...")
+            if cached_answer is not None:
+                logger.info("命中回答缓存", extra=SAMPLED)
+                chunks = self._replay_answer(cached_answer)
+            else:
+                chunks = self._stream_answer(message, history, summary)
             
-            messages.append(HumanMessage(content=message))
-            logger.info(f"构建完整消息列表，总数: {len(messages)}")
-            
-            logger.info("开始调用AI模型...")
+            answer = ""
             try:
-                # 第一个token返回时同时返回新标题
-                first_token = True
-                async for chunk in self.chat_model.astream(messages):
-                    if chunk.content:
-                        logger.debug(f"收到流式响应: {chunk.content}")
-                        if first_token:
-                            yield chunk.content, new_title
-                            first_token = False
-                        else:
-                            yield chunk.content, None
-                logger.info("AI响应生成完成")
+                # 标题就绪后随下一个token一并返回
+                async for content in chunks:
+                    answer += content
+                    if not title_sent and title_task.done():
+                        title_sent = True
+                        yield content, title_task.result()
+                    else:
+                        yield content, None
+                logger.debug("AI响应生成完成 - 字数: %d", len(answer))
                     
             except Exception as e:
                 logger.error(f"AI模型调用失败: {str(e)}", exc_info=True)
                 raise
+            
+            if cache_key and cached_answer is None and answer:
+                await self.answer_cache.set(cache_key, answer)
+            
+            # 回答已结束但标题尚未返回
+            if not title_sent:
+                title_sent = True
+                new_title = await title_task
+                logger.info("生成新标题: %s", new_title, extra=SAMPLED)
+                yield "", new_title
+            self.streams_completed += 1
+            CHAT_STREAMS.labels("completed").inc()
                 
+        except (asyncio.CancelledError, GeneratorExit):
+            self.streams_cancelled += 1
+            CHAT_STREAMS.labels("cancelled").inc()
+            raise
         except Exception as e:
             logger.error(f"生成回复失败: {str(e)}", exc_info=True)
             error_msg = "抱歉，我现在无法回答您的问题。请稍后再试。"
-            logger.info(f"返回错误消息: {error_msg}")
             yield error_msg, None
+        finally:
+            if title_task is not None and not title_task.done():
+                title_task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "streams_completed": self.streams_completed,
+            "streams_cancelled": self.streams_cancelled,
+            "single_flight": self.single_flight.stats(),
+            "answer_cache": self.answer_cache.stats(),
+            "title": {
+                "calls": self.title_calls,
+                "skips": self.title_skips,
+                "skip_rate": self.title_skips / (self.title_calls + self.title_skips)
+                if self.title_calls + self.title_skips else 0.0,
+            },
+            "models": {
+                "chat": self.chat_model.stats(),
+                "title": self.title_model.stats(),
+                "summary": self.summary_model.stats(),
+            },
+            "breakers": breaker_stats(),
+        }
+
+    async def _replay_answer(self, answer: str) -> AsyncGenerator[str, None]:
+        """按固定大小分段回放缓存回答"""
+        for start in range(0, len(answer), REPLAY_CHUNK_SIZE):
+            yield answer[start:start + REPLAY_CHUNK_SIZE]
+
+    async def _stream_answer(self, message: str, history: Optional[List[Dict]], summary: Optional[str]) -> AsyncGenerator[str, None]:
+        """构建上下文并调用对话模型，逐段返回回答"""
+        references = await self.retrieve_references(message)
+        with span("context.build"):
+            context = self.context_builder.build(
+                self.system_prompt,
+                message,
+                history,
+                summary=summary,
+                references=references
+            )
+        logger.info(
+            "上下文构建完成 - tokens: %s/%s, 保留: %s, 丢弃: %s, 压缩: %s",
+            context.tokens, self.context_builder.token_budget,
+            len(context.history), context.dropped, context.compressed,
+            extra=SAMPLED
+        )
+        
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if summary:
+            messages.append({"role": "system", "content": f"此前对话摘要：\n{summary}"})
+        if references:
+            messages.append({
+                "role": "system",
+                "content": f"以下是可能相关的法律条文，请在回答时参考并准确引用：\n\n{references}"
+            })
+        for msg in context.history:
+            role = "user" if msg["role"] == "user" else "assistant"
+            messages.append({"role": role, "content": msg["content"]})
+        
+        messages.append({"role": "user", "content": message})
+        logger.debug("构建完整消息列表，总数: %d", len(messages))
+        async for content in self.single_flight.stream(
+            self._flight_key(messages), lambda: self._astream(messages)
+        ):
+            yield content
+
+    async def _astream(self, messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
+        started = time.perf_counter()
+        chunks = 0
+        try:
+            async for content in self.chat_model.stream(messages):
+                if content:
+                    if not chunks:
+                        record_span("upstream.first_token", started)
+                    chunks += 1
+                    yield content
+        finally:
+            record_span("upstream.stream", started, chunks=chunks)
+
+    def _flight_key(self, messages: List[Dict[str, str]]) -> str:
+        payload = json.dumps(
+            [self.chat_model.spec] + [[msg["role"], msg["content"]] for msg in messages],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+_chat_service: Optional[ChatService] = None
+
+def get_chat_service() -> ChatService:
+    """全局聊天服务，首次使用时创建（模型客户端、回答缓存等），导入本模块不做初始化"""
+    global _chat_service
+    if _chat_service is None:
+        _chat_service = ChatService()
+    return _chat_service
 
-# 创建全局实例
-chat_service = ChatService()
+async def warm_up() -> None:
+    """启动时预先创建聊天服务和模型连接池，并加载法条索引，避免首个请求承担初始化耗时"""
+    service = get_chat_service()
+    for model in (service.chat_model, service.title_model, service.summary_model):
+        model.warm_up()
+    if settings.RAG_ENABLED:
+        await asyncio.to_thread(lambda: service.statute_index.available)
 
 # 导出函数
-async def get_chat_response(message: str, current_title: str, history: Optional[List[Dict]] = None) -> AsyncGenerator[Tuple[str, Optional[str]], None]:
+async def get_chat_response(message: str, current_title: str, history: Optional[List[Dict]] = None, summary: Optional[str] = None) -> AsyncGenerator[Tuple[str, Optional[str]], None]:
     """获取AI回复和更新的标题"""
-    async for token, title in chat_service.get_chat_response(message, current_title, history):
+    async for token, title in get_chat_service().get_chat_response(message, current_title, history, summary):
         yield token, title
 
 __all__ = ["get_chat_response"]
\ No newline at end of file
@@ -0,0 +1,96 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import logging
+import re
+
+logger = logging.getLogger("ai_lawyer")
+
+# 中日韩字符按每字一个token估算，其余连续字符按每4个字符一个token估算
+CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+# 每条消息的角色标记等固定开销
+MESSAGE_OVERHEAD = 4
+# 压缩后保留的最少token数，不足时直接丢弃该消息
+MIN_COMPRESSED_TOKENS = 32
+TRUNCATION_MARK = "……（前文已省略）"
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数，对同一输入结果确定"""
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+@dataclass
+class ContextResult:
+    """上下文构建结果"""
+    history: List[Dict[str, str]] = field(default_factory=list)
+    tokens: int = 0
+    dropped: int = 0
+    compressed: int = 0
+
+class ContextBuilder:
+    """按token预算组装对话上下文
+
+    始终保留系统提示词、对话摘要、参考法条和当前问题，从最新的历史消息开始向前填充，
+    超出预算的最早一条消息截断保留结尾部分，更早的消息全部丢弃。
+    """
+
+    def __init__(self, token_budget: int):
+        self.token_budget = token_budget
+
+    @staticmethod
+    def message_tokens(content: str) -> int:
+        return estimate_tokens(content) + MESSAGE_OVERHEAD
+
+    def build(
+        self,
+        system_prompt: str,
+        message: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        summary: Optional[str] = None,
+        references: Optional[str] = None
+    ) -> ContextResult:
+        history = history or []
+        used = self.message_tokens(system_prompt) + self.message_tokens(message)
+        for pinned in (summary, references):
+            if pinned:
+                used += self.message_tokens(pinned)
+        kept: List[Dict[str, str]] = []
+        compressed = 0
+
+        for index in range(len(history) - 1, -1, -1):
+            msg = history[index]
+            cost = self.message_tokens(msg["content"])
+            if used + cost <= self.token_budget:
+                kept.append(msg)
+                used += cost
+                continue
+
+            remaining = self.token_budget - used - MESSAGE_OVERHEAD - estimate_tokens(TRUNCATION_MARK)
+            if remaining >= MIN_COMPRESSED_TOKENS:
+                content = self._truncate(msg["content"], remaining)
+                kept.append({"role": msg["role"], "content": content})
+                used += self.message_tokens(content)
+                compressed = 1
+            break
+
+        kept.reverse()
+        return ContextResult(
+            history=kept,
+            tokens=used,
+            dropped=len(history) - len(kept),
+            compressed=compressed
+        )
+
+    @staticmethod
+    def _truncate(content: str, budget: int) -> str:
+        """保留内容结尾不超过budget个token的部分"""
+        low, high = 0, len(content)
+        while low < high:
+            mid = (low + high) // 2
+            if estimate_tokens(content[mid:]) <= budget:
+                high = mid
+            else:
+                low = mid + 1
+        return TRUNCATION_MARK + content[low:]
@@ -0,0 +1,20 @@
+from backend.services.llm.registry import ModelClient, ModelRegistry, model_registry, parse_model_spec
+from backend.services.llm.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientModel,
+    breaker_stats,
+    resilient_model,
+)
+
+__all__ = [
+    "ModelClient",
+    "ModelRegistry",
+    "model_registry",
+    "parse_model_spec",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "ResilientModel",
+    "breaker_stats",
+    "resilient_model",
+]
@@ -0,0 +1,142 @@
+from typing import Any, AsyncGenerator, Dict, List, Optional
+import json
+import logging
+
+import httpx
+
+from backend.services.base import AIService, AIServiceException
+
+logger = logging.getLogger("ai_lawyer")
+
+# 限流和服务端错误可以重试
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class DashScopeProvider(AIService):
+    """通过DashScope的OpenAI兼容接口调用通义千问
+
+    所有请求共享一个httpx连接池，保持长连接复用，避免每次调用重新握手。
+    """
+
+    name = "dashscope"
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        connect_timeout: float,
+        read_timeout: float,
+        max_connections: int,
+        max_keepalive: int
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=connect_timeout,
+            pool=connect_timeout
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # 首次使用时创建，确保绑定到服务运行的事件循环
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                limits=self.limits
+            )
+        return self._client
+
+    def _payload(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        stream: bool
+    ) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": stream,
+        }
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        return payload
+
+    @staticmethod
+    async def _raise_for_status(response: httpx.Response) -> None:
+        if response.status_code < 400:
+            return
+        body = (await response.aread()).decode("utf-8", errors="replace")[:500]
+        raise AIServiceException(
+            f"DashScope请求失败 - 状态码: {response.status_code}, 响应: {body}",
+            status_code=response.status_code,
+            retryable=response.status_code in RETRYABLE_STATUS
+        )
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> AsyncGenerator[str, None]:
+        payload = self._payload(messages, model, temperature, max_tokens, stream=True)
+        try:
+            async with self.client.stream("POST", "/chat/completions", json=payload) as response:
+                await self._raise_for_status(response)
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    choices = chunk.get("choices") or []
+                    if not choices:
+                        continue
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+        except httpx.TimeoutException as e:
+            raise AIServiceException(f"DashScope请求超时: {type(e).__name__}", retryable=True) from e
+        except httpx.TransportError as e:
+            raise AIServiceException(f"DashScope连接失败: {str(e)}", retryable=True) from e
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        payload = self._payload(messages, model, temperature, max_tokens, stream=False)
+        try:
+            response = await self.client.post("/chat/completions", json=payload)
+        except httpx.TimeoutException as e:
+            raise AIServiceException(f"DashScope请求超时: {type(e).__name__}", retryable=True) from e
+        except httpx.TransportError as e:
+            raise AIServiceException(f"DashScope连接失败: {str(e)}", retryable=True) from e
+        await self._raise_for_status(response)
+        data = response.json()
+        return data["choices"][0]["message"]["content"] or ""
+
+    def warm_up(self) -> None:
+        # 在服务的事件循环中提前创建连接池
+        self.client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
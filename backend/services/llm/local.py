@@ -0,0 +1,72 @@
+from typing import AsyncGenerator, Dict, List, Optional
+import asyncio
+import hashlib
+import random
+
+from backend.services.base import AIService, AIServiceException
+
+LOCAL_PHRASES = [
+    "根据《中华人民共和国劳动合同法》的相关规定，",
+    "用人单位解除劳动合同应当依法支付经济补偿，",
+    "建议您保留好劳动合同、工资流水等证据材料，",
+    "如协商不成，可以向劳动争议仲裁委员会申请仲裁。",
+    "\n\n1. 分析法律问题\n",
+    "2. 提供具体建议\n",
+    "需要注意的是，仲裁时效一般为一年。",
+]
+
+class LocalProvider(AIService):
+    """本地确定性模型，不访问网络
+
+    相同的输入总是得到相同的输出，可配置首token延迟、输出速率和失败率，
+    用于开发调试、测试和压测。
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        first_token_delay: float = 0.0,
+        token_rate: float = 0.0,
+        answer_tokens: int = 50,
+        failure_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.first_token_delay = first_token_delay
+        self.token_rate = token_rate
+        self.answer_tokens = answer_tokens
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def _maybe_fail(self) -> None:
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise AIServiceException("本地模型模拟调用失败", status_code=503, retryable=True)
+
+    @staticmethod
+    def _offset(messages: List[Dict[str, str]], model: str) -> int:
+        digest = hashlib.sha256(
+            "\0".join([model] + [msg["content"] for msg in messages]).encode("utf-8")
+        ).digest()
+        return digest[0] % len(LOCAL_PHRASES)
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> AsyncGenerator[str, None]:
+        self.calls += 1
+        if self.first_token_delay:
+            await asyncio.sleep(self.first_token_delay)
+        self._maybe_fail()
+        interval = 1.0 / self.token_rate if self.token_rate > 0 else 0.0
+        offset = self._offset(messages, model)
+        count = min(self.answer_tokens, max_tokens) if max_tokens else self.answer_tokens
+        for i in range(count):
+            if i and interval:
+                await asyncio.sleep(interval)
+            phrase = LOCAL_PHRASES[(offset + i) % len(LOCAL_PHRASES)]
+            yield phrase[:8] if i % 3 else phrase
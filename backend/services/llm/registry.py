@@ -0,0 +1,107 @@
+from typing import AsyncGenerator, Callable, Dict, List, Optional, Tuple
+import logging
+
+from backend.core.config import settings
+from backend.services.base import AIService, AIServiceException
+
+logger = logging.getLogger("ai_lawyer")
+
+# 未写明提供方的模型名默认使用DashScope
+DEFAULT_PROVIDER = "dashscope"
+
+def parse_model_spec(spec: str) -> Tuple[str, str]:
+    """解析 "提供方:模型名" 格式的模型配置"""
+    provider, sep, model = spec.partition(":")
+    if not sep:
+        return DEFAULT_PROVIDER, spec.strip()
+    return provider.strip().lower(), model.strip()
+
+class ModelClient:
+    """绑定了提供方、模型名和采样参数的模型调用入口"""
+
+    def __init__(self, provider: AIService, model: str, temperature: float):
+        self.provider = provider
+        self.model = model
+        self.temperature = temperature
+
+    @property
+    def spec(self) -> str:
+        return f"{self.provider.name}:{self.model}"
+
+    def stream(self, messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> AsyncGenerator[str, None]:
+        return self.provider.stream(
+            messages, model=self.model, temperature=self.temperature, max_tokens=max_tokens
+        )
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> str:
+        return await self.provider.complete(
+            messages, model=self.model, temperature=self.temperature, max_tokens=max_tokens
+        )
+
+    def warm_up(self) -> None:
+        self.provider.warm_up()
+
+class ModelRegistry:
+    """模型提供方注册表
+
+    提供方实例在首次使用时创建并在进程内共享，同一提供方的所有模型
+    复用同一个连接池。
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], AIService]] = {}
+        self._providers: Dict[str, AIService] = {}
+
+    def register_factory(self, name: str, factory: Callable[[], AIService]) -> None:
+        self._factories[name] = factory
+
+    def register(self, provider: AIService) -> None:
+        """直接注册提供方实例，替换同名的已有实例"""
+        self._providers[provider.name] = provider
+
+    def get_provider(self, name: str) -> AIService:
+        provider = self._providers.get(name)
+        if provider is None:
+            factory = self._factories.get(name)
+            if factory is None:
+                raise AIServiceException(f"未知的模型提供方: {name}")
+            provider = self._providers[name] = factory()
+            logger.info(f"初始化模型提供方: {name}")
+        return provider
+
+    def resolve(self, spec: str, temperature: float = 0.7) -> ModelClient:
+        provider_name, model = parse_model_spec(spec)
+        return ModelClient(self.get_provider(provider_name), model, temperature)
+
+    async def aclose(self) -> None:
+        for provider in self._providers.values():
+            try:
+                await provider.aclose()
+            except Exception as e:
+                logger.error(f"关闭模型提供方失败: {str(e)}", exc_info=True)
+
+def _dashscope_factory() -> AIService:
+    from backend.services.llm.dashscope import DashScopeProvider
+
+    return DashScopeProvider(
+        api_key=settings.DASHSCOPE_API_KEY,
+        base_url=settings.DASHSCOPE_BASE_URL,
+        connect_timeout=settings.DASHSCOPE_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=settings.DASHSCOPE_READ_TIMEOUT_SECONDS,
+        max_connections=settings.DASHSCOPE_MAX_CONNECTIONS,
+        max_keepalive=settings.DASHSCOPE_MAX_KEEPALIVE
+    )
+
+def _local_factory() -> AIService:
+    from backend.services.llm.local import LocalProvider
+
+    return LocalProvider(
+        first_token_delay=settings.LOCAL_LLM_FIRST_TOKEN_DELAY,
+        token_rate=settings.LOCAL_LLM_TOKEN_RATE,
+        answer_tokens=settings.LOCAL_LLM_ANSWER_TOKENS,
+        failure_rate=settings.LOCAL_LLM_FAILURE_RATE
+    )
+
+model_registry = ModelRegistry()
+model_registry.register_factory("dashscope", _dashscope_factory)
+model_registry.register_factory("local", _local_factory)
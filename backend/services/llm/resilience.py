@@ -0,0 +1,383 @@
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from backend.core.config import settings
+from backend.core.logger import RATE_LIMITED
+from backend.services.base import AIServiceException
+from backend.services.llm.registry import ModelClient, model_registry
+
+logger = logging.getLogger("ai_lawyer")
+
+class CircuitOpenError(AIServiceException):
+    """熔断器打开，请求被快速拒绝"""
+
+    def __init__(self, spec: str, retry_after: float):
+        super().__init__(f"模型{spec}暂不可用，熔断中", status_code=503, retryable=False)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """按模型统计连续失败的熔断器
+
+    连续失败达到阈值后打开，期间请求直接失败；冷却时间过后进入半开状态，
+    只放行一个探测请求，探测成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if self.retry_after() > 0:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+            logger.info(f"熔断器进入半开状态 - 模型: {self.name}")
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info(f"熔断器关闭 - 模型: {self.name}")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            logger.warning(
+                f"熔断器打开 - 模型: {self.name}, 连续失败: {self.consecutive_failures}, "
+                f"冷却: {self.reset_timeout}s"
+            )
+
+    def release_probe(self) -> None:
+        """探测请求被取消且无结果时释放探测名额"""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after_seconds": round(self.retry_after(), 1) if self.state == self.OPEN else 0.0,
+        }
+
+class ResilientModel:
+    """为模型调用增加超时、对冲重试、熔断和降级
+
+    流式调用在首token超过hedge_delay仍未到达时并发发起第二个请求，
+    先返回首token的请求胜出，其余请求取消；首token前的可重试错误会立即
+    重试。首token之后已有输出，不再重试，仅受token间隔超时约束。
+    主模型熔断或全部尝试失败时，若配置了降级模型则改用降级模型。
+    """
+
+    def __init__(
+        self,
+        primary: ModelClient,
+        breaker: CircuitBreaker,
+        *,
+        first_token_timeout: float,
+        inter_token_timeout: float,
+        complete_timeout: float,
+        hedge_delay: float,
+        max_attempts: int,
+        fallback: Optional["ResilientModel"] = None
+    ):
+        self.primary = primary
+        self.breaker = breaker
+        self.first_token_timeout = first_token_timeout
+        self.inter_token_timeout = inter_token_timeout
+        self.complete_timeout = complete_timeout
+        self.hedge_delay = hedge_delay
+        self.max_attempts = max(1, max_attempts)
+        self.fallback = fallback
+        self.attempts = 0
+        self.hedged = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+
+    @property
+    def spec(self) -> str:
+        return self.primary.spec
+
+    def warm_up(self) -> None:
+        self.primary.warm_up()
+        if self.fallback is not None:
+            self.fallback.warm_up()
+
+    async def stream(self, messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> AsyncGenerator[str, None]:
+        if not self.breaker.allow():
+            if self.fallback is None:
+                raise CircuitOpenError(self.spec, self.breaker.retry_after())
+            self.fallbacks += 1
+            logger.warning("主模型熔断中，使用降级模型 - %s -> %s", self.spec, self.fallback.spec, extra=RATE_LIMITED)
+            async for content in self.fallback.stream(messages, max_tokens):
+                yield content
+            return
+
+        finished = False
+        try:
+            try:
+                gen, first = await self._open_stream(messages, max_tokens)
+            except AIServiceException as e:
+                finished = True
+                if not self._is_transient(e):
+                    self.breaker.release_probe()
+                    raise
+                self.breaker.record_failure()
+                if self.fallback is None:
+                    raise
+                self.fallbacks += 1
+                logger.warning(
+                    "主模型调用失败，使用降级模型 - %s -> %s: %s", self.spec, self.fallback.spec, e,
+                    extra=RATE_LIMITED
+                )
+                async for content in self.fallback.stream(messages, max_tokens):
+                    yield content
+                return
+
+            try:
+                if first is None:
+                    self.breaker.record_success()
+                    finished = True
+                    return
+                yield first
+                while True:
+                    try:
+                        content = await asyncio.wait_for(gen.__anext__(), timeout=self.inter_token_timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self.timeouts += 1
+                        self.breaker.record_failure()
+                        finished = True
+                        raise AIServiceException(
+                            f"模型输出中断，{self.inter_token_timeout}s内未收到新内容 - {self.spec}",
+                            retryable=True
+                        )
+                    yield content
+                self.breaker.record_success()
+                finished = True
+            finally:
+                await self._close(gen)
+        except AIServiceException as e:
+            if not finished:
+                if self._is_transient(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release_probe()
+                finished = True
+            raise
+        finally:
+            if not finished:
+                # 调用方中途取消，不计入成功或失败
+                self.breaker.release_probe()
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> str:
+        if not self.breaker.allow():
+            if self.fallback is None:
+                raise CircuitOpenError(self.spec, self.breaker.retry_after())
+            self.fallbacks += 1
+            return await self.fallback.complete(messages, max_tokens)
+
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.max_attempts):
+            self.attempts += 1
+            if attempt:
+                self.retried += 1
+            try:
+                result = await asyncio.wait_for(
+                    self.primary.complete(messages, max_tokens), timeout=self.complete_timeout
+                )
+            except asyncio.TimeoutError as e:
+                self.timeouts += 1
+                last_error = e
+            except AIServiceException as e:
+                if not e.retryable:
+                    self.breaker.release_probe()
+                    raise
+                last_error = e
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+        self.breaker.record_failure()
+        if self.fallback is not None:
+            self.fallbacks += 1
+            logger.warning("主模型调用失败，使用降级模型 - %s -> %s", self.spec, self.fallback.spec, extra=RATE_LIMITED)
+            return await self.fallback.complete(messages, max_tokens)
+        if isinstance(last_error, asyncio.TimeoutError):
+            raise AIServiceException(f"模型调用超时 - {self.spec}", retryable=True) from last_error
+        raise last_error
+
+    async def _open_stream(
+        self, messages: List[Dict[str, str]], max_tokens: Optional[int]
+    ) -> Tuple[AsyncGenerator[str, None], Optional[str]]:
+        """发起请求直到拿到首token，返回胜出的流和首token（空回答时为None）"""
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        deadline = started_at + self.first_token_timeout
+        hedge_at = started_at + self.hedge_delay if self.hedge_delay > 0 else None
+        pending: Dict[asyncio.Future, AsyncGenerator[str, None]] = {}
+        launched = 0
+        last_error: Optional[BaseException] = None
+
+        def launch() -> None:
+            nonlocal launched
+            launched += 1
+            self.attempts += 1
+            gen = self.primary.stream(messages, max_tokens)
+            pending[asyncio.ensure_future(gen.__anext__())] = gen
+
+        launch()
+        try:
+            while True:
+                if not pending:
+                    if launched >= self.max_attempts:
+                        raise last_error
+                    self.retried += 1
+                    launch()
+
+                now = loop.time()
+                if now >= deadline:
+                    self.timeouts += 1
+                    raise AIServiceException(
+                        f"首token超时，{self.first_token_timeout}s内未收到输出 - {self.spec}",
+                        retryable=True
+                    )
+                wake = deadline
+                if hedge_at is not None and launched < self.max_attempts:
+                    wake = min(wake, hedge_at)
+                done, _ = await asyncio.wait(
+                    list(pending), timeout=max(0.0, wake - now), return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    gen = pending.pop(task)
+                    try:
+                        first = task.result()
+                    except StopAsyncIteration:
+                        return gen, None
+                    except AIServiceException as e:
+                        await self._close(gen)
+                        if not e.retryable:
+                            raise
+                        last_error = e
+                        logger.warning("模型请求失败，准备重试 - %s: %s", self.spec, e, extra=RATE_LIMITED)
+                    except Exception as e:
+                        await self._close(gen)
+                        last_error = AIServiceException(f"模型请求异常 - {self.spec}: {str(e)}", retryable=True)
+                        logger.warning("模型请求异常，准备重试 - %s: %s", self.spec, e, extra=RATE_LIMITED)
+                    else:
+                        if launched > 1:
+                            logger.info("重试请求胜出 - 模型: %s, 尝试次数: %s", self.spec, launched, extra=RATE_LIMITED)
+                        return gen, first
+
+                if (
+                    not done and hedge_at is not None and loop.time() >= hedge_at
+                    and launched < self.max_attempts
+                ):
+                    hedge_at = None
+                    self.hedged += 1
+                    logger.info("首token超过%ss未到达，发起对冲请求 - %s", self.hedge_delay, self.spec, extra=RATE_LIMITED)
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            for gen in pending.values():
+                await self._close(gen)
+
+    @staticmethod
+    def _is_transient(error: AIServiceException) -> bool:
+        return error.retryable
+
+    @staticmethod
+    async def _close(gen: AsyncGenerator[str, None]) -> None:
+        try:
+            await gen.aclose()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "model": self.spec,
+            "breaker": self.breaker.stats(),
+            "attempts": self.attempts,
+            "retried": self.retried,
+            "hedged": self.hedged,
+            "timeouts": self.timeouts,
+            "fallbacks": self.fallbacks,
+        }
+        if self.fallback is not None:
+            stats["fallback"] = self.fallback.stats()
+        return stats
+
+# 熔断器按模型共享，同一模型的所有调用方共同计数
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(spec: str) -> CircuitBreaker:
+    breaker = _breakers.get(spec)
+    if breaker is None:
+        breaker = _breakers[spec] = CircuitBreaker(
+            spec,
+            failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.LLM_BREAKER_RESET_SECONDS
+        )
+    return breaker
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    return {spec: breaker.stats() for spec, breaker in _breakers.items()}
+
+def resilient_model(spec: str, temperature: float, fallback_spec: Optional[str] = None) -> ResilientModel:
+    """按配置创建带超时、重试和熔断的模型调用入口"""
+
+    def build(model_spec: str, fallback: Optional[ResilientModel]) -> ResilientModel:
+        client = model_registry.resolve(model_spec, temperature=temperature)
+        return ResilientModel(
+            client,
+            get_breaker(client.spec),
+            first_token_timeout=settings.LLM_FIRST_TOKEN_TIMEOUT_SECONDS,
+            inter_token_timeout=settings.LLM_INTER_TOKEN_TIMEOUT_SECONDS,
+            complete_timeout=settings.LLM_COMPLETE_TIMEOUT_SECONDS,
+            hedge_delay=settings.LLM_HEDGE_DELAY_SECONDS,
+            max_attempts=settings.LLM_MAX_ATTEMPTS,
+            fallback=fallback
+        )
+
+    fallback = build(fallback_spec, None) if fallback_spec else None
+    return build(spec, fallback)
@@ -0,0 +1,79 @@
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+import math
+import time
+
+from backend.core.cache import TTLCache
+from backend.core.config import settings
+
+class LoginThrottled(Exception):
+    """登录失败次数过多，暂时拒绝"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("登录尝试过于频繁，请稍后再试")
+        self.retry_after = retry_after
+
+class LoginThrottle:
+    """按用户名和来源IP统计登录失败次数
+
+    窗口内失败次数达到上限后，在密码校验之前直接拒绝，撞库请求不会占用
+    哈希线程池。按用户名限流保护单个账号，按IP限流限制单一来源尝试大量
+    账号；登录成功后清除该用户名的失败记录。
+    """
+
+    def __init__(self, max_failures_per_user: int, max_failures_per_ip: int, window: float):
+        self.max_failures_per_user = max_failures_per_user
+        self.max_failures_per_ip = max_failures_per_ip
+        self.window = window
+        self.throttled = 0
+        # 失败时间戳，空闲超过窗口的键自动过期
+        self._failures: TTLCache[str, Deque[float]] = TTLCache(max_entries=100000, ttl=window)
+
+    def _recent(self, key: str, now: float) -> Optional[Deque[float]]:
+        failures = self._failures.get(key)
+        if failures is None:
+            return None
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        return failures
+
+    def _retry_after(self, key: str, limit: int, now: float) -> int:
+        failures = self._recent(key, now)
+        if failures is None or len(failures) < limit:
+            return 0
+        # 最早的一次失败移出窗口后即可重试
+        return max(1, math.ceil(failures[-limit] + self.window - now))
+
+    def check(self, username: str, ip: Optional[str]) -> None:
+        now = time.monotonic()
+        retry_after = self._retry_after(f"user:{username.lower()}", self.max_failures_per_user, now)
+        if ip:
+            retry_after = max(retry_after, self._retry_after(f"ip:{ip}", self.max_failures_per_ip, now))
+        if retry_after:
+            self.throttled += 1
+            raise LoginThrottled(retry_after)
+
+    def record_failure(self, username: str, ip: Optional[str]) -> None:
+        now = time.monotonic()
+        keys = [f"user:{username.lower()}"] + ([f"ip:{ip}"] if ip else [])
+        for key in keys:
+            failures = self._recent(key, now)
+            if failures is None:
+                failures = deque()
+            failures.append(now)
+            self._failures.set(key, failures)
+
+    def record_success(self, username: str) -> None:
+        self._failures.pop(f"user:{username.lower()}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked_keys": len(self._failures),
+            "throttled": self.throttled,
+        }
+
+login_throttle = LoginThrottle(
+    max_failures_per_user=settings.LOGIN_MAX_FAILURES_PER_USER,
+    max_failures_per_ip=settings.LOGIN_MAX_FAILURES_PER_IP,
+    window=settings.LOGIN_FAILURE_WINDOW_SECONDS
+)
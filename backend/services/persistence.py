@@ -0,0 +1,238 @@
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import contextvars
+import datetime
+import logging
+import time
+
+from backend import crud
+from backend.core.config import settings
+from backend.core.metrics import PERSIST_WAIT_SECONDS
+from backend.db.database import SessionLocal
+from backend.services.search import search_index
+
+logger = logging.getLogger("ai_lawyer")
+
+class _PendingWrite:
+    """一条等待落库的写入"""
+
+    __slots__ = ("chat_id", "user_id", "message", "title", "at", "queued_at", "future")
+
+    def __init__(
+        self,
+        chat_id: int,
+        message: Optional[Dict[str, Any]],
+        title: Optional[str],
+        user_id: Optional[int] = None
+    ):
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.message = message
+        self.title = title
+        self.at = datetime.datetime.utcnow()
+        self.queued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+class MessageWriter:
+    """消息的异步批量写入（write-behind）
+
+    消息插入和对话标题、updated_at的更新先进入内存队列，由后台任务按批
+    在一个事务中写入并提交，多个对话的写入共享一次提交。
+
+    - 读己之写：读取某个对话前调用flush(chat_id)，等待该对话已排队的写入落库；
+      读取用户的对话列表前调用flush(user_id=...)，只等待该用户的写入
+    - 持久性：每次写入返回一个future，提交成功后完成；关闭服务时close()
+      会写完队列中的全部内容，进程异常退出最多丢失一个批次窗口内的写入
+    """
+
+    def __init__(self, batch_max: int, batch_window: float, queue_max: int):
+        self.batch_max = batch_max
+        self.batch_window = batch_window
+        self.queue_max = queue_max
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._pending: Dict[int, Set[asyncio.Future]] = defaultdict(set)
+        self._pending_by_user: Dict[int, Set[asyncio.Future]] = defaultdict(set)
+        self._closed = False
+        self.batches = 0
+        self.writes = 0
+        self.failures = 0
+        self.max_batch = 0
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        if self._closed:
+            raise RuntimeError("消息写入队列已关闭")
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_max)
+        if self._worker is None or self._worker.done():
+            # 常驻任务在空上下文中创建，不继承首个请求的请求id和剖析
+            self._worker = contextvars.Context().run(asyncio.create_task, self._run())
+        return self._queue
+
+    async def _enqueue(self, write: _PendingWrite) -> asyncio.Future:
+        queue = self._ensure_worker()
+        self._pending[write.chat_id].add(write.future)
+        if write.user_id is not None:
+            self._pending_by_user[write.user_id].add(write.future)
+        # 队列已满时等待，对上游形成背压
+        await queue.put(write)
+        return write.future
+
+    async def add_message(
+        self,
+        chat_id: int,
+        role: str,
+        content: str,
+        truncated: bool = False,
+        user_id: Optional[int] = None
+    ) -> asyncio.Future:
+        """排队写入一条消息，返回提交完成时结束的future
+
+        传入user_id时，提交后同时写入对话检索索引
+        """
+        write = _PendingWrite(chat_id, None, None, user_id)
+        write.message = {
+            "chat_id": chat_id,
+            "role": role,
+            "content": content,
+            "truncated": truncated,
+            # 以排队时间作为消息时间，批量插入不改变先后顺序
+            "created_at": write.at,
+        }
+        return await self._enqueue(write)
+
+    async def set_title(
+        self, chat_id: int, title: str, user_id: Optional[int] = None
+    ) -> asyncio.Future:
+        """排队更新对话标题"""
+        return await self._enqueue(_PendingWrite(chat_id, None, title, user_id))
+
+    async def flush(self, chat_id: Optional[int] = None, user_id: Optional[int] = None) -> None:
+        """等待指定对话或指定用户（都未指定时为全部）已排队的写入完成"""
+        if chat_id is not None:
+            futures = set(self._pending.get(chat_id, ()))
+        elif user_id is not None:
+            futures = set(self._pending_by_user.get(user_id, ()))
+        else:
+            futures = {future for futures in self._pending.values() for future in futures}
+        if futures:
+            # asyncio.wait不会在调用方被取消时取消这些future
+            await asyncio.wait(futures)
+
+    async def close(self) -> None:
+        """写完队列中的全部内容后停止后台任务"""
+        self._closed = True
+        await self.flush()
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        logger.info(f"消息写入队列已关闭 - 批次: {self.batches}, 写入: {self.writes}")
+
+    async def _run(self) -> None:
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            if self.batch_window > 0:
+                # 短暂等待，让并发到达的写入合并到同一次提交
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.batch_max:
+                try:
+                    batch.append(queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            await self._write(batch)
+
+    async def _write(self, batch: List[_PendingWrite]) -> None:
+        messages = []
+        chat_updates: Dict[int, Dict[str, Any]] = {}
+        for write in batch:
+            values = chat_updates.setdefault(write.chat_id, {})
+            values["updated_at"] = write.at
+            if write.message is not None:
+                messages.append(write.message)
+            if write.title is not None:
+                values["title"] = write.title
+
+        try:
+            async with SessionLocal() as db:
+                message_ids = await crud.chat.save_batch(
+                    db=db, messages=messages, chat_updates=chat_updates
+                )
+        except Exception as e:
+            if len(batch) > 1:
+                # 逐条重试，避免一条异常数据导致整批丢失
+                logger.error(f"批量写入失败，改为逐条写入 - 数量: {len(batch)}: {str(e)}", exc_info=True)
+                for write in batch:
+                    await self._write([write])
+                return
+            self.failures += 1
+            logger.error(f"消息写入失败 - chat_id: {batch[0].chat_id}: {str(e)}", exc_info=True)
+            self._finish(batch, e)
+            return
+
+        self.batches += 1
+        self.writes += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+        # 先更新索引再完成future，flush之后的检索能看到这批写入
+        await self._index(batch, message_ids)
+        self._finish(batch, None)
+
+    async def _index(self, batch: List[_PendingWrite], message_ids: List[int]) -> None:
+        """将已提交的消息和标题写入检索索引，失败只记录日志，可通过重建索引恢复"""
+        if search_index is None:
+            return
+        ids = iter(message_ids)
+        messages = []
+        titles = []
+        for write in batch:
+            if write.message is not None:
+                message_id = next(ids)
+                if write.user_id is not None and write.message["content"]:
+                    messages.append((write.user_id, {**write.message, "id": message_id}))
+            if write.title is not None and write.user_id is not None:
+                titles.append((write.user_id, write.chat_id, write.title, write.at))
+        try:
+            await search_index.index(messages, titles)
+        except Exception as e:
+            logger.error(f"检索索引写入失败 - 数量: {len(messages) + len(titles)}: {str(e)}", exc_info=True)
+
+    def _finish(self, batch: List[_PendingWrite], error: Optional[BaseException]) -> None:
+        now = time.monotonic()
+        for write in batch:
+            if not write.future.done():
+                if error is None:
+                    PERSIST_WAIT_SECONDS.observe(now - write.queued_at)
+                    write.future.set_result(None)
+                else:
+                    write.future.set_exception(error)
+                    # 错误已记录日志，无人等待时不再重复告警
+                    write.future.exception()
+            self._discard(self._pending, write.chat_id, write.future)
+            if write.user_id is not None:
+                self._discard(self._pending_by_user, write.user_id, write.future)
+
+    @staticmethod
+    def _discard(pending: Dict[int, Set[asyncio.Future]], key: int, future: asyncio.Future) -> None:
+        futures = pending.get(key)
+        if futures is not None:
+            futures.discard(future)
+            if not futures:
+                del pending[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "pending_chats": len(self._pending),
+            "batches": self.batches,
+            "writes": self.writes,
+            "failures": self.failures,
+            "max_batch": self.max_batch,
+            "avg_batch": self.writes / self.batches if self.batches else 0.0,
+        }
+
+message_writer = MessageWriter(
+    batch_max=settings.PERSIST_BATCH_MAX,
+    batch_window=settings.PERSIST_BATCH_WINDOW_SECONDS,
+    queue_max=settings.PERSIST_QUEUE_MAX
+)
@@ -0,0 +1,315 @@
+"""对话历史全文检索
+
+索引存放在独立的SQLite FTS5文件中，与主数据库类型无关。中文按字二元组
+预先切分后写入（与法条检索使用相同的切分），查询时转为短语匹配；
+每条记录带有用户和对话标记词，按用户过滤直接走倒排索引。结果按
+（相关度, rowid）键集分页，可以翻到该用户的全部命中；单字查询按
+（时间, rowid）倒序分页，消息时间为创建时间，标题时间为最近一次修改时间。
+
+消息在批量写入提交后增量建索引。已有数据可全量重建：
+    python -m backend.services.search
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import re
+import sqlite3
+import sys
+import threading
+
+from backend.core.config import settings
+from backend.core.pagination import decode_key_cursor, encode_key_cursor
+from backend.rag import tokenize
+
+logger = logging.getLogger("ai_lawyer")
+
+# 片段中命中词前后保留的字数
+SNIPPET_BEFORE = 20
+SNIPPET_AFTER = 60
+
+# 标题命中的得分加权
+TITLE_BOOST = 2.0
+
+SINGLE_CJK = re.compile(r"^[一-鿿]$")
+
+@dataclass
+class SearchHit:
+    """一条检索结果"""
+    kind: str
+    chat_id: int
+    message_id: Optional[int]
+    role: Optional[str]
+    snippet: str
+    highlights: List[Tuple[int, int]] = field(default_factory=list)
+    created_at: Optional[str] = None
+    score: float = 0.0
+
+def _segment(text: str) -> str:
+    return " ".join(tokenize(text))
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    # 固定到微秒，字符串顺序与时间顺序一致
+    return value.isoformat(timespec="microseconds") if value is not None else None
+
+def build_match_query(query: str) -> Optional[str]:
+    """将用户输入转换为FTS5查询：空白分隔的各词之间为AND，每个词内的二元组为短语"""
+    clauses = []
+    for term in query.split():
+        tokens = tokenize(term)
+        if not tokens:
+            continue
+        if len(tokens) == 1 and SINGLE_CJK.match(tokens[0]):
+            # 单个汉字没有对应的二元组，按前缀匹配
+            clauses.append(f'"{tokens[0]}"*')
+        else:
+            clauses.append('"' + " ".join(tokens) + '"')
+    if not clauses:
+        return None
+    return " AND ".join(clauses)
+
+def make_snippet(content: str, terms: Sequence[str]) -> Tuple[str, List[Tuple[int, int]]]:
+    """截取首个命中词附近的片段，返回片段及其中各命中词的位置"""
+    lowered = content.lower()
+    positions = [(lowered.find(term), term) for term in terms if term]
+    positions = [(pos, term) for pos, term in positions if pos >= 0]
+    if positions:
+        first = min(pos for pos, _ in positions)
+        start = max(0, first - SNIPPET_BEFORE)
+    else:
+        start = 0
+    end = min(len(content), start + SNIPPET_BEFORE + SNIPPET_AFTER)
+    snippet = content[start:end].replace("\n", " ")
+    highlights = []
+    window = lowered[start:end]
+    for term in {term for _, term in positions}:
+        offset = window.find(term)
+        while offset >= 0:
+            highlights.append((offset, offset + len(term)))
+            offset = window.find(term, offset + len(term))
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(content) else ""
+    if prefix:
+        highlights = [(s + 1, e + 1) for s, e in highlights]
+    return prefix + snippet + suffix, sorted(highlights)
+
+class SearchIndex:
+    """基于SQLite FTS5的对话历史索引"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @staticmethod
+    def message_rowid(message_id: int) -> int:
+        return message_id * 2
+
+    @staticmethod
+    def title_rowid(chat_id: int) -> int:
+        return chat_id * 2 + 1
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+                "owner, chat, body, "
+                "kind UNINDEXED, chat_id UNINDEXED, message_id UNINDEXED, role UNINDEXED, "
+                "content UNINDEXED, created_at UNINDEXED, "
+                "tokenize = 'unicode61')"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _write(self, upserts: Iterable[Tuple], delete_rowids: Iterable[int] = ()) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "DELETE FROM search_index WHERE rowid = ?", [(rowid,) for rowid in delete_rowids]
+            )
+            conn.executemany(
+                "INSERT INTO search_index (rowid, owner, chat, body, kind, chat_id, message_id, "
+                "role, content, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                upserts
+            )
+            conn.commit()
+
+    @classmethod
+    def _message_row(cls, user_id: int, message: Dict[str, Any]) -> Tuple:
+        return (
+            cls.message_rowid(message["id"]),
+            f"u{user_id}",
+            f"c{message['chat_id']}",
+            _segment(message["content"]),
+            "message",
+            message["chat_id"],
+            message["id"],
+            message["role"],
+            message["content"],
+            _timestamp(message.get("created_at")),
+        )
+
+    @classmethod
+    def _title_row(cls, user_id: int, chat_id: int, title: str, updated_at: Optional[datetime]) -> Tuple:
+        return (
+            cls.title_rowid(chat_id), f"u{user_id}", f"c{chat_id}", _segment(title),
+            "title", chat_id, None, None, title, _timestamp(updated_at),
+        )
+
+    def _index(
+        self,
+        messages: List[Tuple[int, Dict[str, Any]]],
+        titles: List[Tuple[int, int, str, Optional[datetime]]]
+    ) -> None:
+        rows = [self._message_row(user_id, message) for user_id, message in messages]
+        rows += [self._title_row(*title) for title in titles]
+        # 先删除同rowid的旧记录，重复写入时保持幂等
+        self._write(rows, [row[0] for row in rows])
+
+    def _remove_chat(self, chat_id: int) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "DELETE FROM search_index WHERE rowid IN ("
+                "SELECT rowid FROM search_index WHERE search_index MATCH ?)",
+                (f"chat:c{chat_id}",)
+            )
+            conn.commit()
+
+    def _search(
+        self, user_id: int, match: str, limit: int, after: Optional[Tuple[str, int]], by_recency: bool
+    ) -> List[Tuple]:
+        query = f"owner:u{user_id} AND ({match})"
+        # rowid在子查询中取别名，外层按排序键做键集过滤
+        hits = (
+            "SELECT * FROM (SELECT rowid AS rid, kind, chat_id, message_id, role, content, created_at, "
+            "bm25(search_index, 0.0, 0.0, 1.0) * "
+            f"(CASE kind WHEN 'title' THEN {TITLE_BOOST} ELSE 1.0 END) AS score, "
+            "COALESCE(created_at, '') AS position "
+            "FROM search_index WHERE search_index MATCH ?) "
+        )
+        if by_recency:
+            keyset = "WHERE position < ? OR (position = ? AND rid < ?) " if after else ""
+            order = "ORDER BY position DESC, rid DESC LIMIT ?"
+            params: Tuple = (after[0], after[0], after[1]) if after else ()
+        else:
+            keyset = "WHERE score > ? OR (score = ? AND rid > ?) " if after else ""
+            order = "ORDER BY score, rid LIMIT ?"
+            params = (float(after[0]), float(after[0]), after[1]) if after else ()
+        with self._lock:
+            return self._connection().execute(
+                hits + keyset + order, (query, *params, limit)
+            ).fetchall()
+
+    async def index(
+        self,
+        messages: List[Tuple[int, Dict[str, Any]]],
+        titles: List[Tuple[int, int, str, Optional[datetime]]]
+    ) -> None:
+        """增量写入消息 (user_id, message) 和标题 (user_id, chat_id, title, updated_at)"""
+        if messages or titles:
+            await asyncio.to_thread(self._index, messages, titles)
+
+    async def remove_chat(self, chat_id: int) -> None:
+        await asyncio.to_thread(self._remove_chat, chat_id)
+
+    async def search(
+        self, user_id: int, query: str, limit: int = 20, cursor: Optional[str] = None
+    ) -> Tuple[List[SearchHit], Optional[str]]:
+        """检索用户的对话历史，按相关度排序，返回本页结果和下一页游标
+
+        游标格式无效时抛出ValueError
+        """
+        match = build_match_query(query)
+        if match is None:
+            return [], None
+        # 单字前缀查询的相关度没有区分度，按时间倒序返回
+        by_recency = all(SINGLE_CJK.match(term) for term in query.split())
+        after = decode_key_cursor(cursor) if cursor is not None else None
+        rows = await asyncio.to_thread(self._search, user_id, match, limit + 1, after, by_recency)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_key_cursor(last[8] if by_recency else repr(last[7]), last[0])
+        terms = [term.lower() for term in query.split()]
+        hits = []
+        for _, kind, chat_id, message_id, role, content, created_at, score, _ in rows:
+            snippet, highlights = make_snippet(content, terms)
+            hits.append(SearchHit(
+                kind=kind,
+                chat_id=chat_id,
+                message_id=message_id,
+                role=role,
+                snippet=snippet,
+                highlights=highlights,
+                created_at=created_at,
+                score=-score,
+            ))
+        return hits, next_cursor
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM search_index").fetchone()[0]
+
+    async def rebuild(self, batch_size: int = 1000) -> int:
+        """从主数据库全量重建索引，返回写入的记录数"""
+        from sqlalchemy import select
+
+        from backend.db.database import SessionLocal
+        from backend.models.chat import Chat, Message
+
+        def clear() -> None:
+            with self._lock:
+                conn = self._connection()
+                conn.execute("DELETE FROM search_index")
+                conn.commit()
+
+        await asyncio.to_thread(clear)
+        total = 0
+        async with SessionLocal() as db:
+            chats = (await db.execute(select(Chat.id, Chat.user_id, Chat.title, Chat.updated_at))).all()
+            owners = {chat_id: user_id for chat_id, user_id, _, _ in chats}
+            await self.index([], [
+                (user_id, chat_id, title or "", updated_at) for chat_id, user_id, title, updated_at in chats
+            ])
+            total += len(chats)
+
+            last_id = 0
+            while True:
+                rows = (await db.execute(
+                    select(Message.id, Message.chat_id, Message.role, Message.content, Message.created_at)
+                    .where(Message.id > last_id)
+                    .order_by(Message.id)
+                    .limit(batch_size)
+                )).mappings().all()
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                messages = [
+                    (owners[row["chat_id"]], dict(row)) for row in rows
+                    if row["chat_id"] in owners and row["content"]
+                ]
+                await self.index(messages, [])
+                total += len(messages)
+        logger.info(f"对话检索索引重建完成 - 记录数: {total}")
+        return total
+
+search_index = (
+    SearchIndex(settings.SEARCH_INDEX_PATH) if settings.SEARCH_ENABLED else None
+)
+
+def main() -> int:
+    if search_index is None:
+        logger.error("SEARCH_ENABLED未开启，无需重建索引")
+        return 1
+    asyncio.run(search_index.rebuild())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+from typing import AsyncIterator, Callable, Dict, List, Optional, Any
+import asyncio
+import logging
+
+from backend.core.logger import RATE_LIMITED
+from backend.core.metrics import SINGLE_FLIGHT_EVENTS
+
+logger = logging.getLogger("ai_lawyer")
+
+class _Flight:
+    """一次进行中的上游调用及其已产出的片段"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+class SingleFlight:
+    """合并相同的进行中流式请求
+
+    相同key的请求共享同一个上游流，片段分发给所有订阅者；中途加入的
+    订阅者先回放已产出的片段。所有订阅者都离开后取消上游调用。
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    async def stream(
+        self, key: str, factory: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, factory))
+            self.leaders += 1
+            SINGLE_FLIGHT_EVENTS.labels("leader").inc()
+        else:
+            self.coalesced += 1
+            SINGLE_FLIGHT_EVENTS.labels("coalesced").inc()
+            logger.info("合并相同的进行中请求 - 订阅者: %s", flight.subscribers + 1, extra=RATE_LIMITED)
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(flight.chunks):
+                    index += 1
+                    yield flight.chunks[index - 1]
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # 立即移除，之后到达的相同请求重新发起上游调用
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _run(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[str]]) -> None:
+        try:
+            async for chunk in factory():
+                flight.chunks.append(chunk)
+                flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            self.cancelled += 1
+            SINGLE_FLIGHT_EVENTS.labels("cancelled").inc()
+            logger.info("所有订阅者已离开，取消上游请求")
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,196 @@
+"""可续传的生成流
+
+每次生成对应一个GenerationStream，生成任务与HTTP响应解耦：事件带顺序号
+写入有界的重放缓冲，连接断开后客户端携带Last-Event-ID重新连接，从断点
+之后继续接收；缓冲已淘汰的部分以snapshot事件（已生成的全文）补齐。
+
+- 所有订阅者断开后生成继续进行STREAM_RESUME_GRACE_SECONDS，期间无人重连
+  则取消生成（已生成部分按截断保存）
+- 生成结束后保留STREAM_RETAIN_SECONDS，供重连时重放完整回答
+- 同一用户的Idempotency-Key映射到同一个流，重复提交不会再次生成
+"""
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import uuid
+
+from backend.core.cache import TTLCache
+from backend.core.config import settings
+
+logger = logging.getLogger("ai_lawyer")
+
+StreamEvent = Tuple[int, str, str]
+
+def format_event_id(stream_id: str, seq: int) -> str:
+    return f"{stream_id}:{seq}"
+
+def parse_event_id(event_id: str) -> Tuple[str, int]:
+    """解析Last-Event-ID，格式无效时抛出ValueError"""
+    stream_id, _, seq = event_id.strip().rpartition(":")
+    if not stream_id:
+        raise ValueError(f"无效的事件id: {event_id}")
+    return stream_id, int(seq)
+
+class GenerationStream:
+    """一次生成的事件序列"""
+
+    def __init__(self, user_id: int, chat_id: int, max_events: int):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.events: Deque[StreamEvent] = deque(maxlen=max_events)
+        self.last_seq = 0
+        # 已生成的全文、最后一个token的序号和标题，重放缓冲不足时用于snapshot
+        self.text = ""
+        self.text_seq = 0
+        self.title: Optional[str] = None
+        self.finished = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+        self._grace_handle: Optional[asyncio.TimerHandle] = None
+
+    def publish(self, event: str, data: str) -> None:
+        self.last_seq += 1
+        self.events.append((self.last_seq, event, data))
+        if event == "token":
+            self.text += data
+            self.text_seq = self.last_seq
+        elif event == "title":
+            self.title = data
+        self._notify()
+
+    def finish(self) -> None:
+        self.finished = True
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def events_after(self, seq: int) -> List[StreamEvent]:
+        """返回seq之后的事件
+
+        断点之后的事件已被淘汰时，先返回一个snapshot事件（截至最后一个token
+        的全文和标题），再返回其后仍在缓冲中的事件
+        """
+        if not self.events or seq >= self.last_seq:
+            return []
+        first = self.events[0][0]
+        if seq >= first - 1:
+            return list(self.events)[seq - first + 1:]
+        resume_from = max(self.text_seq, first - 1)
+        snapshot = json.dumps({"text": self.text, "title": self.title}, ensure_ascii=False)
+        return [(resume_from, "snapshot", snapshot)] + list(self.events)[resume_from - first + 1:]
+
+    async def wait(self, timeout: float) -> bool:
+        """等待新事件，超时返回False"""
+        if self.finished:
+            return False
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+class StreamRegistry:
+    def __init__(self, max_events: int, grace: float, retain: float, idempotency_ttl: float):
+        self.max_events = max_events
+        self.grace = grace
+        self.retain = retain
+        self.resumed = 0
+        self.abandoned = 0
+        self._streams: Dict[str, GenerationStream] = {}
+        # (user_id, Idempotency-Key) -> stream_id，流过期后仍用于识别重复提交
+        self._keys: TTLCache[Tuple[int, str], str] = TTLCache(max_entries=100000, ttl=idempotency_ttl)
+
+    def lookup(self, user_id: int, idempotency_key: Optional[str]) -> Optional[str]:
+        if not idempotency_key:
+            return None
+        return self._keys.get((user_id, idempotency_key))
+
+    def get(self, stream_id: str) -> Optional[GenerationStream]:
+        return self._streams.get(stream_id)
+
+    def start(
+        self,
+        user_id: int,
+        chat_id: int,
+        idempotency_key: Optional[str],
+        run: Callable[[GenerationStream], Awaitable[None]]
+    ) -> GenerationStream:
+        """创建流并在后台任务中执行run(stream)，调用方需保证之前已检查过lookup"""
+        stream = GenerationStream(user_id, chat_id, self.max_events)
+        self._streams[stream.id] = stream
+        if idempotency_key:
+            self._keys.set((user_id, idempotency_key), stream.id)
+
+        async def runner() -> None:
+            try:
+                await run(stream)
+            finally:
+                stream.finish()
+                self._cancel_grace(stream)
+                asyncio.get_running_loop().call_later(self.retain, self._streams.pop, stream.id, None)
+
+        stream.task = asyncio.create_task(runner())
+        # 响应未能开始时同样按无人订阅处理
+        self._schedule_grace(stream)
+        return stream
+
+    def attach(self, stream: GenerationStream, resumed: bool = False) -> None:
+        stream.subscribers += 1
+        if resumed:
+            self.resumed += 1
+        self._cancel_grace(stream)
+
+    def detach(self, stream: GenerationStream) -> None:
+        stream.subscribers -= 1
+        if stream.subscribers <= 0 and not stream.finished:
+            self._schedule_grace(stream)
+
+    def _schedule_grace(self, stream: GenerationStream) -> None:
+        self._cancel_grace(stream)
+        stream._grace_handle = asyncio.get_running_loop().call_later(self.grace, self._abandon, stream)
+
+    def _cancel_grace(self, stream: GenerationStream) -> None:
+        if stream._grace_handle is not None:
+            stream._grace_handle.cancel()
+            stream._grace_handle = None
+
+    def _abandon(self, stream: GenerationStream) -> None:
+        stream._grace_handle = None
+        if stream.subscribers > 0 or stream.finished or stream.task is None:
+            return
+        self.abandoned += 1
+        logger.info(f"生成流无人重连，停止生成 - chat_id: {stream.chat_id}, 已生成: {len(stream.text)}字")
+        stream.task.cancel()
+
+    async def aclose(self) -> None:
+        """取消进行中的生成，已生成部分按截断保存"""
+        tasks = [
+            stream.task for stream in self._streams.values()
+            if stream.task is not None and not stream.task.done()
+        ]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"已停止进行中的生成 - 数量: {len(tasks)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "streams": len(self._streams),
+            "active": sum(1 for stream in self._streams.values() if not stream.finished),
+            "resumed": self.resumed,
+            "abandoned": self.abandoned,
+        }
+
+stream_registry = StreamRegistry(
+    max_events=settings.STREAM_REPLAY_MAX_EVENTS,
+    grace=settings.STREAM_RESUME_GRACE_SECONDS,
+    retain=settings.STREAM_RETAIN_SECONDS,
+    idempotency_ttl=settings.IDEMPOTENCY_KEY_TTL_SECONDS
+)
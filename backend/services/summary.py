@@ -0,0 +1,69 @@
+from typing import Set
+import logging
+from backend import crud
+from backend.core.config import settings
+from backend.core.logger import RATE_LIMITED
+from backend.db.database import SessionLocal
+from backend.services.admission import AdmissionRejected, admission_controller
+from backend.services.chat import get_chat_service
+from backend.services.persistence import message_writer
+
+logger = logging.getLogger("ai_lawyer")
+
+# 正在折叠摘要的对话，避免同一对话并发重复折叠
+_in_progress: Set[int] = set()
+
+# 后台摘要在准入控制中共用一个分组，与各用户的请求轮转分配名额
+SUMMARY_ADMISSION_KEY = "summary"
+
+async def refresh_chat_summary(chat_id: int) -> None:
+    """将较早的对话轮次折叠进对话的滚动摘要
+
+    未摘要的消息达到SUMMARY_TRIGGER_MESSAGES条时触发，保留最近
+    SUMMARY_KEEP_RECENT条消息原文，其余消息与已有摘要合并后推进水位。
+    """
+    if chat_id in _in_progress:
+        return
+    _in_progress.add(chat_id)
+    try:
+        await message_writer.flush(chat_id)
+        async with SessionLocal() as db:
+            chat = await crud.chat.get(db=db, id=chat_id)
+            if not chat:
+                return
+            pending = await crud.chat.get_unsummarized_messages(
+                db=db, chat_id=chat_id, after_id=chat.summary_upto_id or 0
+            )
+            if len(pending) < settings.SUMMARY_TRIGGER_MESSAGES:
+                return
+            
+            to_fold = pending[:len(pending) - settings.SUMMARY_KEEP_RECENT]
+            if not to_fold:
+                return
+            previous = chat.summary
+            upto_id = to_fold[-1].id
+            folded = [{"role": msg.role, "content": msg.content} for msg in to_fold]
+        
+        # 摘要同样占用上游并发名额，排队期间不占用数据库连接
+        try:
+            lease = await admission_controller.acquire(SUMMARY_ADMISSION_KEY)
+        except AdmissionRejected as e:
+            # 水位未推进，下一轮对话结束后会再次触发
+            logger.info("服务繁忙，推迟对话摘要 - chat_id: %s: %s", chat_id, e.reason, extra=RATE_LIMITED)
+            return
+        try:
+            summary = await get_chat_service().summarize(previous, folded)
+        finally:
+            lease.release()
+        if not summary:
+            return
+        
+        async with SessionLocal() as db:
+            await crud.chat.update_summary(
+                db=db, id=chat_id, summary=summary, summary_upto_id=upto_id
+            )
+        logger.info(f"对话摘要已更新 - chat_id: {chat_id}, 折叠消息: {len(folded)}")
+    except Exception as e:
+        logger.error(f"更新对话摘要失败: {str(e)}", exc_info=True)
+    finally:
+        _in_progress.discard(chat_id)
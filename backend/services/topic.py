@@ -0,0 +1,83 @@
+from typing import Dict, List, Optional, Set
+
+from backend.rag import tokenize
+
+# 新建对话时的默认标题
+DEFAULT_TITLE = "新对话"
+
+# 参与判断的最近用户消息数
+RECENT_TURNS = 3
+
+# 没有识别出法律领域时，问题二元组被上下文覆盖的比例达到该值视为同一主题
+OVERLAP_THRESHOLD = 0.2
+
+# 法律领域关键词
+LEGAL_DOMAINS: Dict[str, List[str]] = {
+    "劳动": ["劳动", "工资", "辞退", "解雇", "离职", "加班", "社保", "试用期", "用人单位", "经济补偿", "工伤", "劳务"],
+    "婚姻家庭": ["离婚", "结婚", "婚前", "婚后", "夫妻", "彩礼", "抚养", "抚养费", "探视", "家暴"],
+    "继承": ["继承", "遗产", "遗嘱", "遗赠", "赡养"],
+    "房产租赁": ["租房", "房东", "租客", "押金", "租赁", "房租", "房产", "购房", "买房", "物业", "拆迁"],
+    "合同": ["合同", "违约", "定金", "订金", "协议", "解约"],
+    "借贷": ["借款", "欠款", "借条", "欠条", "利息", "还款", "催收", "担保"],
+    "交通事故": ["交通", "车祸", "事故", "肇事", "交强险", "驾驶"],
+    "消费": ["消费者", "退货", "退款", "商家", "网购", "假货", "维权"],
+    "刑事": ["刑事", "犯罪", "报警", "拘留", "逮捕", "判刑", "诈骗", "盗窃", "取保候审"],
+    "公司": ["公司", "股东", "股权", "法人", "注册资本", "分红"],
+    "知识产权": ["专利", "商标", "著作权", "版权", "侵权"],
+    "行政": ["行政", "处罚", "复议", "罚款", "政府"],
+}
+
+# 不携带主题信息的常见二元组
+STOP_BIGRAMS = {
+    "怎么", "什么", "可以", "如果", "需要", "是否", "我们", "我的", "他们", "这个", "那个",
+    "请问", "能否", "应该", "没有", "还是", "一下", "这样", "那么", "怎样", "如何", "现在",
+    "要求", "问题", "情况", "的话", "已经", "但是", "因为", "所以", "还有", "自己", "有没",
+}
+
+def detect_domains(text: str) -> Set[str]:
+    """识别文本涉及的法律领域"""
+    return {
+        domain for domain, keywords in LEGAL_DOMAINS.items()
+        if any(keyword in text for keyword in keywords)
+    }
+
+def _content_bigrams(text: str) -> Set[str]:
+    return {token for token in tokenize(text) if len(token) > 1 and token not in STOP_BIGRAMS}
+
+class TopicDetector:
+    """判断最新消息是否改变了对话主题
+
+    标题仍为默认值时总是需要生成；否则比较最新消息与当前标题、摘要及
+    最近几轮用户消息涉及的法律领域，领域有交集或消息未涉及具体领域
+    （如“那怎么办？”这类追问）时保持原标题；双方都识别不出领域时退回到
+    关键词二元组的重合度判断。
+    """
+
+    def needs_new_title(
+        self,
+        current_title: str,
+        message: str,
+        history: Optional[List[Dict]] = None,
+        summary: Optional[str] = None
+    ) -> bool:
+        if not current_title or current_title == DEFAULT_TITLE:
+            return True
+
+        recent = [msg["content"] for msg in (history or []) if msg["role"] == "user"][-RECENT_TURNS:]
+        context = "\n".join([current_title, summary or ""] + recent)
+
+        message_domains = detect_domains(message)
+        context_domains = detect_domains(context)
+        if message_domains:
+            if context_domains:
+                return not (message_domains & context_domains)
+            return True
+        if context_domains:
+            # 未涉及具体领域的追问沿用原主题
+            return False
+
+        message_bigrams = _content_bigrams(message)
+        if not message_bigrams:
+            return False
+        overlap = len(message_bigrams & _content_bigrams(context)) / len(message_bigrams)
+        return overlap < OVERLAP_THRESHOLD
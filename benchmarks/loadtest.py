@@ -0,0 +1,279 @@
+"""AI Lawyer 压测与延迟基准
+
+在进程内启动backend.main中的应用，使用本地确定性模型（local提供方）替代DashScope，
+模拟N个并发用户完成 注册 → 登录 → 创建对话 → 多轮流式对话，
+输出各接口的p50/p95/p99延迟、首token时间、token速率和数据库耗时。
+
+用法：
+    python -m benchmarks.loadtest --users 50 --turns 3 --output bench.json
+"""
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+QUESTIONS = [
+    "公司未提前通知就辞退我，我能要求经济补偿吗？",
+    "租房合同到期房东不退押金怎么办？",
+    "试用期被辞退需要支付赔偿金吗？",
+    "离婚时婚前房产如何分割？",
+]
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+class Recorder:
+    """收集客户端侧的各项耗时"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.ttft: List[float] = []
+        # token帧在服务端按时间窗口合并，吞吐按字数统计
+        self.chars_per_second: List[float] = []
+        self.frames_per_stream: List[float] = []
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, seconds: float, status: int) -> None:
+        self.status_codes[endpoint][status] += 1
+        if status < 400:
+            self.latencies[endpoint].append(seconds)
+        else:
+            self.errors[endpoint] += 1
+
+class DBTimer:
+    """通过SQLAlchemy事件统计服务端SQL执行耗时"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.statements: Dict[str, List[float]] = defaultdict(list)
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", self._before)
+        event.listen(sync_engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("bench_start", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["bench_start"].pop()
+        kind = statement.lstrip().split(None, 1)[0].upper()
+        self.statements[kind].append(elapsed)
+
+    def report(self) -> Dict[str, Any]:
+        report = {kind: summarize(values) for kind, values in self.statements.items()}
+        report["total_seconds"] = sum(sum(values) for values in self.statements.values())
+        return report
+
+async def stream_turn(client, recorder: Recorder, chat_id: int, headers: Dict[str, str], content: str) -> None:
+    started = time.perf_counter()
+    first_token = None
+    chars = 0
+    frames = 0
+    async with client.stream(
+        "POST", f"/chat/{chat_id}/messages/stream", json={"content": content}, headers=headers
+    ) as response:
+        if response.status_code >= 400:
+            await response.aread()
+            recorder.record("stream", time.perf_counter() - started, response.status_code)
+            return
+        event = "message"
+        data: List[str] = []
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[6:] if line.startswith("data: ") else line[5:])
+            elif not line:
+                if event == "token" and data:
+                    text = "\n".join(data)
+                    frames += 1
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    else:
+                        chars += len(text)
+                elif event == "error":
+                    recorder.errors["stream_upstream"] += 1
+                event = "message"
+                data = []
+    finished = time.perf_counter()
+    recorder.record("stream", finished - started, response.status_code)
+    if first_token is not None:
+        recorder.ttft.append(first_token - started)
+        recorder.frames_per_stream.append(frames)
+        if finished > first_token and chars:
+            recorder.chars_per_second.append(chars / (finished - first_token))
+
+async def run_user(client, recorder: Recorder, index: int, turns: int, unique: bool) -> None:
+    async def timed(endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        recorder.record(endpoint, time.perf_counter() - started, response.status_code)
+        return response
+
+    username = f"bench_{uuid.uuid4().hex[:12]}"
+    password = "bench-password"
+    response = await timed("register", "POST", "/auth/register", json={"username": username, "password": password})
+    if response.status_code >= 400:
+        return
+    response = await timed("login", "POST", "/auth/login", data={"username": username, "password": password})
+    if response.status_code >= 400:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    response = await timed("create_chat", "POST", "/chat/create", headers=headers)
+    if response.status_code >= 400:
+        return
+    chat_id = response.json()["id"]
+
+    for turn in range(turns):
+        question = QUESTIONS[(index + turn) % len(QUESTIONS)]
+        if unique:
+            question = f"{question}（用户{index}第{turn + 1}轮）"
+        await stream_turn(client, recorder, chat_id, headers, question)
+        await timed("messages", "GET", f"/chat/{chat_id}/messages", headers=headers)
+    await timed("history", "GET", "/chat/history", headers=headers)
+
+def start_server(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("压测服务启动失败")
+        time.sleep(0.05)
+    return server, thread
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+async def drive(args, base_url: str, recorder: Recorder) -> float:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            run_user(client, recorder, index, args.turns, not args.repeat_questions)
+            for index in range(args.users)
+        ), return_exceptions=True)
+        for result in results:
+            # 连接错误、超时等记录后继续统计，不中断整个压测
+            if isinstance(result, Exception):
+                recorder.errors[type(result).__name__] += 1
+        return time.perf_counter() - started
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="AI Lawyer 压测")
+    parser.add_argument("--users", type=int, default=20, help="并发用户数")
+    parser.add_argument("--turns", type=int, default=3, help="每个用户的对话轮数")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="模拟模型每秒输出token数")
+    parser.add_argument("--first-token-delay", type=float, default=0.5, help="模拟模型首token延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="模拟模型调用失败率")
+    parser.add_argument("--answer-tokens", type=int, default=200, help="每个回答的token数")
+    parser.add_argument("--repeat-questions", action="store_true", help="用户之间使用相同的问题（可命中缓存和请求合并）")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单个请求超时（秒）")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--database-url", help="默认使用临时SQLite数据库")
+    parser.add_argument("--output", help="JSON结果输出路径")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="ai_lawyer_bench_")
+    os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+    os.environ.setdefault("DASHSCOPE_API_KEY", "bench-key")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{Path(workdir) / 'bench.db'}"
+    os.environ.setdefault("ANSWER_CACHE_PATH", str(Path(workdir) / "answer_cache.db"))
+    # 全文索引以用户和对话id为键，必须与本次的临时数据库一起新建
+    os.environ["SEARCH_INDEX_PATH"] = str(Path(workdir) / "search_index.db")
+    os.environ.setdefault("LOG_DIR", str(Path(workdir) / "logs"))
+    for name in ("CHAT_MODEL", "TITLE_MODEL", "SUMMARY_MODEL"):
+        os.environ[name] = f"local:bench-{name.split('_')[0].lower()}"
+    os.environ["LOCAL_LLM_TOKEN_RATE"] = str(args.token_rate)
+    os.environ["LOCAL_LLM_FIRST_TOKEN_DELAY"] = str(args.first_token_delay)
+    os.environ["LOCAL_LLM_FAILURE_RATE"] = str(args.failure_rate)
+    os.environ["LOCAL_LLM_ANSWER_TOKENS"] = str(args.answer_tokens)
+
+    from backend.db.database import engine
+    from backend.main import app
+
+    logging.getLogger("ai_lawyer").setLevel(logging.WARNING)
+    db_timer = DBTimer(engine)
+
+    server, thread = start_server(app, args.port)
+    recorder = Recorder()
+    try:
+        wall = asyncio.run(drive(args, f"http://127.0.0.1:{args.port}/api/v1", recorder))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": vars(args),
+        },
+        "wall_seconds": wall,
+        "endpoints": {name: summarize(values) for name, values in recorder.latencies.items()},
+        "status_codes": {name: dict(codes) for name, codes in recorder.status_codes.items()},
+        "errors": dict(recorder.errors),
+        "ttft": summarize(recorder.ttft),
+        "chars_per_second": summarize(recorder.chars_per_second),
+        "frames_per_stream": summarize(recorder.frames_per_stream),
+        "db": db_timer.report(),
+    }
+
+    print(f"并发用户: {args.users}, 轮数: {args.turns}, 总耗时: {wall:.2f}s")
+    print(f"{'指标':<20}{'count':>8}{'p50(ms)':>12}{'p95(ms)':>12}{'p99(ms)':>12}")
+    rows = list(result["endpoints"].items()) + [("ttft", result["ttft"])]
+    for name, stats in rows:
+        if stats["count"]:
+            print(f"{name:<20}{stats['count']:>8}{stats['p50'] * 1000:>12.1f}"
+                  f"{stats['p95'] * 1000:>12.1f}{stats['p99'] * 1000:>12.1f}")
+    if recorder.chars_per_second:
+        print(f"chars/s p50: {result['chars_per_second']['p50']:.1f}, "
+              f"frames/stream p50: {result['frames_per_stream']['p50']:.1f}")
+    print(f"数据库总耗时: {result['db']['total_seconds']:.3f}s, 错误: {dict(recorder.errors)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""AI Lawyer 启动耗时基准
+
+在子进程中测量worker冷启动的各个部分，用于评估多worker重启和扩容时的等待时间：
+- import：导入backend.main的耗时（多次运行取分位数）
+- ready：从启动uvicorn进程到健康检查返回200的耗时，首次运行包含空库迁移，
+  之后的运行相当于已迁移数据库上的重启
+- shutdown：发送SIGTERM到进程退出的耗时
+- 导入最慢的顶层包（python -X importtime，按包汇总自身耗时）
+
+用法：
+    python -m benchmarks.startup --runs 5 --output startup.json
+"""
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.loadtest import git_revision, summarize
+
+ROOT = Path(__file__).resolve().parents[1]
+
+IMPORT_SCRIPT = (
+    "import time\n"
+    "started = time.perf_counter()\n"
+    "import backend.main\n"
+    "print(time.perf_counter() - started)\n"
+)
+
+def bench_env(workdir: str, database_url: Optional[str], warmup: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("JWT_SECRET_KEY", "bench-secret")
+    env.setdefault("DASHSCOPE_API_KEY", "bench-key")
+    env["DATABASE_URL"] = database_url or f"sqlite:///{Path(workdir) / 'startup.db'}"
+    env.setdefault("ANSWER_CACHE_PATH", str(Path(workdir) / "answer_cache.db"))
+    env["SEARCH_INDEX_PATH"] = str(Path(workdir) / "search_index.db")
+    env.setdefault("LOG_DIR", str(Path(workdir) / "logs"))
+    env["STARTUP_WARMUP_ENABLED"] = "true" if warmup else "false"
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    return env
+
+def measure_import(env: Dict[str, str]) -> float:
+    output = subprocess.check_output(
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, env=env, text=True, stderr=subprocess.DEVNULL
+    )
+    return float(output.strip().splitlines()[-1])
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务进程启动失败，退出码: {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"服务在{timeout}s内未就绪")
+
+def measure_server(env: Dict[str, str], port: int, workers: int, timeout: float) -> Dict[str, float]:
+    """启动uvicorn直到健康检查通过，再发送SIGTERM等待退出"""
+    command = [
+        sys.executable, "-m", "uvicorn", "backend.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ]
+    if workers > 1:
+        command += ["--workers", str(workers)]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(f"http://127.0.0.1:{port}/api/v1/health", process, timeout)
+        ready = time.perf_counter() - started
+        stopping = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=timeout)
+        return {"ready": ready, "shutdown": time.perf_counter() - stopping}
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+def slowest_imports(env: Dict[str, str], top: int) -> List[Dict[str, Any]]:
+    """按顶层包汇总-X importtime的自身耗时"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.main"],
+        cwd=ROOT, env=env, text=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True
+    )
+    packages: Dict[str, int] = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[0].split(":")[1].strip().isdigit():
+            continue
+        self_us = int(fields[0].split(":")[1])
+        packages[fields[2].strip().split(".")[0]] += self_us
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"package": name, "self_ms": us / 1000} for name, us in ranked]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="AI Lawyer 启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的运行次数")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker数量")
+    parser.add_argument("--no-warmup", action="store_true", help="关闭启动预热（STARTUP_WARMUP_ENABLED=false）")
+    parser.add_argument("--top", type=int, default=15, help="输出导入最慢的包数量")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单次启动或退出的超时（秒）")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--database-url", help="默认使用临时SQLite数据库")
+    parser.add_argument("--output", help="JSON结果输出路径")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="ai_lawyer_startup_")
+    env = bench_env(workdir, args.database_url, not args.no_warmup)
+
+    imports = [measure_import(env) for _ in range(args.runs)]
+    # 第一次运行在空库上执行迁移，之后的运行是已迁移数据库上的重启
+    first = measure_server(env, args.port, args.workers, args.timeout)
+    restarts = [measure_server(env, args.port, args.workers, args.timeout) for _ in range(args.runs)]
+    packages = slowest_imports(env, args.top)
+
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": vars(args),
+        },
+        "import_seconds": summarize(imports),
+        "first_start": first,
+        "ready_seconds": summarize([run["ready"] for run in restarts]),
+        "shutdown_seconds": summarize([run["shutdown"] for run in restarts]),
+        "slowest_imports": packages,
+    }
+
+    print(f"运行次数: {args.runs}, worker数: {args.workers}, 预热: {not args.no_warmup}")
+    print(f"{'指标':<20}{'p50(ms)':>12}{'p95(ms)':>12}{'max(ms)':>12}")
+    for name in ("import_seconds", "ready_seconds", "shutdown_seconds"):
+        stats = result[name]
+        print(f"{name:<20}{stats['p50'] * 1000:>12.1f}{stats['p95'] * 1000:>12.1f}{stats['max'] * 1000:>12.1f}")
+    print(f"首次启动（含迁移）: {first['ready'] * 1000:.1f}ms")
+    print("导入最慢的包: " + ", ".join(f"{item['package']} {item['self_ms']:.1f}ms" for item in packages[:5]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
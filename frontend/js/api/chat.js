@@ -9,12 +9,22 @@ export const chat = {
         return api.get(`/chat/${chatId}`);
     },
     
-    getHistory: async () => {
-        return api.get('/chat/history');
+    // 返回 { items, next_cursor }，next_cursor为空表示没有更多
+    getHistory: async (cursor = null) => {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        return api.get(`/chat/history${query}`);
     },
     
-    getMessages: async (chatId) => {
-        return api.get(`/chat/${chatId}/messages`);
+    // 返回最近一页消息，next_cursor用于加载更早的消息
+    getMessages: async (chatId, cursor = null) => {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        return api.get(`/chat/${chatId}/messages${query}`);
+    },
+    
+    // 返回 { items, next_cursor }，结果按相关度排序
+    searchHistory: async (query, cursor = null) => {
+        const page = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+        return api.get(`/chat/search?q=${encodeURIComponent(query)}${page}`);
     },
     
     sendMessage: async (chatId, content) => {
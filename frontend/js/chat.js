@@ -1,4 +1,9 @@
 import { chat } from './api/chat.js';
+import { readEvents } from './utils/sse.js';
+
+// 流式连接中断后的最大重连次数和重连间隔（毫秒，按次数递增）
+const STREAM_MAX_RESUMES = 5;
+const STREAM_RESUME_DELAY_MS = 1000;
 
 // 等待依赖加载完成
 function waitForDependencies() {
@@ -29,8 +34,17 @@ export class ChatUI {
         this.sendButton = container.querySelector('#send-message');
         this.historyList = container.querySelector('.history-list');
         this.newChatButton = container.querySelector('.new-chat-btn');
+        this.searchInput = container.querySelector('.history-search');
         
         this.currentChatId = null;
+        // 分页游标，为空表示没有更多
+        this.historyCursor = null;
+        this.messagesCursor = null;
+        this.loadingMore = false;
+        // 检索状态，searchQuery为空时列表显示对话历史
+        this.searchQuery = '';
+        this.searchCursor = null;
+        this.searchTimer = null;
         
         // 初始化依赖
         this.initDependencies();
@@ -80,6 +94,31 @@ export class ChatUI {
         // 新对话
         this.newChatButton.addEventListener('click', () => this.createNewChat());
         
+        // 滚动到底部时加载更多对话或检索结果
+        this.historyList.addEventListener('scroll', () => {
+            const list = this.historyList;
+            if (list.scrollTop + list.clientHeight >= list.scrollHeight - 20) {
+                if (this.searchQuery) {
+                    this.loadMoreSearchResults();
+                } else {
+                    this.loadMoreHistory();
+                }
+            }
+        });
+        
+        // 输入停顿后检索历史对话
+        this.searchInput.addEventListener('input', () => {
+            clearTimeout(this.searchTimer);
+            this.searchTimer = setTimeout(() => this.searchHistory(this.searchInput.value.trim()), 300);
+        });
+        
+        // 滚动到顶部时加载更早的消息
+        this.messagesContainer.addEventListener('scroll', () => {
+            if (this.messagesContainer.scrollTop === 0) {
+                this.loadOlderMessages();
+            }
+        });
+        
         // 自动调整输入框高度
         this.input.addEventListener('input', () => {
             this.input.style.height = 'auto';
@@ -89,50 +128,14 @@ export class ChatUI {
     
     async loadChatHistory() {
         try {
-            const history = await chat.getHistory();
+            const page = await chat.getHistory();
             this.historyList.innerHTML = '';
-            
-            history.forEach(chat => {
-                const item = document.createElement('div');
-                item.className = `history-item ${chat.id === this.currentChatId ? 'active' : ''}`;
-                item.dataset.chatId = chat.id;
-                
-                const content = document.createElement('div');
-                content.className = 'history-item-content';
-                
-                const title = document.createElement('div');
-                title.className = 'history-item-title';
-                title.textContent = chat.title || '新对话';
-                
-                const deleteBtn = document.createElement('button');
-                deleteBtn.className = 'history-item-delete';
-                deleteBtn.innerHTML = `
-                    <svg width="16" height="16" viewBox="0 0 16 16" fill="none">
-                        <path d="M12 4L4 12M4 4L12 12" stroke="currentColor" stroke-width="1.5" stroke-linecap="round" stroke-linejoin="round"/>
-                    </svg>
-                `;
-                
-                content.appendChild(title);
-                item.appendChild(content);
-                item.appendChild(deleteBtn);
-                
-                // 点击切换对话
-                item.addEventListener('click', () => this.loadChat(chat.id));
-                
-                // 点击删除按钮
-                deleteBtn.addEventListener('click', async (e) => {
-                    e.stopPropagation();
-                    if (confirm('确定要删除这个对话吗？')) {
-                        await this.deleteChat(chat.id);
-                    }
-                });
-                
-                this.historyList.appendChild(item);
-            });
+            this.historyCursor = page.next_cursor;
+            page.items.forEach(item => this.historyList.appendChild(this.renderHistoryItem(item)));
             
             // 如果有历史记录但没有当前对话，加载第一个
-            if (history.length > 0 && !this.currentChatId) {
-                await this.loadChat(history[0].id);
+            if (page.items.length > 0 && !this.currentChatId) {
+                await this.loadChat(page.items[0].id);
             }
         } catch (error) {
             console.error('加载历史记录失败:', error);
@@ -140,6 +143,139 @@ export class ChatUI {
         }
     }
     
+    async loadMoreHistory() {
+        if (!this.historyCursor || this.loadingMore) return;
+        this.loadingMore = true;
+        try {
+            const page = await chat.getHistory(this.historyCursor);
+            this.historyCursor = page.next_cursor;
+            page.items.forEach(item => this.historyList.appendChild(this.renderHistoryItem(item)));
+        } catch (error) {
+            console.error('加载更多历史记录失败:', error);
+        } finally {
+            this.loadingMore = false;
+        }
+    }
+    
+    async searchHistory(query) {
+        this.searchQuery = query;
+        if (!query) {
+            await this.loadChatHistory();
+            return;
+        }
+        try {
+            const page = await chat.searchHistory(query);
+            // 忽略过期的检索响应
+            if (query !== this.searchQuery) return;
+            this.historyCursor = null;
+            this.searchCursor = page.next_cursor;
+            this.historyList.innerHTML = '';
+            if (page.items.length === 0) {
+                const empty = document.createElement('div');
+                empty.className = 'history-empty';
+                empty.textContent = '没有找到相关对话';
+                this.historyList.appendChild(empty);
+                return;
+            }
+            page.items.forEach(hit => this.historyList.appendChild(this.renderSearchResult(hit)));
+        } catch (error) {
+            console.error('检索历史对话失败:', error);
+            this.showError('检索失败，请重试');
+        }
+    }
+    
+    async loadMoreSearchResults() {
+        if (this.searchCursor === null || this.loadingMore) return;
+        this.loadingMore = true;
+        const query = this.searchQuery;
+        try {
+            const page = await chat.searchHistory(query, this.searchCursor);
+            if (query !== this.searchQuery) return;
+            this.searchCursor = page.next_cursor;
+            page.items.forEach(hit => this.historyList.appendChild(this.renderSearchResult(hit)));
+        } catch (error) {
+            console.error('加载更多检索结果失败:', error);
+        } finally {
+            this.loadingMore = false;
+        }
+    }
+    
+    renderSearchResult(hit) {
+        const item = document.createElement('div');
+        item.className = `history-item ${hit.chat_id === this.currentChatId ? 'active' : ''}`;
+        item.dataset.chatId = hit.chat_id;
+        
+        const content = document.createElement('div');
+        content.className = 'history-item-content';
+        
+        const title = document.createElement('div');
+        title.className = 'history-item-title';
+        title.textContent = hit.chat_title || '新对话';
+        content.appendChild(title);
+        
+        if (hit.kind === 'message') {
+            // 用文本节点拼接片段，命中词包在mark中，不解析任何HTML
+            const snippet = document.createElement('div');
+            snippet.className = 'search-result-snippet';
+            let position = 0;
+            hit.highlights.forEach(([start, end]) => {
+                if (start < position) return;
+                snippet.appendChild(document.createTextNode(hit.snippet.slice(position, start)));
+                const mark = document.createElement('mark');
+                mark.textContent = hit.snippet.slice(start, end);
+                snippet.appendChild(mark);
+                position = end;
+            });
+            snippet.appendChild(document.createTextNode(hit.snippet.slice(position)));
+            content.appendChild(snippet);
+        }
+        
+        item.appendChild(content);
+        item.addEventListener('click', () => this.loadChat(hit.chat_id));
+        return item;
+    }
+    
+    renderHistoryItem(chatItem) {
+        const item = document.createElement('div');
+        item.className = `history-item ${chatItem.id === this.currentChatId ? 'active' : ''}`;
+        item.dataset.chatId = chatItem.id;
+        if (chatItem.last_message) {
+            item.title = chatItem.last_message;
+        }
+        
+        const content = document.createElement('div');
+        content.className = 'history-item-content';
+        
+        const title = document.createElement('div');
+        title.className = 'history-item-title';
+        title.textContent = chatItem.title || '新对话';
+        
+        const deleteBtn = document.createElement('button');
+        deleteBtn.className = 'history-item-delete';
+        deleteBtn.innerHTML = `
+            <svg width="16" height="16" viewBox="0 0 16 16" fill="none">
+                <path d="M12 4L4 12M4 4L12 12" stroke="currentColor" stroke-width="1.5" stroke-linecap="round" stroke-linejoin="round"/>
+            </svg>
+        `;
+        
+        content.appendChild(title);
+        item.appendChild(content);
+        item.appendChild(deleteBtn);
+        
+        // 点击切换对话
+        item.addEventListener('click', () => this.loadChat(chatItem.id));
+        
+        // 点击删除按钮
+        deleteBtn.addEventListener('click', async (e) => {
+            e.stopPropagation();
+            if (confirm('确定要删除这个对话吗？')) {
+                await this.deleteChat(chatItem.id);
+            }
+        });
+        
+        return item;
+    }
+    
     async deleteChat(chatId) {
         try {
             await chat.deleteChat(chatId);
@@ -160,45 +296,14 @@ export class ChatUI {
     
     async loadChat(chatId) {
         try {
-            const [chatData, messages] = await Promise.all([
-                chat.getChat(chatId),
-                chat.getMessages(chatId)
-            ]);
+            const page = await chat.getMessages(chatId);
             
             this.currentChatId = chatId;
+            this.messagesCursor = page.next_cursor;
             this.messagesContainer.innerHTML = '';
             
             // 渲染历史消息
-            messages.forEach(msg => {
-                const messageDiv = document.createElement('div');
-                messageDiv.className = `message ${msg.role === 'user' ? 'user' : 'bot'}`;
-                
-                const messageText = document.createElement('div');
-                messageText.className = `message-text ${msg.role === 'bot' ? 'markdown-body' : ''}`;
-                
-                // 对AI回复使用Markdown解析
-                if (msg.role === 'bot') {
-                    messageText.innerHTML = window.marked.parse(msg.content, {
-                        breaks: true,
-                        gfm: true,
-                        pedantic: false,
-                        mangle: false,
-                        headerIds: false,
-                        smartLists: true,
-                        smartypants: true
-                    });
-                } else {
-                    messageText.textContent = msg.content;
-                }
-                
-                const timeElement = document.createElement('div');
-                timeElement.className = 'message-time';
-                timeElement.textContent = new Date(msg.created_at).toLocaleTimeString();
-                
-                messageDiv.appendChild(messageText);
-                messageDiv.appendChild(timeElement);
-                this.messagesContainer.appendChild(messageDiv);
-            });
+            page.items.forEach(msg => this.messagesContainer.appendChild(this.renderMessage(msg)));
             
             // 更新历史记录列表中的激活状态
             document.querySelectorAll('.history-item').forEach(item => {
@@ -213,6 +318,62 @@ export class ChatUI {
         }
     }
     
+    async loadOlderMessages() {
+        if (!this.messagesCursor || this.loadingMore) return;
+        this.loadingMore = true;
+        const chatId = this.currentChatId;
+        try {
+            const page = await chat.getMessages(chatId, this.messagesCursor);
+            if (chatId !== this.currentChatId) return;
+            this.messagesCursor = page.next_cursor;
+            
+            // 插入到顶部并保持当前阅读位置
+            const previousHeight = this.messagesContainer.scrollHeight;
+            const fragment = document.createDocumentFragment();
+            page.items.forEach(msg => fragment.appendChild(this.renderMessage(msg)));
+            this.messagesContainer.insertBefore(fragment, this.messagesContainer.firstChild);
+            this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight - previousHeight;
+        } catch (error) {
+            console.error('加载更早的消息失败:', error);
+        } finally {
+            this.loadingMore = false;
+        }
+    }
+    
+    renderMessage(msg) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `message ${msg.role === 'user' ? 'user' : 'bot'}`;
+        
+        const messageText = document.createElement('div');
+        messageText.className = `message-text ${msg.role === 'bot' ? 'markdown-body' : ''}`;
+        
+        // 对AI回复使用Markdown解析
+        if (msg.role === 'bot') {
+            messageText.innerHTML = window.marked.parse(msg.content, {
+                breaks: true,
+                gfm: true,
+                pedantic: false,
+                mangle: false,
+                headerIds: false,
+                smartLists: true,
+                smartypants: true
+            });
+        } else {
+            messageText.textContent = msg.content;
+        }
+        
+        const timeElement = document.createElement('div');
+        timeElement.className = 'message-time';
+        timeElement.textContent = new Date(msg.created_at).toLocaleTimeString();
+        if (msg.truncated) {
+            timeElement.textContent += '（回答已中断）';
+        }
+        
+        messageDiv.appendChild(messageText);
+        messageDiv.appendChild(timeElement);
+        return messageDiv;
+    }
+    
     async createNewChat() {
         try {
             const newChat = await chat.createChat();
@@ -335,15 +496,123 @@ export class ChatUI {
             let codeBlockContent = '';
             let codeBlockLanguage = '';
             
-            const response = await fetch(`/api/v1/chat/${this.currentChatId}/messages/stream`, {
-                method: 'POST',
-                headers: {
+            const chatId = this.currentChatId;
+            // 同一条消息的重试使用相同的幂等键，服务端不会重复生成
+            const idempotencyKey = window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+            let lastEventId = null;
+            let finished = false;
+            
+            const openStream = () => {
+                const headers = {
                     'Content-Type': 'application/json',
                     'Authorization': `Bearer ${localStorage.getItem('token')}`
-                },
-                body: JSON.stringify({ content: message })
-            });
+                };
+                if (lastEventId) {
+                    // 断线重连：从最后收到的事件之后继续
+                    return fetch(`/api/v1/chat/${chatId}/messages/stream`, {
+                        headers: { ...headers, 'Last-Event-ID': lastEventId }
+                    });
+                }
+                return fetch(`/api/v1/chat/${chatId}/messages/stream`, {
+                    method: 'POST',
+                    headers: { ...headers, 'Idempotency-Key': idempotencyKey },
+                    body: JSON.stringify({ content: message })
+                });
+            };
+            
+            const renderResponse = () => {
+                // 文本预处理
+                const processedText = responseText
+                    // 处理段落
+                    .split('\n\n')
+                    .map(paragraph => {
+                        // 处理每个段落
+                        return paragraph
+                            .split('\n')
+                            .map(line => line.trim())
+                            .filter(line => line)
+                            .join('\n');
+                    })
+                    .filter(paragraph => paragraph)
+                    .join('\n\n');
+        
+                // 处理特殊格式
+                const formattedText = processedText
+                    // 处理代码块
+                    .replace(/```([\s\S]*?)```/g, (match, code) => {
+                        const lines = code.trim().split('\n');
+                        const language = lines[0].trim();
+                        const codeContent = lines.slice(1).join('\n');
+                        return `\n\`\`\`${language}\n${codeContent}\n\`\`\`\n`;
+                    })
+                    // 处理行内代码
+                    .replace(/`([^`]+)`/g, '`$1`')
+                    // 处理列表
+                    .replace(/^[*-]\s+/gm, '• ')
+                    .replace(/^\d+\.\s+/gm, (match) => match)
+                    // 处理引用
+                    .replace(/^>\s+/gm, '> ')
+                    // 处理标题
+                    .replace(/^(#{1,6})\s+/gm, (match, hashes) => hashes + ' ');
+        
+                // 使用marked渲染Markdown
+                const htmlContent = window.marked.parse(formattedText, {
+                    breaks: true,
+                    gfm: true,
+                    pedantic: false,
+                    mangle: false,
+                    headerIds: false,
+                    smartLists: true,
+                    smartypants: true
+                });
+        
+                // 添加样式处理
+                const styledContent = htmlContent
+                    // 段落样式
+                    .replace(/<p>/g, '<p style="margin: 1em 0; line-height: 1.8;">')
+                    // 列表样式
+                    .replace(/<ul>/g, '<ul style="margin: 1em 0; padding-left: 2em;">')
+                    .replace(/<ol>/g, '<ol style="margin: 1em 0; padding-left: 2em;">')
+                    .replace(/<li>/g, '<li style="margin: 0.5em 0;">')
+                    // 代码块样式
+                    .replace(/<pre><code/g, '<pre style="margin: 1em 0; padding: 1em; background: #f6f8fa; border-radius: 6px; overflow-x: auto;"><code')
+                    // 行内代码样式
+                    .replace(/<code>/g, '<code style="padding: 0.2em 0.4em; background: #f6f8fa; border-radius: 3px;">')
+                    // 引用样式
+                    .replace(/<blockquote>/g, '<blockquote style="margin: 1em 0; padding: 0.5em 1em; border-left: 4px solid #ddd; background: #f9f9f9;">')
+                    // 标题样式
+                    .replace(/<h([1-6])>/g, (_, level) => `<h${level} style="margin: 1.5em 0 1em; font-weight: 600; line-height: 1.4;">`);
+        
+                aiMessageText.innerHTML = styledContent;
+                this.scrollToBottom();
+            };
+            
+            const handleEvent = ({ event, data, id }) => {
+                if (id) lastEventId = id;
+                if (event === 'token') {
+                    responseText += data;
+                    renderResponse();
+                } else if (event === 'snapshot') {
+                    // 重连时部分事件已过期，服务端返回已生成的全文
+                    const snapshot = JSON.parse(data);
+                    responseText = snapshot.text;
+                    if (snapshot.title) this.updateChatTitle(chatId, snapshot.title);
+                    renderResponse();
+                } else if (event === 'title') {
+                    this.updateChatTitle(chatId, data);
+                } else if (event === 'error') {
+                    finished = true;
+                    const { message: errorMessage } = JSON.parse(data);
+                    if (!responseText) {
+                        aiMessageText.textContent = errorMessage;
+                    }
+                    this.showError(errorMessage);
+                } else if (event === 'done') {
+                    finished = true;
+                }
+            };
             
+            let response = await openStream();
             if (!response.ok) {
                 throw new Error('发送消息失败');
             }
@@ -356,92 +625,28 @@ export class ChatUI {
             aiMessageContainer.appendChild(aiMessageText);
             aiMessageContainer.appendChild(timeElement);
             
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-            
-            while (true) {
-                const { value, done } = await reader.read();
-                if (done) break;
-                
-                const chunk = decoder.decode(value);
-                const lines = chunk.split('\n');
-                
-                for (const line of lines) {
-                    if (line.startsWith('data: ')) {
-                        const content = line.slice(6);
-                        responseText += content;
-                        
-                        // 文本预处理
-                        const processedText = responseText
-                            // 处理段落
-                            .split('\n\n')
-                            .map(paragraph => {
-                                // 处理每个段落
-                                return paragraph
-                                    .split('\n')
-                                    .map(line => line.trim())
-                                    .filter(line => line)
-                                    .join('\n');
-                            })
-                            .filter(paragraph => paragraph)
-                            .join('\n\n');
-                        
-                        // 处理特殊格式
-                        const formattedText = processedText
-                            // 处理代码块
-                            .replace(/```([\s\S]*?)```/g, (match, code) => {
-                                const lines = code.trim().split('\n');
-                                const language = lines[0].trim();
-                                const codeContent = lines.slice(1).join('\n');
-                                return `\n\`\`\`${language}\n${codeContent}\n\`\`\`\n`;
-                            })
-                            // 处理行内代码
-                            .replace(/`([^`]+)`/g, '`$1`')
-                            // 处理列表
-                            .replace(/^[*-]\s+/gm, '• ')
-                            .replace(/^\d+\.\s+/gm, (match) => match)
-                            // 处理引用
-                            .replace(/^>\s+/gm, '> ')
-                            // 处理标题
-                            .replace(/^(#{1,6})\s+/gm, (match, hashes) => hashes + ' ');
-                        
-                        // 使用marked渲染Markdown
-                        const htmlContent = window.marked.parse(formattedText, {
-                            breaks: true,
-                            gfm: true,
-                            pedantic: false,
-                            mangle: false,
-                            headerIds: false,
-                            smartLists: true,
-                            smartypants: true
-                        });
-                        
-                        // 添加样式处理
-                        const styledContent = htmlContent
-                            // 段落样式
-                            .replace(/<p>/g, '<p style="margin: 1em 0; line-height: 1.8;">')
-                            // 列表样式
-                            .replace(/<ul>/g, '<ul style="margin: 1em 0; padding-left: 2em;">')
-                            .replace(/<ol>/g, '<ol style="margin: 1em 0; padding-left: 2em;">')
-                            .replace(/<li>/g, '<li style="margin: 0.5em 0;">')
-                            // 代码块样式
-                            .replace(/<pre><code/g, '<pre style="margin: 1em 0; padding: 1em; background: #f6f8fa; border-radius: 6px; overflow-x: auto;"><code')
-                            // 行内代码样式
-                            .replace(/<code>/g, '<code style="padding: 0.2em 0.4em; background: #f6f8fa; border-radius: 3px;">')
-                            // 引用样式
-                            .replace(/<blockquote>/g, '<blockquote style="margin: 1em 0; padding: 0.5em 1em; border-left: 4px solid #ddd; background: #f9f9f9;">')
-                            // 标题样式
-                            .replace(/<h([1-6])>/g, (_, level) => `<h${level} style="margin: 1.5em 0 1em; font-weight: 600; line-height: 1.4;">`);
-                        
-                        aiMessageText.innerHTML = styledContent;
-                        this.scrollToBottom();
-                    } else if (line.startsWith('event: title')) {
-                        const titleLine = lines[lines.indexOf(line) + 1];
-                        if (titleLine?.startsWith('data: ')) {
-                            const title = titleLine.slice(6);
-                            this.updateChatTitle(this.currentChatId, title);
-                        }
+            for (let attempt = 0; ; attempt++) {
+                try {
+                    for await (const streamEvent of readEvents(response)) {
+                        handleEvent(streamEvent);
                     }
+                } catch (error) {
+                    console.warn('流式连接中断:', error);
+                }
+                if (finished) break;
+                if (attempt >= STREAM_MAX_RESUMES) {
+                    throw new Error('连接中断');
+                }
+                await new Promise(resolve => setTimeout(resolve, STREAM_RESUME_DELAY_MS * (attempt + 1)));
+                try {
+                    response = await openStream();
+                } catch (error) {
+                    continue;
+                }
+                if (response.status === 404) {
+                    // 生成流已过期，回答已保存，重新加载对话
+                    await this.loadChat(chatId);
+                    return;
                 }
             }
             